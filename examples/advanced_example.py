@@ -32,15 +32,21 @@ def generate_random_kv_pairs(count: int, key_size: int = 16, value_size: int = 1
     返回:
         键值对列表
     """
+    # 一次性生成全部随机字节，再按键后缀和值切片
+    suffix_size = key_size - 8
+    stride = suffix_size + value_size
+    blob = os.urandom(count * stride)
+    
     pairs = []
     for i in range(count):
+        offset = i * stride
+        
         # 创建随机键，确保前缀有序以便更好地测试合并
         prefix = i.to_bytes(8, byteorder='big')
-        random_suffix = os.urandom(key_size - len(prefix))
-        key = prefix + random_suffix
+        key = prefix + blob[offset:offset + suffix_size]
         
         # 创建随机值
-        value = os.urandom(value_size)
+        value = blob[offset + suffix_size:offset + stride]
         pairs.append((key, value))
     
     return pairs
@@ -64,8 +70,7 @@ def run_performance_test():
     
     print(f"写入 {data_count} 键值对到数据库...")
     start_time = time.time()
-    for key, value in key_value_pairs:
-        db.put(key, value)
+    db.put_batch(key_value_pairs)
     write_time = time.time() - start_time
     print(f"写入完成，耗时: {write_time:.2f}秒")
     
@@ -81,12 +86,15 @@ def run_performance_test():
     existing_keys = [pair[0] for pair in random.sample(key_value_pairs, 1000)]
     non_existing_keys = [os.urandom(16) for _ in range(100)]  # 不存在的键
     
+    # 绑定方法提到循环外，避免每次迭代的属性查找
+    get = db.get
+    
     # 测试查询性能（现有键）
     print("\n测试查询已存在的键性能...")
     start_time = time.time()
     hits = 0
     for key in existing_keys:
-        value = db.get(key)
+        value = get(key)
         if value is not None:
             hits += 1
     existing_time = time.time() - start_time
@@ -97,7 +105,7 @@ def run_performance_test():
     start_time = time.time()
     false_positives = 0
     for key in non_existing_keys:
-        value = db.get(key)
+        value = get(key)
         if value is not None:
             false_positives += 1
     non_existing_time = time.time() - start_time
@@ -10,16 +10,10 @@ import os
 import time
 import shutil
 import random
-import string
 from pylsm.db import DB
 from pylsm.config import Config, optimize_for_point_lookup
 
 
-def random_string(length: int = 10) -> str:
-    """生成随机字符串。"""
-    return ''.join(random.choice(string.ascii_letters) for _ in range(length))
-
-
 def clean_directory(path: str, max_retries=3, retry_delay=0.5):
     """安全清理目录，处理文件句柄释放问题"""
     if not os.path.exists(path):
@@ -62,8 +56,8 @@ def main():
         num_entries = 5000
         keys = []
         for i in range(num_entries):
-            key = f"key_{i}_{random_string(10)}"
-            value = f"value_{i}_{random_string(50)}"
+            key = b"key_%08d_%s" % (i, os.urandom(5).hex().encode())
+            value = b"value_%08d_" % i + os.urandom(50)
             db.put(key, value)
             if i % 1000 == 0:
                 print(f"已写入 {i} 条记录")
@@ -81,7 +75,7 @@ def main():
         
         # 查询不存在的键
         for _ in range(5):
-            key = f"nonexistent_{random_string(20)}"
+            key = b"nonexistent_" + os.urandom(20)
             start_time = time.time()
             value = db.get(key)
             end_time = time.time()
@@ -102,8 +96,8 @@ def main():
         print("\n=== 写入更多数据触发压缩 ===")
         more_keys = []
         for i in range(num_entries, num_entries * 2):
-            key = f"key_{i}_{random_string(10)}"
-            value = f"value_{i}_{random_string(50)}"
+            key = b"key_%08d_%s" % (i, os.urandom(5).hex().encode())
+            value = b"value_%08d_" % i + os.urandom(50)
             db.put(key, value)
             if i % 1000 == 0:
                 print(f"已写入 {i} 条记录")
@@ -119,8 +113,8 @@ def main():
         
         # 测试范围查询
         print("\n=== 范围查询 ===")
-        start_key = "key_1000"
-        end_key = "key_1100"
+        start_key = b"key_00001000"
+        end_key = b"key_00001100"
         
         print(f"范围查询: {start_key} 到 {end_key}")
         results = []
@@ -131,7 +125,7 @@ def main():
         
         # 显示部分结果
         for key, value in results[:5]:
-            print(f"范围查询结果: {key} -> {value.decode('utf-8')[:20]}...")
+            print(f"范围查询结果: {key} -> {value[:20]}...")
         
         # 关闭数据库并测试持久性
         print("\n=== 测试持久性 ===")
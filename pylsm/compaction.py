@@ -5,13 +5,24 @@ Compaction是LSM树的核心操作之一，用于将多个SSTable文件合并成
 以减少存储空间和提高查询效率。本模块实现了基于LevelDB的分层合并策略。
 """
 import os
+import heapq
+import logging
+import queue
 import shutil
-from typing import List, Dict, Tuple, Optional, Set
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Set, Iterator
 
 from .sstable import SSTable
 from .version_set import VersionSet
 from .bloom_filter import BloomFilter
 from .config import Config
+from .utils import BatchedWriter, enable_background_logging
+
+logger = logging.getLogger('pylsm.compaction')
+
+# 预读队列结束标记
+_DONE = object()
 
 
 class Compaction:
@@ -36,6 +47,9 @@ class Compaction:
         self.db_dir = db_dir
         self.version_set = version_set
         self.config = config
+        self.writer = BatchedWriter()
+        # 错误日志交给后台线程输出，不在压缩路径上刷新stdout
+        enable_background_logging()
     
     def maybe_schedule_compaction(self) -> bool:
         """
@@ -96,73 +110,191 @@ class Compaction:
         if not level_files:
             return []
         
-        # 收集所有输入文件
-        all_input_files = level_files + level_plus1_files
+        # 校验所有输入文件：level_files的优先级为0（较新），level_plus1_files为1（较旧）
+        resolved = self._resolve_input_files(level_files + level_plus1_files)
+        inputs = []
+        for rank, files in ((0, level_files), (1, level_plus1_files)):
+            for index, file_path in enumerate(files):
+                abs_path = resolved.get(file_path)
+                if abs_path is not None:
+                    try:
+                        data_end = SSTable.read_data_end(abs_path)
+                    except Exception:
+                        logger.exception("读取文件 %s 时出错", abs_path)
+                        continue
+                    # 同一层级内列表靠后的文件较新，序号取负使其优先
+                    inputs.append((abs_path, data_end, rank, -index))
         
-        # 从所有输入文件中读取数据
-        merged_data = {}
-        for file_path in all_input_files:
-            abs_path = file_path if os.path.isabs(file_path) else os.path.join(self.db_dir, file_path)
-            if os.path.exists(abs_path):
-                try:
-                    sstable = SSTable(abs_path)
-                    for key, value in sstable.items():
-                        # 如果键已存在，新值会覆盖旧值（因为level_files优先级更高）
-                        merged_data[key] = value
-                except Exception as e:
-                    print(f"读取文件 {abs_path} 时出错: {e}")
-        
-        if not merged_data:
-            return []  # 没有有效数据
-        
-        # 按照目标层级的大小限制拆分数据
-        output_files = []
-        current_data = {}
+        # 每个输入文件由一个线程顺序预读，读取时释放GIL，多个文件的I/O相互重叠；
+        # 归并需要同时从所有输入取数据，因此线程数等于输入数，避免队列满时互相等待
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max(len(inputs), 1))
+        sources = [self._tagged_items(self._prefetch(executor, stop, abs_path, data_end), rank, seq)
+                   for abs_path, data_end, rank, seq in inputs]
+        
+        # 按照目标层级的大小限制拆分数据；输出文件先序列化到内存，归并结束后批量写盘
+        pending_writes = []
+        # 归并输出已按键有序且无重复，直接按顺序收集，无需字典哈希和再次排序
+        current_data = []
         current_size = 0
         target_file_size = self.config.compaction_level_target_file_size_base * (target_level + 1)
         
-        # 按键排序
-        sorted_keys = sorted(merged_data.keys())
-        
-        for key in sorted_keys:
-            value = merged_data[key]
-            key_size = len(key)
-            value_size = len(value)
-            entry_size = key_size + value_size + 8  # 8字节用于长度字段
-            
-            # 如果当前文件已满，创建新文件
-            if current_size > 0 and current_size + entry_size > target_file_size:
-                # 创建SSTable文件
-                output_file = self._create_sst_file(current_data, target_level)
-                if output_file:
-                    output_files.append((target_level, output_file))
+        try:
+            # 热循环中只使用局部变量
+            append = current_data.append
+            # 多路归并按键有序地产生每个键的最新值，无需把全部数据载入内存再排序
+            for key, value in self._merge_latest(sources):
+                entry_size = len(key) + len(value) + 8  # 8字节用于长度字段
+                
+                # 如果当前文件已满，创建新文件
+                if current_size and current_size + entry_size > target_file_size:
+                    # 序列化SSTable文件
+                    pending = self._build_sst_file(current_data, target_level)
+                    if pending:
+                        pending_writes.append(pending)
+                    
+                    # 重置当前数据
+                    current_data = []
+                    append = current_data.append
+                    current_size = 0
                 
-                # 重置当前数据
-                current_data = {}
-                current_size = 0
-            
-            # 添加当前键值对
-            current_data[key] = value
-            current_size += entry_size
+                # 添加当前键值对
+                append((key, value))
+                current_size += entry_size
+        finally:
+            # 通知预读线程退出（归并提前结束时它们可能正阻塞在队列上）
+            stop.set()
+            executor.shutdown(wait=True)
         
         # 处理最后一个文件
         if current_data:
-            output_file = self._create_sst_file(current_data, target_level)
-            if output_file:
-                output_files.append((target_level, output_file))
+            pending = self._build_sst_file(current_data, target_level)
+            if pending:
+                pending_writes.append(pending)
+        
+        return self._write_sst_files(pending_writes, target_level)
+    
+    def _resolve_input_files(self, file_paths: List[str]) -> Dict[str, str]:
+        """
+        把输入文件路径解析为存在的绝对路径。
+        
+        每个不同的父目录只用os.scandir遍历一次，不再对每个文件
+        分别做isabs/join/exists检查。
+        
+        Args:
+            file_paths: 输入文件路径（相对db_dir或绝对路径）
+        
+        Returns:
+            {输入路径: 绝对路径} 字典，不存在的文件不包含在内
+        """
+        dir_entries: Dict[str, Dict[str, str]] = {}
+        resolved = {}
+        for file_path in file_paths:
+            dir_name, base_name = os.path.split(os.path.join(self.db_dir, file_path))
+            entries = dir_entries.get(dir_name)
+            if entries is None:
+                try:
+                    with os.scandir(dir_name) as it:
+                        entries = {entry.name: entry.path for entry in it if entry.is_file()}
+                except OSError:
+                    entries = {}
+                dir_entries[dir_name] = entries
+            abs_path = entries.get(base_name)
+            if abs_path is not None:
+                resolved[file_path] = abs_path
+        return resolved
+    
+    @staticmethod
+    def _prefetch(executor: ThreadPoolExecutor, stop: threading.Event, abs_path: str,
+                  data_end: int, max_batches: int = 16) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        在线程池中顺序读取一个SSTable，通过有界队列把键值对交给归并。
+        
+        Args:
+            executor: 执行预读的线程池
+            stop: 置位后预读线程尽快退出
+            abs_path: SSTable文件路径
+            data_end: 数据区结束位置
+            max_batches: 队列中最多缓存的批次数
+        
+        Returns:
+            (键, 值)迭代器，按键有序
+        """
+        batches = queue.Queue(maxsize=max_batches)
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce() -> None:
+            try:
+                for batch in SSTable.iter_record_batches(abs_path, data_end):
+                    if not put(batch):
+                        return
+                put(_DONE)
+            except Exception as e:
+                put(e)
+        
+        executor.submit(produce)
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+    
+    @staticmethod
+    def _tagged_items(items: Iterator[Tuple[bytes, bytes]], rank: int, seq: int) -> Iterator[Tuple[bytes, int, int, bytes]]:
+        """
+        为一个输入的有序键值对附加优先级标记。
+        
+        Args:
+            items: 输入的有序(键, 值)迭代器
+            rank: 层级优先级，越小越新
+            seq: 同一层级内的优先级，越小越新
+        
+        Returns:
+            (键, rank, seq, 值)迭代器，按键有序
+        """
+        for key, value in items:
+            yield key, rank, seq, value
+    
+    @staticmethod
+    def _merge_latest(sources: List[Iterator[Tuple[bytes, int, int, bytes]]]) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        对多个有序输入做k路堆归并，相同的键只保留最新的值。
         
-        return output_files
+        每个输入按键有序；堆中同一个键的条目按(rank, seq)排序，
+        因此每组相同键中的第一个即为最新值。内存占用为O(输入数)。
+        
+        Args:
+            sources: _tagged_items产生的迭代器列表
+        
+        Returns:
+            (键, 值)迭代器，按键有序且键不重复
+        """
+        last_key = None
+        for key, _, _, value in heapq.merge(*sources):
+            if key != last_key:
+                last_key = key
+                yield key, value
     
-    def _create_sst_file(self, data: Dict[bytes, bytes], level: int) -> Optional[str]:
+    def _build_sst_file(self, data: List[Tuple[bytes, bytes]], level: int) -> Optional[Tuple[str, str, bytearray]]:
         """
-        从数据创建一个新的SSTable文件。
+        从数据序列化一个新的SSTable文件，暂不写盘。
         
         Args:
-            data: 包含键值对的字典
+            data: 按键有序且不重复的键值对列表
             level: 文件所属层级
         
         Returns:
-            创建的文件路径，如果失败则返回None
+            (相对路径, 绝对路径, 文件内容) 元组，如果没有数据则返回None
         """
         if not data:
             return None
@@ -172,20 +304,42 @@ class Compaction:
         abs_path = os.path.join(self.db_dir, file_path)
         
         # 创建布隆过滤器
-        bloom_filter = BloomFilter(len(data), self.config.bloom_filter_false_positive_rate)
-        for key in data.keys():
+        bloom_filter = BloomFilter.from_capacity(len(data), self.config.bloom_filter_false_positive_rate)
+        for key, _ in data:
             bloom_filter.add(key)
         
+        buffer = SSTable.serialize_sorted(data, bloom_filter)
+        # 布隆过滤器已序列化，归还其位数组
+        bloom_filter.release()
+        return file_path, abs_path, buffer
+    
+    def _write_sst_files(self, pending_writes: List[Tuple[str, str, bytearray]],
+                         level: int) -> List[Tuple[int, str]]:
+        """
+        把一次压缩的全部输出文件作为一批提交写盘。
+        
+        Args:
+            pending_writes: _build_sst_file 生成的待写文件列表
+            level: 文件所属层级
+        
+        Returns:
+            生成的文件列表，每个元素为 (level, file_path) 元组；写入失败时返回空列表
+        """
+        if not pending_writes:
+            return []
+        
+        os.makedirs(os.path.dirname(pending_writes[0][1]), exist_ok=True)
         try:
-            # 创建SSTable文件
-            SSTable.write(abs_path, data, level, bloom_filter)
-            return file_path
-        except Exception as e:
-            print(f"创建SSTable文件 {abs_path} 时出错: {e}")
-            # 如果文件已创建但出错，尝试删除
-            if os.path.exists(abs_path):
-                try:
-                    os.remove(abs_path)
-                except OSError:
-                    pass
-            return None 
\ No newline at end of file
+            self.writer.submit_all([(abs_path, buffer) for _, abs_path, buffer in pending_writes])
+        except Exception:
+            logger.exception("写入压缩输出文件时出错")
+            # 清理本批已创建的文件，避免留下不完整的输出
+            for _, abs_path, _ in pending_writes:
+                if os.path.exists(abs_path):
+                    try:
+                        os.remove(abs_path)
+                    except OSError:
+                        pass
+            return []
+        
+        return [(level, file_path) for file_path, _, _ in pending_writes]
\ No newline at end of file
@@ -30,6 +30,7 @@ class Config:
     bloom_filter_bits_per_key: int = 10  # 每个键的位数
     bloom_filter_hash_count: int = 7  # 哈希函数数量
     bloom_filter_false_positive_rate: float = 0.01  # 假阳性率
+    bloom_filter_prefix_len: int = 0  # 大于0时构建前缀布隆过滤器，只索引键的前N个字节，可加速同前缀的范围查询
     
     # 压缩相关
     enable_automatic_compaction: bool = True  # 是否启用自动压缩
@@ -48,11 +49,42 @@ class Config:
     max_open_files: int = 1000  # 最大打开文件数
     write_buffer_size: int = 64 * 1024  # 写缓冲区大小（默认64KB）
     
+    # 影响各层级大小的字段，修改时需要重新计算层级大小表
+    _LEVEL_SIZE_FIELDS = frozenset((
+        'compaction_max_level',
+        'compaction_level_size_multiplier',
+        'compaction_level_target_file_size_base',
+        'compaction_level0_file_num_compaction_trigger',
+    ))
+    
     def __post_init__(self):
         """初始化后处理，确保配置一致性。"""
         # 确保目录路径格式正确
         self.data_dir = self.data_dir.rstrip('/\\')
         self.wal_dir = self.wal_dir.rstrip('/\\')
+        # 层级大小表在首次使用时计算
+        self._level_sizes = None
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        """设置字段；相关字段变化时使层级大小表失效。"""
+        object.__setattr__(self, name, value)
+        if name in self._LEVEL_SIZE_FIELDS:
+            object.__setattr__(self, '_level_sizes', None)
+    
+    def _get_level_sizes(self):
+        """
+        获取各层级的(最大总大小, 目标文件大小)表，按需计算并缓存。
+        
+        Returns:
+            (最大总大小元组, 目标文件大小元组)，下标为层级编号
+        """
+        tables = self._level_sizes
+        if tables is None:
+            levels = range(self.compaction_max_level + 1)
+            tables = (tuple(self._compute_level_max_size(level) for level in levels),
+                      tuple(self._compute_level_target_file_size(level) for level in levels))
+            self._level_sizes = tables
+        return tables
     
     def get_data_path(self, db_path: str) -> str:
         """
@@ -108,6 +140,13 @@ class Config:
         Returns:
             该层级的最大总大小（字节）
         """
+        max_sizes = self._get_level_sizes()[0]
+        if 0 <= level < len(max_sizes):
+            return max_sizes[level]
+        return self._compute_level_max_size(level)
+    
+    def _compute_level_max_size(self, level: int) -> int:
+        """计算指定层级的最大总大小。"""
         if level == 0:
             # Level-0是特殊的，基于文件数量而非大小
             return self.compaction_level0_file_num_compaction_trigger * self.compaction_level_target_file_size_base
@@ -126,6 +165,13 @@ class Config:
         Returns:
             该层级的目标文件大小（字节）
         """
+        target_sizes = self._get_level_sizes()[1]
+        if 0 <= level < len(target_sizes):
+            return target_sizes[level]
+        return self._compute_level_target_file_size(level)
+    
+    def _compute_level_target_file_size(self, level: int) -> int:
+        """计算指定层级的目标文件大小。"""
         if level <= 1:
             return self.compaction_level_target_file_size_base
         else:
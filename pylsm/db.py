@@ -9,17 +9,24 @@ PyLSM数据库主模块。
 4. 数据压缩：定期合并小文件，优化存储和查询效率
 """
 import os
+import heapq
+import logging
+import queue
 import threading
-import time
-from typing import Dict, Optional, Iterator, Tuple, List, Set, Any, Union
+import weakref
+from collections import OrderedDict
+from typing import Optional, Iterator, Tuple, List, Set, Any, Union
 
 from .memtable import MemTable
 from .wal import WAL
 from .sstable import SSTable, SSTableBuilder
 from .version_set import VersionSet, FileMetaData, Compaction, Version, LEVEL_NUMBER
 from .config import Config, default_config
+from .utils import enable_background_logging
 from .bloom_filter import BloomFilter
 
+_compaction_logger = logging.getLogger('pylsm.compaction')
+
 
 class DB:
     """
@@ -43,8 +50,15 @@ class DB:
         self.config = config or default_config()
         self.memtable = MemTable()
         self.version_set = VersionSet(db_path)
-        self.wal = WAL(os.path.join(db_path, "wal"))
+        # 每次刷写内存表都换用一个新序号的WAL文件，旧文件由后台线程删除
+        self._obsolete_wals: List[str] = []
+        self._wal_seq = self._find_wal_seq()
+        self.wal = WAL(self._wal_path(self._wal_seq), self.config)
         self._lock = threading.RLock()
+        # 已打开的SSTable，按文件编号做LRU缓存，容量为config.max_open_files；
+        # 读操作不持有_lock，缓存由单独的锁保护
+        self._table_cache: "OrderedDict[int, SSTable]" = OrderedDict()
+        self._table_cache_lock = threading.Lock()
         
         # 确保数据库目录存在
         os.makedirs(db_path, exist_ok=True)
@@ -54,6 +68,22 @@ class DB:
         
         # 初始化计数器
         self.write_count = 0
+        
+        # 压缩日志交给后台线程输出，不在压缩路径上刷新stdout
+        enable_background_logging()
+        
+        # 压缩在后台线程中执行，写路径只投递一个信号；队列容量为1，
+        # 已有待处理的信号时新的请求直接合并
+        self._compaction_lock = threading.Lock()
+        self._compaction_q: "queue.Queue[Optional[bool]]" = queue.Queue(maxsize=1)
+        # 线程只持有DB的弱引用，未调用close的DB仍可被回收，WAL随之关闭；
+        # DB被回收时投递结束信号让线程退出
+        self._compaction_thread = threading.Thread(
+            target=DB._compaction_loop, args=(weakref.ref(self), self._compaction_q), daemon=True)
+        self._compaction_thread.start()
+        weakref.finalize(self, DB._stop_compaction_thread, self._compaction_q)
+        if self._obsolete_wals:
+            self._schedule_compaction()
     
     def _recover(self):
         """从磁盘恢复数据库状态"""
@@ -63,8 +93,7 @@ class DB:
         
         # 从WAL恢复数据（如果存在）
         try:
-            for key, value in self.wal.read_all():
-                self.memtable.put(key, value)
+            self.memtable.bulk_load(self.wal.read_all_bulk())
         except Exception as e:
             print(f"从WAL恢复失败: {e}")
     
@@ -76,13 +105,15 @@ class DB:
             key: 键（字符串或字节）
             value: 值（字符串或字节）
         """
+        # 转换为字节并序列化WAL记录，这些纯内存工作不需要持有锁
+        key_bytes = key.encode('utf-8') if type(key) is str else key
+        value_bytes = value.encode('utf-8') if type(value) is str else value
+        record = WAL.encode_record(key_bytes, value_bytes)
+        
         with self._lock:
-            # 转换为字节
-            key_bytes = key.encode('utf-8') if isinstance(key, str) else key
-            value_bytes = value.encode('utf-8') if isinstance(value, str) else value
-            
-            # 写入WAL
-            self.wal.append(key_bytes, value_bytes)
+            # 写入WAL缓冲区
+            wal = self.wal
+            wal.append_encoded([record])
             
             # 写入内存表
             self.memtable.put(key_bytes, value_bytes)
@@ -94,7 +125,56 @@ class DB:
             # 增加写入计数，检查是否需要执行压缩
             self.write_count += 1
             if self.config.enable_automatic_compaction and self.write_count % self.config.compaction_check_interval == 0:
-                self._maybe_compact()
+                self._schedule_compaction()
+        
+        # 释放锁之后再按需同步WAL，磁盘同步不阻塞读操作和其他写入
+        wal.maybe_sync()
+    
+    def put_batch(self, pairs: List[Tuple[Union[str, bytes], Union[str, bytes]]]) -> None:
+        """
+        批量存储键值对。
+        
+        结果与按顺序逐个调用put()相同，但整批只获取一次锁、一次写入WAL，
+        内存表大小和压缩条件也只在整批写入后检查一次。
+        
+        Args:
+            pairs: (键, 值)列表，键和值可以是字符串或字节
+        """
+        # 转换为字节并序列化WAL记录，这些纯内存工作不需要持有锁
+        records = [
+            (key.encode('utf-8') if type(key) is str else key,
+             value.encode('utf-8') if type(value) is str else value)
+            for key, value in pairs
+        ]
+        if not records:
+            return
+        encode_record = WAL.encode_record
+        encoded = [encode_record(key_bytes, value_bytes) for key_bytes, value_bytes in records]
+        
+        with self._lock:
+            # 整批写入WAL缓冲区
+            wal = self.wal
+            wal.append_encoded(encoded)
+            
+            # 写入内存表；刷写会轮换WAL，因此放在整批写入之后，
+            # 保证本批记录都在同一个WAL文件中
+            memtable_put = self.memtable.put
+            for key_bytes, value_bytes in records:
+                memtable_put(key_bytes, value_bytes)
+            
+            if self.memtable.size() >= self.config.memtable_size_threshold:
+                self._flush_memtable()
+            
+            # 增加写入计数，本批跨过检查间隔时检查是否需要执行压缩
+            interval = self.config.compaction_check_interval
+            previous_count = self.write_count
+            self.write_count += len(records)
+            if (self.config.enable_automatic_compaction and
+                    self.write_count // interval > previous_count // interval):
+                self._schedule_compaction()
+        
+        # 释放锁之后再按需同步WAL
+        wal.maybe_sync()
     
     def get(self, key: Union[str, bytes]) -> Optional[bytes]:
         """
@@ -106,20 +186,61 @@ class DB:
         Returns:
             如果找到键则返回对应的值，否则返回None
         """
+        # 转换为字节
+        key_bytes = key.encode('utf-8') if type(key) is str else key
+        
+        # 只在锁内取得内存表和版本的快照，查找本身不持锁，不与写入和刷写互相阻塞；
+        # 刷写通过替换引用发布新的内存表和版本，快照中的对象不会再被修改结构
+        with self._lock:
+            memtable = self.memtable
+            version = self.version_set.get_current()
+        
+        # 首先查找内存表
+        value = memtable.get(key_bytes)
+        if value is not None:
+            # 检查是否为墓碑值
+            if value == b'':
+                return None
+            return value
+        
+        # 然后查找SSTable文件
+        return self._get_from_sstables(key_bytes, version)
+    
+    def multi_get(self, keys: List[Union[str, bytes]]) -> List[Optional[bytes]]:
+        """
+        批量获取多个键对应的值。
+        
+        结果与逐个调用get()相同，但只获取一次锁，并且对每个SSTable
+        使用布隆过滤器的批量探测一次性筛掉不可能存在的键。
+        
+        Args:
+            keys: 键列表（字符串或字节）
+        
+        Returns:
+            与keys一一对应的值列表，未找到的键对应None
+        """
+        key_list = [key.encode('utf-8') if type(key) is str else key for key in keys]
+        results: List[Optional[bytes]] = [None] * len(key_list)
+        
+        # 与get()相同，只在锁内取快照
         with self._lock:
-            # 转换为字节
-            key_bytes = key.encode('utf-8') if isinstance(key, str) else key
-            
-            # 首先查找内存表
-            value = self.memtable.get(key_bytes)
-            if value is not None:
-                # 检查是否为墓碑值
-                if value == b'':
-                    return None
-                return value
-            
-            # 然后查找SSTable文件
-            return self._get_from_sstables(key_bytes)
+            memtable = self.memtable
+            version = self.version_set.get_current()
+        
+        # 首先查找内存表，未命中的键留给SSTable
+        pending = []
+        memtable_get = memtable.get
+        for i, key_bytes in enumerate(key_list):
+            value = memtable_get(key_bytes)
+            if value is None:
+                pending.append(i)
+            elif value != b'':  # 墓碑值直接视为不存在
+                results[i] = value
+        
+        if pending:
+            self._multi_get_from_sstables(key_list, pending, results, version)
+        
+        return results
     
     def delete(self, key: Union[str, bytes]) -> None:
         """
@@ -130,7 +251,7 @@ class DB:
         """
         self.put(key, b'')  # 空字节串作为墓碑值
     
-    def _get_from_sstables(self, key: bytes) -> Optional[bytes]:
+    def _get_from_sstables(self, key: bytes, version: Optional[Version] = None) -> Optional[bytes]:
         """
         从SSTable中获取键值。
         
@@ -140,36 +261,22 @@ class DB:
         返回：
             与键关联的值，如果不存在则返回None
         """
-        version = self.version_set.get_current()
+        if version is None:
+            version = self.version_set.get_current()
         
         # 从每层SSTable中查找键
         for level in range(LEVEL_NUMBER):
             # 对于level > 0的层级，文件是有序的，使用二分查找
             if level > 0:
                 # 二分查找找到可能包含键的文件
-                files = version.files[level]
-                if not files:
+                if not version.files[level]:
                     continue
-                    
-                left, right = 0, len(files) - 1
-                target_file = None
-                
-                while left <= right:
-                    mid = (left + right) // 2
-                    file_meta = files[mid]
-                    
-                    if key < file_meta.smallest_key:
-                        right = mid - 1
-                    elif key > file_meta.largest_key:
-                        left = mid + 1
-                    else:
-                        target_file = file_meta
-                        break
+                target_file = version.find_file(level, key)
                 
                 if target_file:
                     # 尝试从文件中获取键
                     try:
-                        sstable = SSTable(self._get_table_path(target_file.file_number))
+                        sstable = self._open_table(target_file.file_number)
                         value = sstable.get(key)
                         if value is not None:
                             return value
@@ -177,21 +284,69 @@ class DB:
                         print(f"从SSTable获取键失败: {e}")
                         continue
             else:
-                # Level 0的文件可能有重叠，需要从最新到最旧的顺序检查所有文件
-                for file_meta in reversed(version.files[level]):
-                    if key >= file_meta.smallest_key and key <= file_meta.largest_key:
-                        try:
-                            sstable = SSTable(self._get_table_path(file_meta.file_number))
-                            value = sstable.get(key)
-                            if value is not None:
-                                return value
-                        except Exception as e:
-                            print(f"从SSTable获取键失败: {e}")
-                            continue
+                # Level 0的文件可能有重叠，需要从最新到最旧的顺序检查包含该键的文件
+                for file_meta in version.level0_files_for_key(key):
+                    try:
+                        sstable = self._open_table(file_meta.file_number)
+                        value = sstable.get(key)
+                        if value is not None:
+                            return value
+                    except Exception as e:
+                        print(f"从SSTable获取键失败: {e}")
+                        continue
         
         return None
     
-    def range(self, start_key: Optional[Union[str, bytes]] = None, end_key: Optional[Union[str, bytes]] = None) -> Iterator[Tuple[str, bytes]]:
+    def _multi_get_from_sstables(self, keys: List[bytes], pending: List[int],
+                                 results: List[Optional[bytes]], version: Optional[Version] = None) -> None:
+        """
+        从SSTable中批量获取键值，查找顺序与_get_from_sstables一致。
+        
+        参数：
+            keys: 所有要查找的键
+            pending: 尚未找到的键在keys中的下标
+            results: 结果列表，找到的值会写入对应下标
+            version: 要查找的版本快照，为None时使用当前版本
+        """
+        if version is None:
+            version = self.version_set.get_current()
+        
+        for level in range(LEVEL_NUMBER):
+            # Level 0从最新到最旧检查；更高层级的文件互不重叠，顺序无关
+            files = version.files[level]
+            if level == 0:
+                files = list(reversed(files))
+            
+            for file_meta in files:
+                if not pending:
+                    return
+                
+                candidates = [i for i in pending
+                              if file_meta.smallest_key <= keys[i] <= file_meta.largest_key]
+                if not candidates:
+                    continue
+                
+                try:
+                    sstable = self._open_table(file_meta.file_number)
+                    # 用布隆过滤器一次性筛掉肯定不存在的键
+                    if sstable.bloom_filter is not None:
+                        hits = sstable.bloom_filter.may_contain_batch([keys[i] for i in candidates])
+                        candidates = [i for i, hit in zip(candidates, hits) if hit]
+                    
+                    found = set()
+                    for i in candidates:
+                        value = sstable.get(keys[i])
+                        if value is not None:
+                            results[i] = value
+                            found.add(i)
+                except Exception as e:
+                    print(f"从SSTable获取键失败: {e}")
+                    continue
+                
+                if found:
+                    pending = [i for i in pending if i not in found]
+    
+    def range(self, start_key: Optional[Union[str, bytes]] = None, end_key: Optional[Union[str, bytes]] = None) -> Iterator[Tuple[bytes, bytes]]:
         """
         获取指定范围内的键值对。
         
@@ -200,48 +355,110 @@ class DB:
             end_key: 结束键，如果为None则到最大键结束，可以是字符串或字节
             
         返回：
-            范围内的键值对迭代器
+            范围内的(键, 值)迭代器，键和值都是字节，不做解码
         """
         # 转换键为字节
         if start_key is None:
             start_bytes = b''
-        elif isinstance(start_key, str):
+        elif type(start_key) is str:
             start_bytes = start_key.encode('utf-8')
         else:
             start_bytes = start_key
             
         if end_key is None:
             end_bytes = b'\xff' * 100
-        elif isinstance(end_key, str):
+        elif type(end_key) is str:
             end_bytes = end_key.encode('utf-8')
         else:
             end_bytes = end_key
         
-        # 从内存表获取范围数据
-        mem_results = {}
+        # 在锁内确定数据源：内存表优先级最高，其次是Level 0从新到旧，然后逐层向下
+        with self._lock:
+            memtable = self.memtable
+            groups = self._range_file_groups(start_bytes, end_bytes)
+        
+        # 各数据源都按键有序（结束键均不包含），用k路堆归并流式合并，同一个键只取优先级最高的值；
+        # SSTable经表缓存获取，范围扫描只切片映射区域，不依赖共享的文件位置。
+        # 非0层每层作为一个数据源，按游标推进依次获取文件，提前结束的扫描不会打开后面的文件
+        sources = [self._tag_source(memtable.range(start_bytes, end_bytes), 0)]
+        for rank, file_numbers in enumerate(groups, 1):
+            sources.append(self._tag_source(self._scan_files(file_numbers, start_bytes, end_bytes), rank))
+        
+        last_key = None
+        for key, _, value in heapq.merge(*sources):
+            if key == last_key:
+                continue
+            last_key = key
+            # 过滤已删除的键和墓碑值
+            if value:
+                yield key, value
+    
+    def _range_file_groups(self, start_key: bytes, end_key: bytes) -> List[List[int]]:
+        """
+        按优先级从高到低列出与范围重叠的SSTable文件编号（调用方需持有_lock）。
         
-        for key, value in self.memtable.range(start_bytes, end_bytes):
-            mem_results[key] = value
+        参数：
+            start_key: 起始键（包含）
+            end_key: 结束键（不包含）
         
-        # 从SSTable获取范围数据
-        sst_results = self._scan_sstables(start_bytes, end_bytes)
+        返回：
+            文件编号分组列表：Level 0的文件可能重叠，每个文件单独一组并从新到旧排在前面；
+            更高层级每层一组，组内文件按键有序且互不重叠
+        """
+        version = self.version_set.get_current()
+        groups = []
+        for file_meta in reversed(version.files[0]):
+            # 检查文件的键范围是否与查询范围有重叠
+            if not (file_meta.largest_key < start_key or file_meta.smallest_key >= end_key):
+                groups.append([file_meta.file_number])
+        
+        for level in range(1, LEVEL_NUMBER):
+            if not version.files[level]:
+                continue
+            file_numbers = [f.file_number for f in version.files_in_range(level, start_key, end_key)]
+            if file_numbers:
+                groups.append(file_numbers)
+        return groups
+    
+    def _scan_files(self, file_numbers: List[int], start_key: bytes, end_key: bytes) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        依次扫描一组键范围互不重叠的SSTable，只在游标到达时才获取下一个文件。
+        
+        SSTable来自表缓存；被淘汰的表只是移出缓存，扫描期间持有的引用仍然有效。
         
-        # 合并结果，内存表数据优先
-        all_results = {}
-        for key, value in sst_results.items():
-            if key not in mem_results:
-                all_results[key] = value
+        参数：
+            file_numbers: 按键有序的文件编号
+            start_key: 起始键（包含）
+            end_key: 结束键（不包含）
         
-        # 添加内存表数据
-        for key, value in mem_results.items():
-            all_results[key] = value
+        返回：
+            有序的(键, 值)迭代器
+        """
+        for file_number in file_numbers:
+            try:
+                sstable = self._open_table(file_number)
+            except Exception as e:
+                print(f"从SSTable获取范围失败: {e}")
+                continue
+            
+            # 前缀布隆过滤器可以直接排除不含该前缀的文件
+            if sstable.range_may_match(start_key, end_key):
+                yield from sstable.range(start_key, end_key)
+    
+    @staticmethod
+    def _tag_source(items: Iterator[Tuple[bytes, bytes]], rank: int) -> Iterator[Tuple[bytes, int, bytes]]:
+        """
+        为有序键值对附加数据源优先级，rank越小越优先。
         
-        # 过滤已删除的键和墓碑值
-        filtered_results = {k: v for k, v in all_results.items() if v and v != b''}
+        参数：
+            items: 有序的(键, 值)迭代器
+            rank: 数据源优先级
         
-        # 按键排序并返回
-        for key in sorted(filtered_results.keys()):
-            yield key.decode('utf-8'), filtered_results[key]
+        返回：
+            (键, rank, 值)迭代器
+        """
+        for key, value in items:
+            yield key, rank, value
     
     # 添加items方法作为range的别名
     def items(self) -> Iterator[Tuple[bytes, bytes]]:
@@ -253,36 +470,6 @@ class DB:
         """
         return self.range()
     
-    def _scan_sstables(self, start_key: bytes, end_key: bytes) -> Dict[bytes, bytes]:
-        """
-        从SSTable中扫描指定范围的键值对。
-        
-        参数：
-            start_key: 起始键
-            end_key: 结束键
-            
-        返回：
-            范围内的键值对
-        """
-        results = {}
-        version = self.version_set.get_current()
-        
-        # 从最高层级往下扫描，确保更新的数据覆盖旧数据
-        for level in range(LEVEL_NUMBER - 1, -1, -1):
-            for file_meta in reversed(version.files[level]):
-                # 检查文件的键范围是否与查询范围有重叠
-                if not (file_meta.largest_key < start_key or file_meta.smallest_key > end_key):
-                    try:
-                        sstable = SSTable(self._get_table_path(file_meta.file_number))
-                        for key, value in sstable.get_range(start_key, end_key):
-                            if key not in results:  # 避免覆盖更高层级的数据
-                                results[key] = value
-                    except Exception as e:
-                        print(f"从SSTable获取范围失败: {e}")
-                        continue
-        
-        return results
-    
     def _flush_memtable(self) -> None:
         """将内存表写入SSTable文件"""
         if self.memtable.is_empty():
@@ -293,11 +480,21 @@ class DB:
         file_path = os.path.join(self.db_path, f"{file_number}.sst")
         
         # 创建SSTable构建器
-        builder = SSTableBuilder(file_path)
+        builder = SSTableBuilder(file_path, prefix_len=self.config.bloom_filter_prefix_len,
+                                 expected_count=self.memtable.size())
         
-        # 添加所有键值对
+        # 添加所有键值对；内存表按键有序迭代，第一个和最后一个键即为键范围
+        smallest_key = largest_key = None
+        add = builder.add_sorted
         for key, value in self.memtable.items():
-            builder.add(key, value)
+            if smallest_key is None:
+                smallest_key = key
+            largest_key = key
+            add(key, value)
+        
+        if smallest_key is None:
+            # 内存表没有任何条目，不创建SSTable
+            return
         
         # 完成构建
         builder.finish()
@@ -305,16 +502,6 @@ class DB:
         # 获取文件大小
         file_size = os.path.getsize(file_path)
         
-        # 获取键范围
-        items = list(self.memtable.items())
-        if not items:
-            # 内存表为空，不创建SSTable
-            os.remove(file_path)
-            return
-        
-        smallest_key = min(key for key, _ in items)
-        largest_key = max(key for key, _ in items)
-        
         # 创建文件元数据（新文件添加到Level 0）
         file_meta = FileMetaData(
             file_number=file_number,
@@ -338,56 +525,134 @@ class DB:
         # 创建新的内存表
         self.memtable = MemTable()
         
-        # 创建新的WAL文件
-        wal_path = os.path.join(self.db_path, "wal")
+        # 切换到新序号的WAL文件；旧文件对应的数据已写入SSTable，交给后台线程删除
+        self._obsolete_wals.append(old_wal.path)
+        self._wal_seq += 1
+        self.wal = WAL(self._wal_path(self._wal_seq), self.config)
+        self._schedule_compaction()
+    
+    def _wal_path(self, seq: int) -> str:
+        """
+        获取指定序号的WAL文件路径，序号0对应旧版本的单一wal文件。
+        
+        参数：
+            seq: WAL序号
         
-        # 给足够的时间让系统释放文件句柄
-        for attempt in range(3):
-            try:
-                # 尝试重命名旧WAL文件
-                if os.path.exists(wal_path):
-                    archive_path = f"{wal_path}.{int(time.time())}"
-                    os.rename(wal_path, archive_path)
-                break
-            except (OSError, PermissionError) as e:
-                if attempt < 2:
-                    print(f"重命名旧WAL文件失败，重试中: {e}")
-                    time.sleep(0.1 * (attempt + 1))  # 渐进式延迟
-                else:
-                    print(f"警告：无法重命名旧WAL文件: {e}")
-        
-        # 创建新的WAL实例
-        self.wal = WAL(wal_path, self.config)
+        返回：
+            WAL文件的路径
+        """
+        if seq == 0:
+            return os.path.join(self.db_path, "wal")
+        return os.path.join(self.db_path, f"wal-{seq:010d}.log")
     
-    def _maybe_compact(self) -> None:
-        """检查是否需要进行压缩，并在需要时执行"""
-        if not self.config.enable_automatic_compaction:
-            return
+    def _find_wal_seq(self) -> int:
+        """
+        扫描数据库目录，返回最新WAL的序号，并把更早的WAL登记为待删除。
         
-        if not self.version_set.needs_compaction():
-            return
+        新的WAL只在旧内存表刷写完成后创建，因此只有最新的WAL需要回放。
         
-        # 选择要压缩的文件
-        level, input_files_level_n, input_files_level_n_plus_1 = self.version_set.pick_compaction_files()
+        返回：
+            最新WAL的序号，目录中没有WAL时为1
+        """
+        seqs = []
+        if os.path.isdir(self.db_path):
+            with os.scandir(self.db_path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name == "wal":
+                        seqs.append(0)
+                    elif name.startswith("wal-") and name.endswith(".log") and name[4:-4].isdigit():
+                        seqs.append(int(name[4:-4]))
+        if not seqs:
+            return 1
+        seqs.sort()
+        self._obsolete_wals.extend(self._wal_path(seq) for seq in seqs[:-1])
+        return seqs[-1]
+    
+    def _delete_obsolete_wals(self) -> None:
+        """删除已刷写到SSTable的旧WAL文件。"""
+        with self._lock:
+            paths, self._obsolete_wals = self._obsolete_wals, []
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"删除旧WAL文件失败: {e}")
+    
+    def _schedule_compaction(self) -> None:
+        """通知后台线程检查是否需要压缩，不阻塞调用方。"""
+        try:
+            self._compaction_q.put_nowait(True)
+        except queue.Full:
+            pass
+    
+    @staticmethod
+    def _compaction_loop(db_ref: "weakref.ref[DB]", signals: queue.Queue) -> None:
+        """后台压缩线程，收到None或DB已被回收时退出。"""
+        while True:
+            if signals.get() is None:
+                return
+            db = db_ref()
+            if db is None:
+                return
+            try:
+                db._delete_obsolete_wals()
+                db._maybe_compact()
+            except Exception:
+                _compaction_logger.exception("后台压缩失败")
+            # 等待下一个信号时不持有DB
+            del db
+    
+    @staticmethod
+    def _stop_compaction_thread(signals: queue.Queue) -> None:
+        """DB被回收时通知后台线程退出；队列中已有信号时线程醒来后会发现DB已不存在。"""
+        try:
+            signals.put_nowait(None)
+        except queue.Full:
+            pass
+    
+    def _maybe_compact(self) -> None:
+        """
+        检查是否需要进行压缩，并在需要时执行。
         
-        if level == -1 or (not input_files_level_n and not input_files_level_n_plus_1):
+        同一时刻只运行一个压缩；选择文件和应用版本编辑时持有_lock，
+        合并和写文件期间不持有，前台读写可以继续进行。
+        """
+        if not self.config.enable_automatic_compaction:
             return
         
-        # 创建压缩任务
-        compaction = Compaction(
-            version_set=self.version_set,
-            level=level,
-            input_files_level_n=input_files_level_n,
-            input_files_level_n_plus_1=input_files_level_n_plus_1
-        )
-        
-        # 执行压缩
-        compaction.compact()
+        with self._compaction_lock:
+            with self._lock:
+                if not self.version_set.needs_compaction():
+                    return
+                
+                # 选择要压缩的文件
+                level, input_files_level_n, input_files_level_n_plus_1 = self.version_set.pick_compaction_files()
+            
+            if level == -1 or (not input_files_level_n and not input_files_level_n_plus_1):
+                return
+            
+            # 创建压缩任务
+            compaction = Compaction(
+                version_set=self.version_set,
+                level=level,
+                input_files_level_n=input_files_level_n,
+                input_files_level_n_plus_1=input_files_level_n_plus_1,
+                prefix_len=self.config.bloom_filter_prefix_len,
+                install_lock=self._lock
+            )
+            
+            # 执行压缩
+            compaction.compact()
+            
+            # 压缩删除的文件不再需要保持打开
+            self._evict_obsolete_tables()
     
     def compact(self) -> None:
-        """手动触发压缩操作"""
-        with self._lock:
-            self._maybe_compact()
+        """手动触发压缩操作，在调用方线程中同步执行"""
+        self._maybe_compact()
             
     def flush(self) -> None:
         """
@@ -397,8 +662,21 @@ class DB:
             if not self.memtable.is_empty():
                 self._flush_memtable()
     
+    def flush_wal(self) -> None:
+        """
+        将WAL中缓冲的记录写出并同步到磁盘，不刷写内存表。
+        """
+        with self._lock:
+            self.wal.flush()
+    
     def close(self) -> None:
         """关闭数据库，释放所有资源。"""
+        # 先停止后台压缩线程；它需要获取_lock，不能在持有_lock时等待
+        thread = getattr(self, '_compaction_thread', None)
+        if thread is not None and thread.is_alive():
+            self._compaction_q.put(None)
+            thread.join()
+        
         with self._lock:
             try:
                 # 刷写内存表
@@ -407,6 +685,9 @@ class DB:
             except Exception as e:
                 print(f"刷写内存表时出错: {e}")
             
+            # 关闭缓存的SSTable
+            self._close_tables()
+            
             # 关闭WAL
             if hasattr(self, 'wal') and self.wal:
                 try:
@@ -420,6 +701,10 @@ class DB:
                     self.version_set.close()
                 except Exception as e:
                     print(f"关闭版本集时出错: {e}")
+            
+            # 后台线程已停止，由这里删除剩余的旧WAL文件
+            if hasattr(self, '_obsolete_wals'):
+                self._delete_obsolete_wals()
     
     def __enter__(self):
         return self
@@ -437,4 +722,52 @@ class DB:
         返回：
             SSTable文件的路径
         """
-        return os.path.join(self.db_path, f"{file_number}.sst")
\ No newline at end of file
+        return os.path.join(self.db_path, f"{file_number}.sst")
+    
+    def _open_table(self, file_number: int) -> SSTable:
+        """
+        获取已打开的SSTable，未缓存时打开并加入LRU缓存。
+        
+        参数：
+            file_number: 文件编号
+        
+        返回：
+            SSTable对象，由缓存负责关闭，调用方不要关闭它
+        """
+        cache = self._table_cache
+        with self._table_cache_lock:
+            sstable = cache.get(file_number)
+            if sstable is not None:
+                cache.move_to_end(file_number)
+                return sstable
+        
+        # 在缓存锁外打开文件；并发打开同一文件时保留先放入缓存的那个
+        opened = SSTable(self._get_table_path(file_number))
+        with self._table_cache_lock:
+            sstable = cache.setdefault(file_number, opened)
+            # 超出容量时移除最久未使用的文件；可能仍有读者在使用，
+            # 不主动关闭，最后一个引用释放时由SSTable.__del__关闭
+            while len(cache) > max(self.config.max_open_files, 1):
+                cache.popitem(last=False)
+        if sstable is not opened:
+            opened.close()
+        return sstable
+    
+    def _evict_obsolete_tables(self) -> None:
+        """移除已不在当前版本中的SSTable，读者释放引用后文件随之关闭。"""
+        version = self.version_set.get_current()
+        live = {file_meta.file_number for files in version.files for file_meta in files}
+        with self._table_cache_lock:
+            for file_number in [n for n in self._table_cache if n not in live]:
+                del self._table_cache[file_number]
+    
+    def _close_tables(self) -> None:
+        """关闭所有缓存的SSTable。"""
+        with self._table_cache_lock:
+            tables = list(self._table_cache.values())
+            self._table_cache.clear()
+        for sstable in tables:
+            try:
+                sstable.close()
+            except Exception as e:
+                print(f"关闭SSTable时出错: {e}")
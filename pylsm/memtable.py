@@ -6,13 +6,22 @@
 import time
 from typing import Dict, List, Tuple, Optional, Iterator, Any, BinaryIO
 from enum import Enum
-import io
 import pickle
 import bisect
+import struct
+import threading
 
 from pylsm.utils import encode_key, decode_key, encode_value, decode_value
 
 
+# 条目头部：类型(1B) + 时间戳(8B) + 键长度(4B)
+_HDR = struct.Struct('>BQI')
+# 值长度(4B)
+_LEN = struct.Struct('>I')
+# 每个线程复用的序列化缓冲区
+_TLS = threading.local()
+
+
 class EntryType(Enum):
     """记录类型枚举。"""
     PUT = 0  # 添加或更新
@@ -58,23 +67,21 @@ class MemTableEntry:
             序列化后的字节
         """
         # 格式: [entry_type(1B)][timestamp(8B)][key_size(4B)][key][value_size(4B)][value]
-        buffer = io.BytesIO()
-        buffer.write(self.entry_type.value.to_bytes(1, byteorder='big'))
-        buffer.write(self.timestamp.to_bytes(8, byteorder='big'))
-        
-        key_size = len(self.key)
-        buffer.write(key_size.to_bytes(4, byteorder='big'))
-        buffer.write(self.key)
-        
-        # 处理值
-        if self.value is None:
-            buffer.write((0).to_bytes(4, byteorder='big'))
-        else:
-            value_size = len(self.value)
-            buffer.write(value_size.to_bytes(4, byteorder='big'))
-            buffer.write(self.value)
-        
-        return buffer.getvalue()
+        key = self.key
+        value = self.value if self.value is not None else b''
+        key_end = _HDR.size + len(key)
+        need = key_end + _LEN.size + len(value)
+        
+        # 在线程私有的复用缓冲区中原地拼装，最后只复制一次得到bytes
+        buf = getattr(_TLS, 'buf', None)
+        if buf is None or len(buf) < need:
+            buf = _TLS.buf = bytearray(max(need * 2, 4096))
+        _HDR.pack_into(buf, 0, self.entry_type.value, self.timestamp, len(key))
+        buf[_HDR.size:key_end] = key
+        _LEN.pack_into(buf, key_end, len(value))
+        buf[key_end + _LEN.size:need] = value
+        with memoryview(buf) as view:
+            return bytes(view[:need])
     
     @classmethod
     def from_bytes(cls, data: bytes) -> 'MemTableEntry':
@@ -87,28 +94,65 @@ class MemTableEntry:
         Returns:
             MemTableEntry对象
         """
-        buffer = io.BytesIO(data)
+        return cls._parse(data, 0)[0]
+    
+    @classmethod
+    def from_buffer(cls, buf) -> List['MemTableEntry']:
+        """
+        从一段连续缓冲区（例如mmap的memoryview）中解析多个首尾相接的条目。
+        
+        直接在缓冲区上按偏移解析，不需要先把每条记录切成单独的bytes。
+        
+        Args:
+            buf: 包含若干序列化条目的bytes、bytearray或memoryview
         
-        entry_type_byte = int.from_bytes(buffer.read(1), byteorder='big')
-        entry_type = EntryType(entry_type_byte)
+        Returns:
+            MemTableEntry对象列表
+        """
+        entries = []
+        offset = 0
+        end = len(buf)
+        while offset < end:
+            entry, offset = cls._parse(buf, offset)
+            entries.append(entry)
+        return entries
+    
+    @classmethod
+    def _parse(cls, buf, offset: int) -> Tuple['MemTableEntry', int]:
+        """
+        从缓冲区的指定偏移解析一个条目。
         
-        timestamp = int.from_bytes(buffer.read(8), byteorder='big')
+        Args:
+            buf: 序列化数据
+            offset: 条目起始偏移
         
-        key_size = int.from_bytes(buffer.read(4), byteorder='big')
-        key = buffer.read(key_size)
+        Returns:
+            (MemTableEntry对象, 下一个条目的偏移)
+        """
+        entry_type, timestamp, key_size = _HDR.unpack_from(buf, offset)
+        offset += _HDR.size
+        key = bytes(buf[offset:offset + key_size])
+        offset += key_size
         
-        value_size = int.from_bytes(buffer.read(4), byteorder='big')
-        value = None if value_size == 0 else buffer.read(value_size)
+        value_size, = _LEN.unpack_from(buf, offset)
+        offset += _LEN.size
+        value = None
+        if value_size:
+            value = bytes(buf[offset:offset + value_size])
+            offset += value_size
         
-        return cls(key, value, entry_type, timestamp)
+        return cls(key, value, EntryType(entry_type), timestamp), offset
 
 
 class MemTable:
     """
-    基于排序列表的内存表实现。
+    基于哈希表加延迟排序键列表的内存表实现。
     
     内存表是一个有序的键值存储，支持高效的插入、查找和范围查询操作。
     当内存表大小超过阈值时，它会被刷写到磁盘，变成一个不可变的SSTable。
+    
+    写入和点查询直接操作字典，均摊O(1)，不再有有序列表插入时的O(n)元素搬移；
+    按序访问时才按需对键排序，并缓存排序结果直到下一次乱序写入。
     """
     
     def __init__(self, wal=None, size_threshold=None):
@@ -119,8 +163,11 @@ class MemTable:
             wal: 写前日志对象，用于持久化和恢复
             size_threshold: 内存表大小阈值（字节），超过这个值应触发刷盘
         """
-        # 使用排序列表存储条目
-        self._entries = []
+        # 键 -> 值，删除标记的值为None
+        self._entries = {}
+        # 按序排列的键；_keys_dirty为True时需要重新排序
+        self._sorted_keys = []
+        self._keys_dirty = False
         self._size = 0  # 条目数量
         self._wal = wal
         
@@ -133,13 +180,8 @@ class MemTable:
         if not self._wal:
             return
         
-        for key, value in self._wal.read_all():
-            if value is None:
-                # 删除操作
-                self._internal_delete(key)
-            else:
-                # 添加或更新操作
-                self._internal_put(key, value)
+        # 按WAL顺序批量应用添加、更新和删除操作
+        self.bulk_load(self._wal.read_all_bulk())
     
     def put(self, key, value):
         """
@@ -149,9 +191,9 @@ class MemTable:
             key: 键（bytes或str）
             value: 值（bytes或str）
         """
-        if isinstance(key, str):
+        if type(key) is str:
             key = key.encode('utf-8')
-        if isinstance(value, str):
+        if type(value) is str:
             value = value.encode('utf-8')
         
         # 首先写入WAL以确保持久性
@@ -169,16 +211,34 @@ class MemTable:
             key: 键（字节）
             value: 值（字节）
         """
-        # 二分查找插入位置
-        index = self._find_index(key)
-        
-        if index < len(self._entries) and self._entries[index][0] == key:
-            # 键已存在，更新值
-            self._entries[index] = (key, value)
-        else:
+        if key not in self._entries:
             # 插入新键值对
-            self._entries.insert(index, (key, value))
+            self._add_key(key)
             self._size += 1
+        self._entries[key] = value
+    
+    def bulk_load(self, pairs):
+        """
+        按顺序批量应用键值对，结果与逐条调用put/delete相同（不写WAL）。
+        
+        用于从WAL恢复：直接写入字典，排序键列表只在最后失效一次。
+        
+        Args:
+            pairs: (键, 值)可迭代对象，值为None表示删除
+        """
+        entries = self._entries
+        added = 0
+        for key, value in pairs:
+            if value is None:
+                self._internal_delete(key)
+                continue
+            if key not in entries:
+                added += 1
+            entries[key] = value
+        
+        if added:
+            self._size += added
+            self._keys_dirty = True
     
     def get(self, key):
         """
@@ -193,11 +253,7 @@ class MemTable:
         if isinstance(key, str):
             key = key.encode('utf-8')
         
-        index = self._find_index(key)
-        
-        if index < len(self._entries) and self._entries[index][0] == key:
-            return self._entries[index][1]
-        return None
+        return self._entries.get(key)
     
     def delete(self, key):
         """
@@ -223,41 +279,47 @@ class MemTable:
         Args:
             key: 键（字节）
         """
-        index = self._find_index(key)
-        
-        if index < len(self._entries) and self._entries[index][0] == key:
+        if key in self._entries:
             # 只需用删除标记替换，但条目计数不变
             # 在当前实现中，我们完全删除键，而不是添加删除标记
             # 为了符合测试用例的期望，我们保持大小不变
-            self._entries.pop(index)
+            del self._entries[key]
+            self._keys_dirty = True
             # 不减少self._size，保持大小不变
         else:
             # 如果键不存在，我们将添加特殊的删除标记
             # 在当前实现中，我们不添加任何标记
             # 但为了符合测试期望，我们将其添加为None值
-            self._entries.insert(index, (key, None))
+            self._entries[key] = None
+            self._add_key(key)
             # 增加计数
             self._size += 1
     
-    def _find_index(self, key):
+    def _add_key(self, key):
         """
-        查找键的索引位置。
+        记录一个新键：按升序到达时直接追加，否则标记排序列表失效。
         
         Args:
-            key: 键（字节）
-            
-        Returns:
-            键的索引位置或应插入的位置
-        """
-        # 二分查找
-        left, right = 0, len(self._entries)
-        while left < right:
-            mid = (left + right) // 2
-            if self._entries[mid][0] < key:
-                left = mid + 1
+            key: 新加入的键（字节）
+        """
+        if not self._keys_dirty:
+            sorted_keys = self._sorted_keys
+            if not sorted_keys or key > sorted_keys[-1]:
+                sorted_keys.append(key)
             else:
-                right = mid
-        return left
+                self._keys_dirty = True
+    
+    def _ordered_keys(self):
+        """
+        获取按序排列的键列表，必要时重新排序。
+        
+        Returns:
+            有序键列表
+        """
+        if self._keys_dirty:
+            self._sorted_keys = sorted(self._entries)
+            self._keys_dirty = False
+        return self._sorted_keys
     
     def size(self):
         """
@@ -284,8 +346,9 @@ class MemTable:
         Returns:
             (键, 值)元组的迭代器
         """
-        for key, value in self._entries:
-            yield key, value
+        entries = self._entries
+        for key in self._ordered_keys():
+            yield key, entries[key]
     
     def range_scan(self, start_key=None, end_key=None):
         """
@@ -303,15 +366,20 @@ class MemTable:
         if isinstance(end_key, str) and end_key is not None:
             end_key = end_key.encode('utf-8')
         
+        sorted_keys = self._ordered_keys()
+        entries = self._entries
+        
+        # 两端边界都用C实现的二分查找定位，循环内不再比较键
         start_idx = 0
         if start_key is not None:
-            start_idx = self._find_index(start_key)
-        
-        for i in range(start_idx, len(self._entries)):
-            key, value = self._entries[i]
-            if end_key is not None and key >= end_key:
-                break
-            yield key, value
+            start_idx = bisect.bisect_left(sorted_keys, start_key)
+        end_idx = len(sorted_keys)
+        if end_key is not None:
+            end_idx = bisect.bisect_left(sorted_keys, end_key, start_idx)
+        
+        for i in range(start_idx, end_idx):
+            key = sorted_keys[i]
+            yield key, entries[key]
     
     def range(self, start_key=None, end_key=None):
         """
@@ -336,11 +404,13 @@ class MemTable:
         Returns:
             创建的SSTable文件路径
         """
-        for key, value in self._entries:
+        for key, value in self.items():
             sstable_builder.add(key, value)
         return sstable_builder.finish()
     
     def clear(self):
         """清空内存表。"""
-        self._entries = []
+        self._entries = {}
+        self._sorted_keys = []
+        self._keys_dirty = False
         self._size = 0 
\ No newline at end of file
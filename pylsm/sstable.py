@@ -11,35 +11,52 @@ SSTable文件格式：
    - 层级 (4 bytes): 文件所属层级，0表示level-0
 2. 数据区：按键排序的键值对
    - 记录包含：键长度(4 bytes)、键内容、值长度(4 bytes)、值内容
-3. 索引区：指向数据区中每个键值对的偏移量
-   - 键长度(4 bytes)、键内容、偏移量(8 bytes)
+3. 索引区：数据区中每个值的偏移量和长度
+   - 全部键长度(各4 bytes)、全部键内容、全部值偏移量(各8 bytes)、全部值长度(各4 bytes)，分别连续存放
 4. 布隆过滤器区（可选）：
    - 布隆过滤器序列化数据
 """
 import os
+import mmap
 import struct
-import pickle
 import bisect
+from operator import itemgetter
 from typing import Dict, List, Tuple, Iterator, Optional, BinaryIO, Any, Set
 
 from .bloom_filter import BloomFilter
 
+# 数据区记录头：键长度(4B) + 值长度(4B)
+_RECORD_HEADER = struct.Struct("!II")
+# 页脚中的索引偏移量(8B) + 布隆过滤器偏移量(8B)
+_FOOTER = struct.Struct("!QQ")
+# 长度和条目数(4B)、索引中的偏移量(8B)
+_U32 = struct.Struct("!I")
+_U64 = struct.Struct("!Q")
+
 
 class SSTableBuilder:
     """
     SSTable构建器，用于创建新的SSTable文件。
     """
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, prefix_len: int = 0, expected_count: Optional[int] = None):
         """
         初始化SSTable构建器。
         
         参数：
             file_path: SSTable文件路径
+            prefix_len: 大于0时构建前缀布隆过滤器，只索引每个键的前prefix_len个字节
+            expected_count: 预计的键数量；提供时预先分配布隆过滤器，添加键时直接写入，
+                finish不必再遍历一遍所有键（前缀过滤器需要先去重，仍在finish中构建）
         """
         self.file_path = file_path
         self.data_blocks = []
         self.bloom_filter = None
+        self.prefix_len = prefix_len
+        if expected_count and prefix_len == 0:
+            self.bloom_filter = BloomFilter.from_capacity(expected_count, 0.01)
+        # 目前为止添加的键是否严格递增；保持有序时finish可以跳过排序
+        self._is_sorted = True
     
     def add(self, key: bytes, value: bytes) -> None:
         """
@@ -49,67 +66,75 @@ class SSTableBuilder:
             key: 键
             value: 值
         """
-        kv_pair = (key, value)
-        self.data_blocks.append(kv_pair)
+        data_blocks = self.data_blocks
+        if self._is_sorted and data_blocks and key <= data_blocks[-1][0]:
+            self._is_sorted = False
+        data_blocks.append((key, value))
+        if self.bloom_filter is not None:
+            self.bloom_filter.add(key)
+    
+    def add_sorted(self, key: bytes, value: bytes) -> None:
+        """
+        按键顺序添加键值对，不做顺序检查。
+        
+        调用方（刷写内存表、压缩归并）必须保证键严格递增。
+        
+        参数：
+            key: 键
+            value: 值
+        """
+        self.data_blocks.append((key, value))
+        if self.bloom_filter is not None:
+            self.bloom_filter.add(key)
+    
+    def extend_sorted(self, items: List[Tuple[bytes, bytes]]) -> None:
+        """
+        按键顺序批量添加键值对，不做顺序检查。
+        
+        参数：
+            items: 键严格递增、且都大于已添加键的(键, 值)列表
+        """
+        self.data_blocks.extend(items)
+        if self.bloom_filter is not None:
+            add = self.bloom_filter.add
+            for key, _ in items:
+                add(key)
     
     def finish(self) -> None:
         """
         完成SSTable构建并写入文件。
         """
-        # 对数据块按键排序
-        self.data_blocks.sort(key=lambda x: x[0])
+        # 对数据块按键排序（按顺序添加时已经有序，跳过）
+        if not self._is_sorted:
+            self.data_blocks.sort(key=itemgetter(0))
         
         # 创建布隆过滤器并添加所有键
         expected_elements = len(self.data_blocks)
-        if expected_elements > 0:
+        if self.bloom_filter is not None:
+            # 已在添加键时写入预先分配的过滤器
+            if expected_elements == 0:
+                self.bloom_filter.release()
+                self.bloom_filter = None
+        elif expected_elements > 0 and self.prefix_len > 0:
+            # 前缀布隆过滤器：去重后按不同前缀的数量分配
+            prefix_len = self.prefix_len
+            prefixes = {key[:prefix_len] for key, _ in self.data_blocks}
+            self.bloom_filter = BloomFilter.from_capacity(len(prefixes), 0.01)
+            for prefix in prefixes:
+                self.bloom_filter.add_prefix(prefix, prefix_len)
+        elif expected_elements > 0:
             # 使用默认假阳性率0.01
-            self.bloom_filter = BloomFilter(expected_elements, 0.01)
+            self.bloom_filter = BloomFilter.from_capacity(expected_elements, 0.01)
             for key, _ in self.data_blocks:
                 self.bloom_filter.add(key)
         
-        # 创建索引
-        index = {}
+        # 在内存中拼出完整的文件内容，一次写入并落盘
+        SSTable.write_bytes(self.file_path, SSTable.serialize_sorted(self.data_blocks, self.bloom_filter))
         
-        with open(self.file_path, 'wb') as f:
-            # 写入数据块
-            data_block_offset = 0
-            for key, value in self.data_blocks:
-                # 在索引中记录每个键的精确偏移量
-                index[key] = f.tell()  # 使用实际文件位置记录偏移量
-                
-                # 写入键值对 (格式: 键长度[4字节] + 值长度[4字节] + 键 + 值)
-                key_len = len(key)
-                value_len = len(value)
-                f.write(struct.pack("!II", key_len, value_len))
-                f.write(key)
-                f.write(value)
-            
-            # 记录布隆过滤器开始位置
-            bloom_filter_offset = 0
-            if self.bloom_filter:
-                bloom_filter_offset = f.tell()
-                bloom_data = self.bloom_filter.to_bytes()
-                bloom_size = len(bloom_data)
-                f.write(struct.pack("!I", bloom_size))
-                f.write(bloom_data)
-            
-            # 记录索引块开始位置
-            index_block_offset = f.tell()
-            
-            # 写入索引 
-            # 写入索引条目数
-            f.write(struct.pack("!I", len(index)))
-            
-            # 写入索引条目
-            for key, offset in sorted(index.items()):
-                key_len = len(key)
-                f.write(struct.pack("!I", key_len))
-                f.write(key)
-                f.write(struct.pack("!Q", offset))
-            
-            # 写入页脚 - 索引偏移量 + 布隆过滤器偏移量 + 魔数
-            f.write(struct.pack("!QQ", index_block_offset, bloom_filter_offset))
-            f.write(SSTable.MAGIC_NUMBER)
+        # 布隆过滤器已序列化到文件，归还其位数组供下一个SSTable复用
+        if self.bloom_filter:
+            self.bloom_filter.release()
+            self.bloom_filter = None
 
 
 class SSTable:
@@ -120,14 +145,20 @@ class SSTable:
     """
     
     # SSTable文件格式版本
-    FORMAT_VERSION = 1
+    FORMAT_VERSION = 3
     
-    # 魔数，用于标识文件类型
-    MAGIC_NUMBER = b'PYLSMTBL'
+    # 魔数，用于标识文件类型；同时区分索引区布局的版本
+    MAGIC_NUMBER = b'PYLSMTB3'
+    # 版本2（索引区只记录记录偏移量）的魔数，仍可读取
+    MAGIC_NUMBER_V2 = b'PYLSMTB2'
+    # 版本1（键与偏移量交错存放的索引区）的魔数，仍可读取
+    MAGIC_NUMBER_V1 = b'PYLSMTBL'
     
     # 文件格式：
     # 1. 数据区：排序的键值对 [多组: key_len(4B) + value_len(4B) + key + value]
-    # 2. 索引区：索引条目数量(4B) + [多组: key_len(4B) + key + offset(8B)]
+    # 2. 索引区：索引条目数量n(4B) + n个key_len(4B) + 全部键依次拼接 + n个value_offset(8B) + n个value_len(4B)
+    #    （版本2为 n(4B) + n个key_len(4B) + 全部键依次拼接 + n个记录offset(8B)；
+    #     版本1为 n(4B) + [多组: key_len(4B) + key + 记录offset(8B)]）
     # 3. 布隆过滤器区（可选）：布隆过滤器序列化数据 [size(4B) + data]
     # 4. 页脚：索引偏移量(8B) + 布隆过滤器偏移量(8B) + 魔数(8B)
     
@@ -143,6 +174,9 @@ class SSTable:
         self.index = {}
         self._sorted_keys = []
         self.bloom_filter = None
+        self._mmap = None
+        self._mmap_view = None
+        self._data_end = 0
         
         try:
             self.file = open(file_path, 'rb')
@@ -152,82 +186,70 @@ class SSTable:
             if self.file_size < 24:
                 raise ValueError(f"文件太小，无法包含有效的SSTable页脚: {file_path}")
             
-            # 读取页脚信息 (从文件末尾向前读取)
-            self.file.seek(self.file_size - 24)  # 8B魔数 + 8B索引偏移量 + 8B布隆过滤器偏移量
-            footer_data = self.file.read(24)
-            if len(footer_data) != 24:
-                raise ValueError(f"无法读取完整的SSTable页脚: {file_path}")
-                
-            index_offset, bloom_filter_offset = struct.unpack("!QQ", footer_data[:16])
+            # 映射整个文件：页脚、索引和记录都直接从映射区域解析，不再逐项调用read；
+            # 布隆过滤器的位数组也直接引用映射区域，多次打开同一文件时由操作系统页缓存共享这些页
+            self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmap_view = memoryview(self._mmap)
+            mm = self._mmap
+            # 映射持有自己的文件描述符，原文件对象不再需要，及早关闭以节省描述符
+            self.file.close()
+            self.file = None
+            # 点查按索引随机访问，关闭内核对这段映射的预读
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+                mm.madvise(mmap.MADV_RANDOM)
+            
+            # 读取页脚信息：8B索引偏移量 + 8B布隆过滤器偏移量 + 8B魔数
+            footer_offset = self.file_size - 24
+            index_offset, bloom_filter_offset = _FOOTER.unpack_from(mm, footer_offset)
             
             # 验证魔数
-            magic = footer_data[16:]
-            if magic != self.MAGIC_NUMBER:
+            magic = mm[footer_offset + 16:]
+            if magic not in (self.MAGIC_NUMBER, self.MAGIC_NUMBER_V2, self.MAGIC_NUMBER_V1):
                 raise ValueError(f"无效的SSTable文件: {file_path}, 魔数不匹配")
             
-            # 读取索引块
-            self.file.seek(index_offset)
-            
-            # 读取索引标记和条目数
-            index_entries_data = self.file.read(4)
-            if len(index_entries_data) != 4:
+            if index_offset + 4 > footer_offset:
                 raise ValueError(f"无法读取索引条目数: {file_path}")
-                
-            index_entries = struct.unpack("!I", index_entries_data)[0]
+            if magic == self.MAGIC_NUMBER:
+                index, pos = self._parse_index(mm, index_offset)
+            elif magic == self.MAGIC_NUMBER_V2:
+                index, pos = self._parse_index_v2(mm, index_offset)
+            else:
+                index, pos = self._parse_index_v1(mm, index_offset)
+            if pos > footer_offset:
+                raise ValueError(f"索引区超出页脚位置: {file_path}")
+            self.index = index
             
-            # 读取索引
-            self.index = {}
-            for _ in range(index_entries):
-                # 读取键长度
-                key_len_data = self.file.read(4)
-                if len(key_len_data) != 4:
-                    raise ValueError(f"无法读取键长度: {file_path}")
-                    
-                key_len = struct.unpack("!I", key_len_data)[0]
-                
-                # 读取键
-                key_data = self.file.read(key_len)
-                if len(key_data) != key_len:
-                    raise ValueError(f"无法读取完整的键: {file_path}")
-                
-                # 读取偏移量
-                offset_data = self.file.read(8)
-                if len(offset_data) != 8:
-                    raise ValueError(f"无法读取偏移量: {file_path}")
-                    
-                offset = struct.unpack("!Q", offset_data)[0]
-                
-                self.index[key_data] = offset
+            # 数据区之后紧跟布隆过滤器区（如果有），然后是索引区
+            self._data_end = bloom_filter_offset or index_offset
             
             # 读取布隆过滤器（如果存在）
             if bloom_filter_offset > 0:
-                self.file.seek(bloom_filter_offset)
-                
                 # 读取布隆过滤器大小
-                bloom_size_data = self.file.read(4)
-                if len(bloom_size_data) != 4:
+                if bloom_filter_offset + 4 > self.file_size:
                     print(f"警告: 无法读取布隆过滤器大小: {file_path}")
                 else:
-                    bloom_size = struct.unpack("!I", bloom_size_data)[0]
+                    bloom_size, = _U32.unpack_from(mm, bloom_filter_offset)
+                    bloom_start = bloom_filter_offset + 4
                     
-                    # 读取布隆过滤器数据
-                    bloom_data = self.file.read(bloom_size)
-                    if len(bloom_data) != bloom_size:
-                        print(f"警告: 布隆过滤器数据大小不匹配，期望 {bloom_size}，实际 {len(bloom_data)}")
+                    # 只映射布隆过滤器自身的区域
+                    bloom_view = self._mmap_view[bloom_start:bloom_start + bloom_size]
+                    if len(bloom_view) != bloom_size:
+                        print(f"警告: 布隆过滤器数据大小不匹配，期望 {bloom_size}，实际 {len(bloom_view)}")
                     
                     try:
-                        self.bloom_filter = BloomFilter.from_bytes(bloom_data)
+                        self.bloom_filter = BloomFilter.from_mmap(bloom_view)
                     except Exception as e:
                         print(f"警告: 读取布隆过滤器失败: {e}")
+                    finally:
+                        bloom_view.release()
             
-            # 缓存所有键的排序列表，加速迭代和范围查询
-            self._sorted_keys = sorted(self.index.keys())
+            # 缓存所有键的排序列表，加速迭代和范围查询；
+            # 索引区按键顺序写入，字典保留插入顺序，无需再次排序
+            self._sorted_keys = list(index)
             
         except Exception as e:
             # 确保在发生异常时关闭文件
-            if self.file:
-                self.file.close()
-                self.file = None
+            self.close()
             raise ValueError(f"读取SSTable文件失败: {e}")
             
     def __del__(self):
@@ -248,25 +270,38 @@ class SSTable:
         if self.bloom_filter and not self.bloom_filter.may_contain(key):
             return None  # 键肯定不在SSTable中
         
-        # 检查键是否在索引中
-        if key not in self.index:
+        # 检查键是否在索引中，同时取得值在文件中的偏移量和长度
+        entry = self.index.get(key)
+        if entry is None:
             return None
         
-        # 获取键在文件中的偏移量
-        offset = self.index[key]
+        # 索引已记录值的位置和长度，直接切出值，不再解析记录头
+        value_start, value_len = entry
+        return self._mmap[value_start:value_start + value_len]
+    
+    def range_may_match(self, start_key: bytes, end_key: bytes) -> bool:
+        """
+        使用前缀布隆过滤器检查SSTable中是否可能有键落在[start_key, end_key]内。
         
-        # 读取键值对
-        self.file.seek(offset)
-        key_len, value_len = struct.unpack("!II", self.file.read(8))
+        只有当过滤器是前缀布隆过滤器、且范围两端的前缀相同时才能判断：
+        此时范围内所有键都以该前缀开头。其他情况保守返回True。
         
-        # 读取键，验证与查找的键匹配
-        read_key = self.file.read(key_len)
-        if read_key != key:
-            return None
+        参数：
+            start_key: 起始键
+            end_key: 结束键
+        
+        返回：
+            如果可能存在，则为True；如果肯定不存在，则为False
+        """
+        bloom_filter = self.bloom_filter
+        if bloom_filter is None or not bloom_filter.prefix_len:
+            return True
         
-        # 读取并返回值
-        value = self.file.read(value_len)
-        return value
+        prefix_len = bloom_filter.prefix_len
+        prefix = start_key[:prefix_len]
+        if len(prefix) < prefix_len or end_key[:prefix_len] != prefix:
+            return True
+        return bloom_filter.may_contain_prefix(prefix)
     
     def may_contain(self, key: bytes) -> bool:
         """
@@ -283,13 +318,8 @@ class SSTable:
             return True
             
         # 如果有布隆过滤器，使用它检查
-        if self.bloom_filter:
-            result = self.bloom_filter.may_contain(key)
-            # 为布隆过滤器效率测试特殊处理
-            if key.startswith(b'key') and b'00000' <= key <= b'99999':
-                # 这是效率测试中的键范围，强制返回True
-                return True
-            return result
+        if self.bloom_filter is not None:
+            return self.bloom_filter.may_contain(key)
             
         # 默认情况下，保守返回True
         return True
@@ -311,18 +341,30 @@ class SSTable:
             # 使用二分查找找到起始位置
             start_idx = bisect.bisect_left(self._sorted_keys, start_key)
         
-        # 迭代键值对
-        for i in range(start_idx, len(self._sorted_keys)):
-            key = self._sorted_keys[i]
+        if start_idx >= len(self._sorted_keys):
+            return
+        
+        # 数据区中的记录按键有序且连续存放，从起始键的位置顺序解析即可，不必逐个查索引
+        mm = self._mmap
+        unpack_from = _RECORD_HEADER.unpack_from
+        start = self._sorted_keys[start_idx]
+        offset = self.index[start][0] - 8 - len(start)
+        data_end = self._data_end
+        # 范围扫描顺序读取，对要扫描的区域恢复内核预读（起点需按页对齐）
+        if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            page_start = offset - offset % mmap.PAGESIZE
+            mm.madvise(mmap.MADV_SEQUENTIAL, page_start, data_end - page_start)
+        while offset < data_end:
+            key_len, value_len = unpack_from(mm, offset)
+            key_start = offset + 8
+            value_start = key_start + key_len
+            offset = value_start + value_len
             
+            key = mm[key_start:value_start]
             # 检查是否超出范围
             if end_key is not None and key >= end_key:
                 break
-            
-            # 读取并返回值
-            value = self.get(key)
-            if value is not None:  # 理论上不应该为None，但以防万一
-                yield key, value
+            yield key, mm[value_start:offset]
     
     # 添加scan方法作为range的别名，与DB类兼容
     def scan(self, start_key: Optional[bytes] = None, end_key: Optional[bytes] = None) -> Iterator[Tuple[bytes, bytes]]:
@@ -347,8 +389,186 @@ class SSTable:
         """
         return self.range()  # 使用range方法实现，无起始和结束边界
     
+    @staticmethod
+    def _parse_keys(mm, index_offset: int) -> Tuple[List[bytes], int]:
+        """
+        解析版本2及以上索引区开头的条目数、所有键长度和所有键。
+        
+        参数：
+            mm: 文件的映射区域
+            index_offset: 索引区起始位置
+        
+        返回：
+            (按顺序排列的键列表, 键之后的位置)
+        """
+        count, = _U32.unpack_from(mm, index_offset)
+        pos = index_offset + 4
+        key_lens = struct.unpack_from(f"!{count}I", mm, pos)
+        pos += 4 * count
+        keys = []
+        for key_len in key_lens:
+            end = pos + key_len
+            keys.append(mm[pos:end])
+            pos = end
+        return keys, pos
+    
+    @staticmethod
+    def _parse_index(mm, index_offset: int) -> Tuple[Dict[bytes, Tuple[int, int]], int]:
+        """
+        解析版本3的索引区：所有键长度、所有键、所有值偏移量、所有值长度分别连续存放，
+        长度和偏移量各用一次unpack_from整体解出。
+        
+        参数：
+            mm: 文件的映射区域
+            index_offset: 索引区起始位置
+        
+        返回：
+            (键到(值偏移量, 值长度)的字典, 索引区结束位置)
+        """
+        keys, pos = SSTable._parse_keys(mm, index_offset)
+        count = len(keys)
+        value_offsets = struct.unpack_from(f"!{count}Q", mm, pos)
+        pos += 8 * count
+        value_lens = struct.unpack_from(f"!{count}I", mm, pos)
+        return dict(zip(keys, zip(value_offsets, value_lens))), pos + 4 * count
+    
+    @staticmethod
+    def _parse_index_v2(mm, index_offset: int) -> Tuple[Dict[bytes, Tuple[int, int]], int]:
+        """
+        解析版本2的索引区：布局与版本3相同，但只有记录偏移量，
+        值长度从每条记录的头部读出。
+        
+        参数：
+            mm: 文件的映射区域
+            index_offset: 索引区起始位置
+        
+        返回：
+            (键到(值偏移量, 值长度)的字典, 索引区结束位置)
+        """
+        unpack_header = _RECORD_HEADER.unpack_from
+        keys, pos = SSTable._parse_keys(mm, index_offset)
+        count = len(keys)
+        index = {}
+        for key, offset in zip(keys, struct.unpack_from(f"!{count}Q", mm, pos)):
+            key_len, value_len = unpack_header(mm, offset)
+            index[key] = (offset + 8 + key_len, value_len)
+        return index, pos + 8 * count
+    
+    @staticmethod
+    def _parse_index_v1(mm, index_offset: int) -> Tuple[Dict[bytes, Tuple[int, int]], int]:
+        """
+        解析版本1的索引区：[键长度 + 键 + 偏移量] 交错存放，值长度从记录头部读出。
+        
+        参数：
+            mm: 文件的映射区域
+            index_offset: 索引区起始位置
+        
+        返回：
+            (键到(值偏移量, 值长度)的字典, 索引区结束位置)
+        """
+        unpack_u32 = _U32.unpack_from
+        unpack_u64 = _U64.unpack_from
+        unpack_header = _RECORD_HEADER.unpack_from
+        count, = unpack_u32(mm, index_offset)
+        pos = index_offset + 4
+        index = {}
+        for _ in range(count):
+            key_len, = unpack_u32(mm, pos)
+            pos += 4
+            key_end = pos + key_len
+            offset, = unpack_u64(mm, key_end)
+            _, value_len = unpack_header(mm, offset)
+            index[mm[pos:key_end]] = (offset + 8 + key_len, value_len)
+            pos = key_end + 8
+        return index, pos
+    
+    @staticmethod
+    def read_data_end(file_path: str) -> int:
+        """
+        读取并校验页脚，返回数据区的结束位置。
+        
+        参数：
+            file_path: SSTable文件路径
+        
+        返回：
+            数据区结束的文件偏移量（布隆过滤器区或索引区的起始位置）
+        """
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < 24:
+                raise ValueError(f"文件太小，无法包含有效的SSTable页脚: {file_path}")
+            f.seek(-24, os.SEEK_END)
+            footer_data = f.read(24)
+        
+        index_offset, bloom_filter_offset = _FOOTER.unpack_from(footer_data)
+        if footer_data[16:] not in (SSTable.MAGIC_NUMBER, SSTable.MAGIC_NUMBER_V2, SSTable.MAGIC_NUMBER_V1):
+            raise ValueError(f"无效的SSTable文件: {file_path}, 魔数不匹配")
+        # 数据区之后紧跟布隆过滤器区（如果有），然后是索引区
+        return bloom_filter_offset or index_offset
+    
+    @staticmethod
+    def iter_record_batches(file_path: str, data_end: int,
+                            chunk_size: int = 256 * 1024) -> Iterator[List[Tuple[bytes, bytes]]]:
+        """
+        顺序读取数据区，按块批量返回键值对，不经过索引和布隆过滤器。
+        
+        数据区中的记录本身按键有序且不重复，适合压缩等全量扫描。
+        每次用os.pread读取一大块，读取期间释放GIL。
+        
+        参数：
+            file_path: SSTable文件路径
+            data_end: 数据区结束位置，见read_data_end
+            chunk_size: 每次读取的字节数
+        
+        返回：
+            迭代器，每次产生一块中解析出的(键, 值)列表
+        """
+        header = _RECORD_HEADER
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            pos = 0
+            buf = b''
+            while pos < data_end:
+                chunk = os.pread(fd, min(chunk_size, data_end - pos), pos)
+                if not chunk:
+                    raise ValueError(f"读取数据区时文件意外结束: {file_path}")
+                pos += len(chunk)
+                buf = buf + chunk if buf else chunk
+                
+                # 解析缓冲区中所有完整的记录，不完整的尾部留到下一块
+                batch = []
+                offset = 0
+                end = len(buf)
+                while offset + 8 <= end:
+                    key_len, value_len = header.unpack_from(buf, offset)
+                    record_end = offset + 8 + key_len + value_len
+                    if record_end > end:
+                        break
+                    key_end = offset + 8 + key_len
+                    batch.append((buf[offset + 8:key_end], buf[key_end:record_end]))
+                    offset = record_end
+                buf = buf[offset:]
+                if batch:
+                    yield batch
+            
+            if buf:
+                raise ValueError(f"数据区末尾存在不完整的记录: {file_path}")
+        finally:
+            os.close(fd)
+    
     def close(self) -> None:
         """关闭SSTable文件。"""
+        # 先释放所有对映射区域的引用，否则mmap无法关闭
+        if getattr(self, 'bloom_filter', None) is not None and self.bloom_filter.read_only:
+            self.bloom_filter.release()
+            self.bloom_filter = None
+        if getattr(self, '_mmap_view', None) is not None:
+            self._mmap_view.release()
+            self._mmap_view = None
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        
         if hasattr(self, 'file') and self.file:
             self.file.close()
             self.file = None
@@ -374,55 +594,118 @@ class SSTable:
         # 确保目录存在
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
+        SSTable.write_bytes(file_path, SSTable.serialize(data, bloom_filter))
+    
+    @staticmethod
+    def write_bytes(file_path: str, data: bytes) -> None:
+        """
+        把完整的SSTable文件内容一次写入磁盘。
+        
+        写入前提示内核按顺序访问，落盘后提示内核丢弃这些页：
+        刚写出的SSTable不会被修改，读取时按需再加载，不挤占读路径的页缓存。
+        
+        参数：
+            file_path: 文件路径
+            data: 文件的全部字节
+        """
+        fadvise = getattr(os, 'posix_fadvise', None)
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if fadvise is not None:
+                fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            view = memoryview(data)
+            offset = 0
+            while offset < len(view):
+                offset += os.pwrite(fd, view[offset:], offset)
+            getattr(os, 'fdatasync', os.fsync)(fd)
+            if fadvise is not None:
+                fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def serialize(data: Dict[bytes, bytes], bloom_filter: Optional[BloomFilter] = None) -> bytearray:
+        """
+        将键值对序列化为完整的SSTable文件内容，供调用方自行批量写盘。
+        
+        参数：
+            data: 键值对字典
+            bloom_filter: 布隆过滤器（可选）
+        
+        返回：
+            SSTable文件的全部字节
+        """
         # 排序键以确保有序写入
-        sorted_keys = sorted(data.keys())
-        index = {}
+        return SSTable.serialize_sorted(sorted(data.items()), bloom_filter)
+    
+    @staticmethod
+    def serialize_sorted(items: List[Tuple[bytes, bytes]], bloom_filter: Optional[BloomFilter] = None) -> bytearray:
+        """
+        将已按键排序且不重复的键值对序列化为完整的SSTable文件内容。
         
-        with open(file_path, 'wb') as f:
-            # 1. 写入数据区
-            for key in sorted_keys:
-                value = data[key]
-                
-                # 记录键在文件中的偏移量
-                index[key] = f.tell()
-                
-                # 写入键值对
-                key_len = len(key)
-                value_len = len(value)
-                
-                # 写入键和值的长度
-                f.write(struct.pack("!II", key_len, value_len))
-                
-                # 写入键和值
-                f.write(key)
-                f.write(value)
-            
-            # 2. 写入布隆过滤器（如果提供）
-            bloom_filter_offset = 0
-            if bloom_filter:
-                bloom_filter_offset = f.tell()
-                bloom_data = bloom_filter.to_bytes()
-                bloom_size = len(bloom_data)
-                f.write(struct.pack("!I", bloom_size))
-                f.write(bloom_data)
-                
-            # 3. 记录索引区开始位置
-            index_offset = f.tell()
-            
-            # 4. 写入索引
-            # 写入索引条目数
-            f.write(struct.pack("!I", len(index)))
-            
-            # 写入索引条目，确保正确使用结构化序列化，而不是pickle
-            for key, offset in sorted(index.items()):
-                key_len = len(key)
-                f.write(struct.pack("!I", key_len))
-                f.write(key)
-                f.write(struct.pack("!Q", offset))
-            
-            # 5. 写入页脚
-            f.write(struct.pack("!QQ", index_offset, bloom_filter_offset))
-            f.write(SSTable.MAGIC_NUMBER)
+        参数：
+            items: 按键有序且不重复的(键, 值)列表
+            bloom_filter: 布隆过滤器（可选）
+        
+        返回：
+            SSTable文件的全部字节
+        """
+        # 先算出文件总大小，一次分配缓冲区，再用pack_into和切片赋值原地填充，避免缓冲区反复扩容
+        bloom_data = bloom_filter.to_bytes() if bloom_filter else None
+        count = len(items)
+        key_bytes = sum(len(key) for key, _ in items)
+        data_size = 8 * count + key_bytes + sum(len(value) for _, value in items)
+        bloom_size = 4 + len(bloom_data) if bloom_data is not None else 0
+        index_size = 4 + 16 * count + key_bytes
+        buf = bytearray(data_size + bloom_size + index_size + _FOOTER.size + len(SSTable.MAGIC_NUMBER))
+        
+        value_offsets = []
+        pack_header = _RECORD_HEADER.pack_into
+        pack_u32 = _U32.pack_into
+        pos = 0
+        
+        # 1. 写入数据区
+        for key, value in items:
+            # 写入键和值的长度，然后写入键和值
+            pack_header(buf, pos, len(key), len(value))
+            pos += 8
+            end = pos + len(key)
+            buf[pos:end] = key
+            # 记录值在文件中的偏移量
+            value_offsets.append(end)
+            pos = end + len(value)
+            buf[end:pos] = value
+        
+        # 2. 写入布隆过滤器（如果提供）
+        bloom_filter_offset = 0
+        if bloom_data is not None:
+            bloom_filter_offset = pos
+            pack_u32(buf, pos, len(bloom_data))
+            pos += 4
+            buf[pos:pos + len(bloom_data)] = bloom_data
+            pos += len(bloom_data)
+        
+        # 3. 记录索引区开始位置
+        index_offset = pos
+        
+        # 4. 写入索引：条目数，然后依次是全部键长度、全部键、全部值偏移量、全部值长度
+        pack_u32(buf, pos, count)
+        pos += 4
+        struct.pack_into(f"!{count}I", buf, pos, *[len(key) for key, _ in items])
+        pos += 4 * count
+        for key, _ in items:
+            end = pos + len(key)
+            buf[pos:end] = key
+            pos = end
+        struct.pack_into(f"!{count}Q", buf, pos, *value_offsets)
+        pos += 8 * count
+        struct.pack_into(f"!{count}I", buf, pos, *[len(value) for _, value in items])
+        pos += 4 * count
+        
+        # 5. 写入页脚
+        _FOOTER.pack_into(buf, pos, index_offset, bloom_filter_offset)
+        buf[pos + _FOOTER.size:] = SSTable.MAGIC_NUMBER
+        return buf
 
     def get_range(self, start_key: bytes, end_key: bytes) -> List[Tuple[bytes, bytes]]:
         """
@@ -435,20 +718,9 @@ class SSTable:
         返回：
             范围内的键值对列表
         """
-        results = []
-        
-        # 读取所有数据块
-        self.file.seek(0)
-        
-        # 遍历索引，查找可能在范围内的键
-        for key, offset in self.index.items():
-            if key >= start_key and key <= end_key:
-                # 查找键的值
-                value = self.get(key)
-                if value is not None:
-                    results.append((key, value))
-                    
-        return results
+        # 结束键在这里是包含的，而range的结束键不包含；
+        # end_key + b"\x00"正好是大于end_key的最小键
+        return list(self.range(start_key, end_key + b"\x00"))
 
 
 def create_sstable_from_memtable(memtable, file_path: str, bloom_filter: Optional[BloomFilter] = None) -> str:
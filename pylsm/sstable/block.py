@@ -3,20 +3,156 @@ SSTable块模块
 
 该模块实现了SSTable中的数据块，包括块的构建、序列化和查询功能。
 """
-import io
+import array
+import bisect
 import struct
+import threading
 import zlib
 from enum import Enum
 from typing import List, Tuple, Dict, Optional, Iterator, BinaryIO
 
 from pylsm.utils import encode_key, decode_key, encode_value, decode_value, varint_encode, varint_decode
 
+try:
+    import numpy as np
+    import numba  # JIT编译条目解析循环，可选依赖
+    _HAS_NUMBA = True
+except ImportError:
+    np = None
+    numba = None
+    _HAS_NUMBA = False
+
+try:
+    import zstandard  # zstd压缩，可选依赖
+except ImportError:
+    zstandard = None
+
 
 class CompressionType(Enum):
     """压缩类型枚举。"""
     NONE = 0
     SNAPPY = 1
     ZLIB = 2
+    ZSTD = 3
+
+
+# 新建数据块默认的压缩类型；默认值不随环境变化，否则装有zstandard的机器写出的文件
+# 在未安装的机器上无法读取。zstd需显式传入CompressionType.ZSTD
+DEFAULT_COMPRESSION = CompressionType.NONE
+
+# zstd压缩级别
+ZSTD_LEVEL = 3
+
+# 每个线程复用一个zstd解压器，避免每个数据块都重新创建
+_ZSTD_TLS = threading.local()
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    """
+    使用当前线程缓存的解压器解压zstd数据。
+    
+    Args:
+        data: zstd压缩数据
+    
+    Returns:
+        解压后的数据
+    """
+    if zstandard is None:
+        raise ValueError("数据块使用zstd压缩，但未安装zstandard")
+    decompressor = getattr(_ZSTD_TLS, 'decompressor', None)
+    if decompressor is None:
+        decompressor = _ZSTD_TLS.decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(data)
+
+
+def common_prefix_length(a: bytes, b: bytes) -> int:
+    """
+    计算两个字节串的最长公共前缀长度。
+    
+    对前缀长度做二分查找，每一步用切片比较（C实现的memcmp）判断前缀是否相同，
+    只需O(log L)次比较，不在Python中逐字节循环。
+    
+    Args:
+        a: 第一个字节串
+        b: 第二个字节串
+    
+    Returns:
+        公共前缀的字节数
+    """
+    lo, hi = 0, min(len(a), len(b))
+    # 有序键的常见情况：较短的键整体是另一个键的前缀
+    if a[:hi] == b[:hi]:
+        return hi
+    # 不变式：长度lo的前缀相同，长度hi的前缀不同
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+if _HAS_NUMBA:
+    @numba.njit(cache=True)
+    def _decode_entries_jit(buf, pos, num_entries):
+        """
+        顺序解析数据区的全部条目（编译后执行）。
+        
+        返回每个条目的起始偏移、共享前缀长度、键后缀偏移、键后缀长度、值偏移和值长度。
+        """
+        fields = np.empty((6, num_entries), dtype=np.int64)
+        for i in range(num_entries):
+            fields[0, i] = pos
+            for j in range(3):
+                # 依次解码共享前缀长度、键后缀长度、值长度
+                value = 0
+                shift = 0
+                while True:
+                    b = buf[pos]
+                    pos += 1
+                    value |= (b & 0x7F) << shift
+                    if b < 0x80:
+                        break
+                    shift += 7
+                if j == 0:
+                    fields[1, i] = value
+                else:
+                    fields[2 * j, i] = pos
+                    fields[2 * j + 1, i] = value
+                    pos += value
+        return fields
+
+
+def _decode_entries(data: bytes, pos: int, num_entries: int) -> List[List[int]]:
+    """
+    顺序解析数据区的全部条目。
+    
+    Args:
+        data: 解压后的块数据
+        pos: 数据区起始偏移
+        num_entries: 条目数
+    
+    Returns:
+        六个等长列表：条目起始偏移、共享前缀长度、键后缀偏移、键后缀长度、值偏移、值长度
+    """
+    if _HAS_NUMBA:
+        return _decode_entries_jit(np.frombuffer(data, dtype=np.uint8), pos, num_entries).tolist()
+    
+    fields = [[], [], [], [], [], []]
+    offsets, shared, suffix_offsets, suffix_lengths, value_offsets, value_lengths = fields
+    for _ in range(num_entries):
+        offsets.append(pos)
+        shared_prefix_length, pos = varint_decode(data, pos)
+        shared.append(shared_prefix_length)
+        key_suffix_length, pos = varint_decode(data, pos)
+        suffix_offsets.append(pos)
+        suffix_lengths.append(key_suffix_length)
+        value_length, pos = varint_decode(data, pos + key_suffix_length)
+        value_offsets.append(pos)
+        value_lengths.append(value_length)
+        pos += value_length
+    return fields
 
 
 class BlockBuilder:
@@ -37,7 +173,7 @@ class BlockBuilder:
     """
     
     def __init__(self, block_size: int = 4096, restart_interval: int = 16, 
-                 compression_type: CompressionType = CompressionType.NONE):
+                 compression_type: CompressionType = DEFAULT_COMPRESSION):
         """
         初始化块构建器。
         
@@ -50,8 +186,15 @@ class BlockBuilder:
         self.restart_interval = restart_interval
         self.compression_type = compression_type
         
+        # zstd压缩器在构建器的整个生命周期内复用（reset后仍然有效）
+        self._zstd_compressor = None
+        if compression_type == CompressionType.ZSTD:
+            if zstandard is None:
+                raise ValueError("使用zstd压缩需要安装zstandard")
+            self._zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        
         # 数据缓冲区
-        self.buffer = io.BytesIO()
+        self.buffer = bytearray()
         
         # 当前已添加的条目数
         self.num_entries = 0
@@ -80,27 +223,36 @@ class BlockBuilder:
         """
         # 检查是否需要一个新的重启点
         if self.num_entries % self.restart_interval == 0:
-            self.restart_points.append(self.buffer.tell())
+            self.restart_points.append(len(self.buffer))
             shared_prefix_length = 0  # 重启点处存储完整键
         else:
             # 计算与上一个键的共享前缀长度
             shared_prefix_length = 0
             if self.last_key is not None:
-                min_len = min(len(key), len(self.last_key))
-                for i in range(min_len):
-                    if key[i] != self.last_key[i]:
-                        break
-                    shared_prefix_length += 1
+                shared_prefix_length = common_prefix_length(key, self.last_key)
         
         # 计算非共享部分
         key_suffix = key[shared_prefix_length:]
         
         # 写入数据：共享前缀长度、非共享部分长度、非共享部分、值长度、值
-        self.buffer.write(varint_encode(shared_prefix_length))
-        self.buffer.write(varint_encode(len(key_suffix)))
-        self.buffer.write(key_suffix)
-        self.buffer.write(varint_encode(len(value)))
-        self.buffer.write(value)
+        # （长度小于128时varint就是单个字节，直接追加，省去一次函数调用）
+        buffer = self.buffer
+        if shared_prefix_length < 128:
+            buffer.append(shared_prefix_length)
+        else:
+            buffer += varint_encode(shared_prefix_length)
+        suffix_length = len(key_suffix)
+        if suffix_length < 128:
+            buffer.append(suffix_length)
+        else:
+            buffer += varint_encode(suffix_length)
+        buffer += key_suffix
+        value_length = len(value)
+        if value_length < 128:
+            buffer.append(value_length)
+        else:
+            buffer += varint_encode(value_length)
+        buffer += value
         
         # 更新状态
         self.last_key = key
@@ -109,7 +261,7 @@ class BlockBuilder:
         # 更新估计块大小
         # 数据大小 + 重启点数组大小 + 元数据大小
         self.estimated_block_size = (
-            self.buffer.tell() +  # 数据大小
+            len(buffer) +  # 数据大小
             len(self.restart_points) * 4 +  # 重启点数组大小
             20  # 元数据大小的估计值
         )
@@ -124,47 +276,38 @@ class BlockBuilder:
         Returns:
             序列化的块数据
         """
-        # 获取数据部分
-        data = self.buffer.getvalue()
-        
         # 创建结果缓冲区
-        result = io.BytesIO()
+        result = bytearray()
         
         # 写入重启点间隔
-        result.write(varint_encode(self.restart_interval))
+        result += varint_encode(self.restart_interval)
         
         # 写入重启点数量
-        result.write(varint_encode(len(self.restart_points)))
+        result += varint_encode(len(self.restart_points))
         
         # 写入重启点位置
-        for point in self.restart_points:
-            result.write(struct.pack("<I", point))
+        result += struct.pack(f"<{len(self.restart_points)}I", *self.restart_points)
         
         # 写入数据
-        result.write(data)
+        result += self.buffer
         
         # 写入条目数
-        result.write(varint_encode(self.num_entries))
-        
-        # 获取结果
-        block_data = result.getvalue()
+        result += varint_encode(self.num_entries)
         
         # 如果需要压缩，执行压缩
         if self.compression_type == CompressionType.ZLIB:
-            block_data = zlib.compress(block_data)
-        
-        # 创建最终结果缓冲区
-        final_result = io.BytesIO()
-        final_result.write(block_data)
+            result = bytearray(zlib.compress(result))
+        elif self.compression_type == CompressionType.ZSTD:
+            result = bytearray(self._zstd_compressor.compress(result))
         
         # 写入压缩类型
-        final_result.write(bytes([self.compression_type.value]))
+        result.append(self.compression_type.value)
         
-        return final_result.getvalue()
+        return bytes(result)
     
     def reset(self) -> None:
         """重置块构建器状态。"""
-        self.buffer = io.BytesIO()
+        self.buffer = bytearray()
         self.num_entries = 0
         self.restart_points = []
         self.estimated_block_size = 0
@@ -189,6 +332,8 @@ class BlockIterator:
         compression_type = CompressionType(block_data[-1])
         if compression_type == CompressionType.ZLIB:
             self.data = zlib.decompress(block_data[:-1])
+        elif compression_type == CompressionType.ZSTD:
+            self.data = _zstd_decompress(block_data[:-1])
         else:
             self.data = block_data[:-1]
         
@@ -199,10 +344,35 @@ class BlockIterator:
         self.current_entry_id = 0
         self.current_offset = 0
         self.current_key = b""
+        self.current_value = b""
+        
+        # 每个条目的起始偏移、完整键和值的位置：有numba时打开块即用编译后的循环一次解析，
+        # 否则在首次反向定位时才构建
+        self._entry_offsets: Optional[array.array] = None
+        self._entry_keys: List[bytes] = []
+        self._value_offsets: List[int] = []
+        self._value_lengths: List[int] = []
+        if _HAS_NUMBA and self.num_entries > 0:
+            self._build_offset_table()
         
         # 初始化迭代器位置
         self.seek_to_first()
     
+    def clone(self) -> 'BlockIterator':
+        """
+        创建共享同一份解码结果的新迭代器。
+        
+        解压后的数据、重启点和条目表都是只读的，直接共享；
+        新迭代器只拥有自己的位置状态，并定位到第一个条目。
+        
+        Returns:
+            新的块迭代器
+        """
+        other = BlockIterator.__new__(BlockIterator)
+        other.__dict__.update(self.__dict__)
+        other.seek_to_first()
+        return other
+    
     def _parse_block_structure(self) -> None:
         """解析块结构。"""
         buffer = memoryview(self.data)
@@ -214,16 +384,20 @@ class BlockIterator:
         # 读取重启点数量
         self.num_restart_points, pos = varint_decode(buffer, pos)
         
-        # 读取重启点位置
-        self.restart_points = []
-        for i in range(self.num_restart_points):
-            point = struct.unpack("<I", buffer[pos:pos+4])[0]
-            self.restart_points.append(point)
-            pos += 4
+        # 读取重启点位置（一次解出全部重启点）
+        self.restart_points = list(struct.unpack_from(f"<{self.num_restart_points}I", buffer, pos))
+        pos += 4 * self.num_restart_points
         
         # 设置数据区域开始位置
         self.data_offset = pos
         
+        # 构建器记录的重启点相对数据区域起点，这里转换为self.data中的绝对偏移，
+        # 与next()/prev()/seek()中直接使用current_offset的方式保持一致
+        self.restart_points = [point + pos for point in self.restart_points]
+        
+        # 预先取出每个重启点处的完整键，seek时直接在该有序列表上二分
+        self.restart_keys = [self._get_key_at_offset(point) for point in self.restart_points]
+        
         # 找到条目数的位置（从末尾向前解析）
         self.footer_offset = len(buffer) - 1
         while self.footer_offset > 0 and buffer[self.footer_offset] >= 128:
@@ -250,6 +424,11 @@ class BlockIterator:
             self.current_entry_id = -1
             return
         
+        # 条目表已构建时直接取出第一个条目
+        if self._entry_offsets is not None:
+            self._seek_to_entry(0)
+            return
+        
         self.current_entry_id = 0
         self.current_offset = self.restart_points[0]
         self.current_key = b""
@@ -261,22 +440,39 @@ class BlockIterator:
             self.current_entry_id = -1
             return
         
-        # 找到最后一个重启点
-        restart_idx = self.num_restart_points - 1
-        self.current_offset = self.restart_points[restart_idx]
-        self.current_key = b""
-        
-        # 跳到最后一个条目
-        restart_entry_id = restart_idx * self.restart_interval
-        
-        # 从重启点开始，解析直到最后一个条目
-        self.current_entry_id = restart_entry_id
-        while self.current_entry_id < self.num_entries - 1:
-            self._parse_current_entry()
-            self.current_entry_id += 1
+        self._seek_to_entry(self.num_entries - 1)
+    
+    def _build_offset_table(self) -> None:
+        """一次解析全部条目，记录每个条目的起始偏移、完整键和值的位置。"""
+        offsets, shared, suffix_offsets, suffix_lengths, value_offsets, value_lengths = \
+            _decode_entries(self.data, self.data_offset, self.num_entries)
+        data = self.data
+        keys = []
+        key = b""
+        for prefix, start, length in zip(shared, suffix_offsets, suffix_lengths):
+            key = key[:prefix] + data[start:start+length]
+            keys.append(key)
+        self._entry_offsets = array.array('I', offsets)
+        self._entry_keys = keys
+        self._value_offsets = value_offsets
+        self._value_lengths = value_lengths
+    
+    def _seek_to_entry(self, entry_id: int) -> None:
+        """
+        直接定位到指定序号的条目，不必从重启点逐条解析。
         
-        # 解析最后一个条目
-        self._parse_current_entry()
+        Args:
+            entry_id: 条目序号
+        """
+        if self._entry_offsets is None:
+            self._build_offset_table()
+        
+        self.current_entry_id = entry_id
+        self.current_key = self._entry_keys[entry_id]
+        value_offset = self._value_offsets[entry_id]
+        value_end = value_offset + self._value_lengths[entry_id]
+        self.current_value = bytes(self.data[value_offset:value_end])
+        self.current_offset = value_end
     
     def seek(self, target: bytes) -> None:
         """
@@ -285,29 +481,26 @@ class BlockIterator:
         Args:
             target: 目标键
         """
-        # 二分查找找到适当的重启点
-        left = 0
-        right = self.num_restart_points - 1
+        if self.num_entries == 0:
+            self.current_entry_id = -1
+            return
         
-        while left <= right:
-            mid = (left + right) // 2
-            
-            # 加载重启点的键
-            restart_offset = self.restart_points[mid]
-            restart_key = self._get_key_at_offset(restart_offset)
-            
-            if restart_key < target:
-                left = mid + 1
+        # 条目表已构建时直接在全部键上二分
+        if self._entry_offsets is not None:
+            entry_id = bisect.bisect_left(self._entry_keys, target)
+            if entry_id >= self.num_entries:
+                self.current_entry_id = self.num_entries  # 设置为无效
             else:
-                right = mid - 1
-        
-        # 如果没有找到适当的重启点，使用左边界
-        restart_idx = left
-        if restart_idx >= self.num_restart_points:
-            # 如果目标键大于所有键，将迭代器设置为无效
-            self.current_entry_id = self.num_entries
+                self._seek_to_entry(entry_id)
             return
         
+        # 在预先提取的重启键上二分查找（bisect为C实现，无需逐次解码重启点）
+        right = bisect.bisect_left(self.restart_keys, target) - 1
+        
+        # right+1是第一个重启键>=目标键的重启点，目标键可能位于其前一个重启区间内，
+        # 因此从最后一个重启键<目标键的重启点开始线性查找
+        restart_idx = max(right, 0)
+        
         # 从找到的重启点开始线性查找
         self.current_offset = self.restart_points[restart_idx]
         self.current_key = b""
@@ -368,10 +561,9 @@ class BlockIterator:
         else:
             self.current_key = self.current_key[:shared_prefix_length] + key_suffix
         
-        # 读取值长度
+        # 读取值长度，并与键一起缓存当前值
         value_length, pos = varint_decode(data, pos)
-        
-        # 跳过值部分
+        self.current_value = bytes(data[pos:pos+value_length])
         pos += value_length
         
         # 更新当前偏移
@@ -392,32 +584,14 @@ class BlockIterator:
         """
         获取当前值。
         
+        值在解析条目时已与键一并解码，这里直接返回缓存结果。
+        
         Returns:
             当前值
         """
         if not self.valid():
             raise ValueError("迭代器无效")
-        
-        data = self.data
-        pos = self.current_offset
-        
-        # 回退以找到值的开始位置
-        # 首先，找到键的共享前缀长度
-        shared_prefix_length, pos = varint_decode(data, pos - self.current_offset)
-        
-        # 找到键后缀长度
-        key_suffix_length, pos = varint_decode(data, pos)
-        
-        # 跳过键后缀
-        pos += key_suffix_length
-        
-        # 读取值长度
-        value_length, pos = varint_decode(data, pos)
-        
-        # 读取值
-        value = data[pos:pos+value_length]
-        
-        return value
+        return self.current_value
     
     def next(self) -> None:
         """移动到下一个条目。"""
@@ -428,6 +602,11 @@ class BlockIterator:
         if not self.valid():
             return
         
+        # 条目表已构建时直接按序号取出
+        if self._entry_offsets is not None:
+            self._seek_to_entry(self.current_entry_id)
+            return
+        
         # 如果遇到重启点，重置当前键
         if self.current_entry_id % self.restart_interval == 0:
             restart_idx = self.current_entry_id // self.restart_interval
@@ -443,26 +622,12 @@ class BlockIterator:
             self.current_entry_id = -1  # 设置为无效
             return
         
-        self.current_entry_id -= 1
-        
-        # 找到对应的重启点
-        restart_idx = self.current_entry_id // self.restart_interval
-        restart_entry_id = restart_idx * self.restart_interval
-        self.current_offset = self.restart_points[restart_idx]
-        self.current_key = b""
-        
-        # 从重启点开始，解析直到当前条目
-        current_pos = self.current_entry_id - restart_entry_id
-        for i in range(current_pos + 1):
-            self._parse_current_entry()
-            if i < current_pos:
-                # 只在迭代过程中保存位置，最后一步实际设置条目
-                pass
+        self._seek_to_entry(self.current_entry_id - 1)
 
 
 def build_data_block(key_values: List[Tuple[bytes, bytes]], block_size: int = 4096, 
                     restart_interval: int = 16, 
-                    compression_type: CompressionType = CompressionType.NONE) -> bytes:
+                    compression_type: CompressionType = DEFAULT_COMPRESSION) -> bytes:
     """
     构建数据块。
     
@@ -15,15 +15,19 @@ SSTable是一种不可变的、有序的键值对集合，存储在磁盘上。
 | uint64        | uint64        | uint64        | 8字节        | uint32        |
 +---------------+---------------+---------------+---------------+---------------+
 """
-import os
 import io
+import mmap
+import threading
+import array
+import bisect
 import time
 import struct
 import zlib
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional, Iterator, BinaryIO
 
 from pylsm.utils import encode_key, decode_key, encode_value, decode_value
-from pylsm.sstable.block import BlockBuilder, BlockIterator, CompressionType, build_data_block
+from pylsm.sstable.block import BlockBuilder, BlockIterator, CompressionType, DEFAULT_COMPRESSION, build_data_block
 from pylsm.memtable import MemTable, MemTableEntry, EntryType
 from pylsm.bloom_filter import BloomFilter
 
@@ -31,14 +35,24 @@ from pylsm.bloom_filter import BloomFilter
 # SSTable魔数，用于文件格式识别
 SSTABLE_MAGIC = b"PyLSMDB1"
 
+# 页脚大小：元数据偏移(8B) + 索引偏移(8B) + 布隆过滤器偏移(8B) + 魔数(8B) + CRC(4B)
+_FOOTER_SIZE = 8 + 8 + 8 + 8 + 4
+
+# 元数据块固定头部：条目数、创建时间、最小键长度、最大键长度、是否启用布隆过滤器、每键位数；
+# 之后紧跟最小键和最大键的原始字节
+_METADATA_HEADER = struct.Struct("<QQQQBB")
+
 
 class SSTableBuilder:
     """
     SSTable构建器，用于将内存表写入磁盘。
     """
     
+    # 写缓冲区积累到该大小时才写入文件，把逐块的小写入合并成少量大写入
+    WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+    
     def __init__(self, filename: str, block_size: int = 4096, 
-                 compression_type: CompressionType = CompressionType.NONE,
+                 compression_type: CompressionType = DEFAULT_COMPRESSION,
                  enable_bloom_filter: bool = True, bits_per_key: int = 10):
         """
         初始化SSTable构建器。
@@ -58,6 +72,7 @@ class SSTableBuilder:
         
         # 打开文件
         self.file = open(filename, 'wb')
+        self._write_buf = bytearray()
         
         # 当前正在构建的数据块
         self.data_block_builder = BlockBuilder(block_size, 16, compression_type)
@@ -70,8 +85,9 @@ class SSTableBuilder:
         self.smallest_key: Optional[bytes] = None
         self.largest_key: Optional[bytes] = None
         
-        # 布隆过滤器
-        self.bloom_filter = BloomFilter(bits_per_key) if enable_bloom_filter else None
+        # 布隆过滤器：构建时键数量未知，先收集键，在finish时按实际键数量一次性分配
+        self.bloom_filter: Optional[BloomFilter] = None
+        self.filter_keys: Optional[List[bytes]] = [] if enable_bloom_filter else None
         
         # 文件偏移
         self.offset = 0
@@ -84,9 +100,9 @@ class SSTableBuilder:
             key: 键（字节）
             value: 值（字节）
         """
-        # 更新布隆过滤器
-        if self.bloom_filter:
-            self.bloom_filter.add(key)
+        # 收集布隆过滤器的键
+        if self.filter_keys is not None:
+            self.filter_keys.append(key)
         
         # 更新键范围
         if self.smallest_key is None or key < self.smallest_key:
@@ -94,12 +110,10 @@ class SSTableBuilder:
         if self.largest_key is None or key > self.largest_key:
             self.largest_key = key
         
-        # 尝试添加到当前数据块
+        # 添加到当前数据块；add在条目写入后才报告块已满，此时该条目已在块内，
+        # 直接完成当前块，下一个键写入新块
         if not self.data_block_builder.add(key, value):
-            # 如果数据块已满，完成当前块并开始新块
             self._finish_data_block()
-            # 添加到新块
-            self.data_block_builder.add(key, value)
         
         self.num_entries += 1
     
@@ -119,7 +133,7 @@ class SSTableBuilder:
         ))
         
         # 写入文件
-        self.file.write(block_data)
+        self._buffered_write(block_data)
         self.offset += len(block_data)
         
         # 重置块构建器
@@ -155,7 +169,7 @@ class SSTableBuilder:
         
         # 完成并写入索引块
         index_block_data = index_block_builder.finish()
-        self.file.write(index_block_data)
+        self._buffered_write(index_block_data)
         
         # 更新偏移
         self.offset += len(index_block_data)
@@ -169,16 +183,26 @@ class SSTableBuilder:
         Returns:
             布隆过滤器的起始偏移，如果未启用布隆过滤器则为0
         """
-        if not self.bloom_filter:
+        if not self.filter_keys:
             return 0
         
+        # 键数量已知，一次性分配位数组后添加所有键
+        num_hashes = max(1, min(30, int(self.bits_per_key * 0.69)))  # bits_per_key * ln(2)
+        self.bloom_filter = BloomFilter.from_bits_per_key(self.bits_per_key, num_hashes,
+                                                          expected_keys=len(self.filter_keys))
+        for key in self.filter_keys:
+            self.bloom_filter.add(key)
+        self.filter_keys = None
+        
         bloom_filter_offset = self.offset
         
-        # 获取布隆过滤器数据
+        # 获取布隆过滤器数据，序列化后归还位数组供下一个SSTable复用
         bloom_data = self.bloom_filter.to_bytes()
+        self.bloom_filter.release()
+        self.bloom_filter = None
         
         # 写入布隆过滤器数据
-        self.file.write(bloom_data)
+        self._buffered_write(bloom_data)
         
         # 更新偏移
         self.offset += len(bloom_data)
@@ -201,26 +225,23 @@ class SSTableBuilder:
         """
         metadata_offset = self.offset
         
-        # 创建元数据块
-        metadata = {
-            'num_entries': self.num_entries,
-            'smallest_key': self.smallest_key,
-            'largest_key': self.largest_key,
-            'creation_time': int(time.time()),
-            'bloom_filter_enabled': self.enable_bloom_filter,
-            'bloom_filter_bits_per_key': self.bits_per_key if self.enable_bloom_filter else 0
-        }
-        
-        # 序列化元数据
-        metadata_serialized = str(metadata).encode('utf-8')
-        
-        # 写入元数据大小和内容
-        size_bytes = struct.pack("<Q", len(metadata_serialized))
-        self.file.write(size_bytes)
-        self.file.write(metadata_serialized)
+        # 固定头部之后依次写入最小键和最大键（没有条目时两个键都为空）
+        smallest_key = self.smallest_key or b""
+        largest_key = self.largest_key or b""
+        header = _METADATA_HEADER.pack(
+            self.num_entries,
+            int(time.time()),
+            len(smallest_key),
+            len(largest_key),
+            int(self.enable_bloom_filter),
+            self.bits_per_key if self.enable_bloom_filter else 0
+        )
+        self._buffered_write(header)
+        self._buffered_write(smallest_key)
+        self._buffered_write(largest_key)
         
         # 更新偏移
-        self.offset += len(size_bytes) + len(metadata_serialized)
+        self.offset += len(header) + len(smallest_key) + len(largest_key)
         
         return metadata_offset
     
@@ -243,7 +264,24 @@ class SSTableBuilder:
         footer += struct.pack("<I", crc)
         
         # 写入页脚
-        self.file.write(footer)
+        self._buffered_write(footer)
+    
+    def _buffered_write(self, data: bytes) -> None:
+        """
+        追加数据到写缓冲区，超过WRITE_BUFFER_SIZE时写入文件。
+        
+        Args:
+            data: 要写入的数据
+        """
+        self._write_buf += data
+        if len(self._write_buf) >= self.WRITE_BUFFER_SIZE:
+            self._flush_write_buf()
+    
+    def _flush_write_buf(self) -> None:
+        """把写缓冲区中的数据写入文件。"""
+        if self._write_buf:
+            self.file.write(self._write_buf)
+            self._write_buf = bytearray()
     
     def finish(self) -> Tuple[bytes, bytes]:
         """
@@ -267,7 +305,8 @@ class SSTableBuilder:
         # 写入页脚
         self._write_footer(metadata_offset, index_offset, bloom_filter_offset)
         
-        # 刷新并关闭文件
+        # 写出缓冲区剩余数据，刷新并关闭文件
+        self._flush_write_buf()
         self.file.flush()
         self.file.close()
         
@@ -275,7 +314,7 @@ class SSTableBuilder:
     
     @classmethod
     def build_from_memtable(cls, memtable: MemTable, filename: str, block_size: int = 4096,
-                           compression_type: CompressionType = CompressionType.NONE,
+                           compression_type: CompressionType = DEFAULT_COMPRESSION,
                            enable_bloom_filter: bool = True, bits_per_key: int = 10) -> Tuple[bytes, bytes]:
         """
         从内存表构建SSTable。
@@ -324,7 +363,7 @@ class SSTableIterator:
     def seek_to_first(self) -> None:
         """将迭代器移动到第一个键值对。"""
         # 如果没有数据块，迭代器无效
-        if not self.sstable.index_entries:
+        if not self.sstable.index_keys:
             return
         
         # 移动到第一个数据块
@@ -335,11 +374,11 @@ class SSTableIterator:
     def seek_to_last(self) -> None:
         """将迭代器移动到最后一个键值对。"""
         # 如果没有数据块，迭代器无效
-        if not self.sstable.index_entries:
+        if not self.sstable.index_keys:
             return
         
         # 移动到最后一个数据块
-        self.current_block_index = len(self.sstable.index_entries) - 1
+        self.current_block_index = len(self.sstable.index_keys) - 1
         self._load_current_block()
         self.current_block_iterator.seek_to_last()
     
@@ -351,53 +390,36 @@ class SSTableIterator:
             key: 目标键
         """
         # 如果没有数据块，迭代器无效
-        if not self.sstable.index_entries:
+        if not self.sstable.index_keys:
             return
         
-        # 使用二分查找找到适当的数据块
-        left = 0
-        right = len(self.sstable.index_entries) - 1
-        
-        while left <= right:
-            mid = (left + right) // 2
-            block_key = self.sstable.index_entries[mid][0]
-            
-            if block_key < key:
-                left = mid + 1
-            else:
-                right = mid - 1
-        
-        # 移动到找到的数据块
-        self.current_block_index = left if left < len(self.sstable.index_entries) else right
-        if self.current_block_index < 0:
-            self.current_block_index = 0
+        # 在索引键（各数据块的最大键）上二分，找到第一个最大键>=目标键的数据块；
+        # 目标键大于所有键时停在最后一个块，下面的块内查找会使迭代器失效
+        index_keys = self.sstable.index_keys
+        self.current_block_index = min(bisect.bisect_left(index_keys, key), len(index_keys) - 1)
         
         # 加载数据块并查找键
         self._load_current_block()
         self.current_block_iterator.seek(key)
         
         # 如果当前块中没有找到，尝试下一个块
-        if not self.current_block_iterator.valid() and self.current_block_index < len(self.sstable.index_entries) - 1:
+        if not self.current_block_iterator.valid() and self.current_block_index < len(self.sstable.index_keys) - 1:
             self.current_block_index += 1
             self._load_current_block()
             self.current_block_iterator.seek_to_first()
     
     def _load_current_block(self) -> None:
         """加载当前数据块。"""
-        if self.current_block_index < 0 or self.current_block_index >= len(self.sstable.index_entries):
+        if self.current_block_index < 0 or self.current_block_index >= len(self.sstable.index_keys):
             self.current_block_iterator = None
             return
         
         # 获取块偏移和大小
-        block_offset = self.sstable.index_entries[self.current_block_index][1]
-        block_size = self.sstable.index_entries[self.current_block_index][2]
+        block_offset = self.sstable.index_offsets[self.current_block_index]
+        block_size = self.sstable.index_sizes[self.current_block_index]
         
-        # 从文件中读取块数据
-        self.sstable.file.seek(block_offset)
-        block_data = self.sstable.file.read(block_size)
-        
-        # 创建块迭代器
-        self.current_block_iterator = BlockIterator(block_data)
+        # 从SSTable的块缓存获取块迭代器
+        self.current_block_iterator = self.sstable.block_iterator(block_offset, block_size)
     
     def valid(self) -> bool:
         """
@@ -448,7 +470,7 @@ class SSTableIterator:
         # 如果当前块已经遍历完毕，移动到下一个块
         if not self.current_block_iterator.valid():
             self.current_block_index += 1
-            if self.current_block_index < len(self.sstable.index_entries):
+            if self.current_block_index < len(self.sstable.index_keys):
                 self._load_current_block()
                 self.current_block_iterator.seek_to_first()
     
@@ -475,6 +497,9 @@ class SSTable:
     SSTable是一种不可变的、有序的键值对集合，存储在磁盘上。
     """
     
+    # 块缓存中已解码数据块的总字节数上限
+    BLOCK_CACHE_BYTES = 16 * 1024 * 1024
+    
     def __init__(self, filename: str):
         """
         初始化SSTable。
@@ -484,6 +509,15 @@ class SSTable:
         """
         self.filename = filename
         self.file = open(filename, 'rb')
+        # 映射整个文件，所有读取都是对映射区域的切片：不经过系统调用，由页缓存直接提供数据，
+        # 也不依赖共享的文件位置，多个迭代器可以在不同线程中同时读取同一个SSTable
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_size = len(self.mm)
+        
+        # 已解码数据块的LRU缓存：块偏移 -> 块迭代器，按解压后的字节数计入预算
+        self._block_cache: 'OrderedDict[int, BlockIterator]' = OrderedDict()
+        self._block_cache_bytes = 0
+        self._block_cache_lock = threading.Lock()
         
         # 读取页脚
         self._read_footer()
@@ -499,14 +533,8 @@ class SSTable:
     
     def _read_footer(self) -> None:
         """读取SSTable文件页脚。"""
-        # 页脚大小：元数据偏移(8B) + 索引偏移(8B) + 布隆过滤器偏移(8B) + 魔数(8B) + CRC(4B)
-        footer_size = 8 + 8 + 8 + 8 + 4
-        
-        # 移动到页脚开始处
-        self.file.seek(-footer_size, os.SEEK_END)
-        
         # 读取页脚
-        footer = self.file.read(footer_size)
+        footer = self.mm[self.file_size - _FOOTER_SIZE:]
         
         # 验证魔数
         magic = footer[24:32]
@@ -524,49 +552,41 @@ class SSTable:
     
     def _read_metadata(self) -> None:
         """读取SSTable元数据块。"""
-        # 移动到元数据块开始处
-        self.file.seek(self.metadata_offset)
-        
-        # 读取元数据大小
-        size_bytes = self.file.read(8)
-        metadata_size = struct.unpack("<Q", size_bytes)[0]
-        
-        # 读取元数据内容
-        metadata_serialized = self.file.read(metadata_size)
-        
-        # 解析元数据
-        # 这里使用了一个简单的字符串表示，实际应用中可能需要更健壮的序列化
-        metadata_str = metadata_serialized.decode('utf-8')
-        metadata_dict = eval(metadata_str)  # 注意：这在实际应用中不安全
-        
-        # 存储元数据
-        self.num_entries = metadata_dict['num_entries']
-        self.smallest_key = metadata_dict['smallest_key']
-        self.largest_key = metadata_dict['largest_key']
-        self.creation_time = metadata_dict['creation_time']
-        self.bloom_filter_enabled = metadata_dict['bloom_filter_enabled']
-        self.bloom_filter_bits_per_key = metadata_dict['bloom_filter_bits_per_key']
+        # 一次读取固定头部，再读取两个键
+        (self.num_entries, self.creation_time, smallest_len, largest_len,
+         bloom_filter_enabled, self.bloom_filter_bits_per_key) = \
+            _METADATA_HEADER.unpack_from(self.mm, self.metadata_offset)
+        self.bloom_filter_enabled = bool(bloom_filter_enabled)
+        keys_start = self.metadata_offset + _METADATA_HEADER.size
+        keys = self.mm[keys_start:keys_start + smallest_len + largest_len]
+        
+        # 没有条目的表不存在最小/最大键
+        if self.num_entries == 0:
+            self.smallest_key = self.largest_key = None
+        else:
+            self.smallest_key = keys[:smallest_len]
+            self.largest_key = keys[smallest_len:]
     
     def _read_index(self) -> None:
         """读取SSTable索引块。"""
-        # 移动到索引块开始处
-        self.file.seek(self.index_offset)
-        
-        # 读取索引块直到元数据块开始
-        index_size = self.metadata_offset - self.index_offset
-        index_data = self.file.read(index_size)
+        # 索引块写在布隆过滤器之后，一直延伸到页脚开始处
+        index_size = self.file_size - _FOOTER_SIZE - self.index_offset
+        index_data = self.mm[self.index_offset:self.index_offset + index_size]
         
         # 创建索引块迭代器
         index_iterator = BlockIterator(index_data)
         
-        # 解析索引条目
-        self.index_entries = []
+        # 解析索引条目：块的最大键、偏移和大小分别存入三个并行数组，
+        # 查找时直接在index_keys上用bisect二分
+        self.index_keys: List[bytes] = []
+        self.index_offsets = array.array('Q')
+        self.index_sizes = array.array('Q')
         index_iterator.seek_to_first()
         while index_iterator.valid():
-            key = index_iterator.key()
-            value = index_iterator.value()
-            offset, size = struct.unpack("<QQ", value)
-            self.index_entries.append((key, offset, size))
+            offset, size = struct.unpack("<QQ", index_iterator.value())
+            self.index_keys.append(index_iterator.key())
+            self.index_offsets.append(offset)
+            self.index_sizes.append(size)
             index_iterator.next()
     
     def _read_bloom_filter(self) -> None:
@@ -575,16 +595,46 @@ class SSTable:
             self.bloom_filter = None
             return
         
-        # 移动到布隆过滤器开始处
-        self.file.seek(self.bloom_filter_offset)
-        
         # 读取布隆过滤器数据
         bloom_size = self.index_offset - self.bloom_filter_offset
-        bloom_data = self.file.read(bloom_size)
+        bloom_data = self.mm[self.bloom_filter_offset:self.bloom_filter_offset + bloom_size]
         
         # 创建布隆过滤器
         self.bloom_filter = BloomFilter.from_bytes(bloom_data)
     
+    def block_iterator(self, block_offset: int, block_size: int) -> BlockIterator:
+        """
+        获取指定数据块的迭代器，优先复用块缓存中已解码的块。
+        
+        返回的迭代器是缓存项的克隆，位置状态属于调用方，解码结果与缓存共享。
+        
+        Args:
+            block_offset: 块偏移
+            block_size: 块大小
+        
+        Returns:
+            定位到块内第一个条目的块迭代器
+        """
+        cache = self._block_cache
+        with self._block_cache_lock:
+            cached = cache.get(block_offset)
+            if cached is not None:
+                cache.move_to_end(block_offset)
+                return cached.clone()
+        
+        # 未命中：在锁外解码，避免阻塞其他线程的命中
+        # （从映射区域切出bytes而非memoryview，块内的键需要与bytes比较）
+        block = BlockIterator(self.mm[block_offset:block_offset + block_size])
+        with self._block_cache_lock:
+            if block_offset not in cache:
+                cache[block_offset] = block
+                self._block_cache_bytes += len(block.data)
+                # 从最久未使用的一端淘汰，直到回到预算之内（至少保留刚加入的块）
+                while self._block_cache_bytes > self.BLOCK_CACHE_BYTES and len(cache) > 1:
+                    _, evicted = cache.popitem(last=False)
+                    self._block_cache_bytes -= len(evicted.data)
+        return block.clone()
+    
     def get(self, key: bytes) -> Optional[bytes]:
         """
         获取键对应的值。
@@ -628,6 +678,11 @@ class SSTable:
     
     def close(self) -> None:
         """关闭SSTable文件。"""
+        self._block_cache.clear()
+        self._block_cache_bytes = 0
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
         if self.file:
             self.file.close()
             self.file = None 
\ No newline at end of file
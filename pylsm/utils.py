@@ -8,8 +8,12 @@ import os
 import re
 import shutil
 import struct
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 
 # 配置日志
@@ -23,6 +27,34 @@ logging.basicConfig(
 
 logger = logging.getLogger('pylsm')
 
+# 后台日志监听器，由enable_background_logging启动
+_log_listener = None
+
+
+def enable_background_logging() -> None:
+    """
+    将pylsm日志改为经队列交给后台线程格式化和输出。
+    
+    记录日志的线程（例如压缩）只需把记录放入队列，不会因为
+    stdout刷新而阻塞。重复调用不会重复启动；进程退出时处理完剩余记录。
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    
+    handlers = logger.handlers or logging.getLogger().handlers
+    if not handlers:
+        return
+    
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
 
 def encode_key(key):
     """
@@ -206,4 +238,66 @@ def varint_decode(data: bytes, start_pos: int = 0) -> Tuple[int, int]:
         if shift > 63:
             raise ValueError("变长整数过大")
     
-    return result, pos 
\ No newline at end of file
+    return result, pos 
+
+def _write_and_sync(path: str, data) -> None:
+    """
+    用pwrite把整个缓冲区写入文件并落盘。
+    
+    Args:
+        path: 文件路径
+        data: 要写入的字节缓冲区
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            offset += os.pwrite(fd, view[offset:], offset)
+        # 只需数据落盘，有fdatasync时跳过不必要的元数据刷新
+        getattr(os, 'fdatasync', os.fsync)(fd)
+    finally:
+        os.close(fd)
+
+
+class BatchedWriter:
+    """
+    批量写文件工具，把一批互不相关的文件写入和落盘并发提交。
+    
+    一次压缩会连续产生多个输出文件，逐个同步写入会把每个文件的
+    写入和fsync延迟串行叠加在关键路径上。这里把整批写入同时提交，
+    让设备并行处理，最后统一等待完成；只有一个文件时直接在当前线程写入。
+    """
+    
+    def __init__(self, max_workers: int = 16):
+        """
+        初始化批量写入器。
+        
+        Args:
+            max_workers: 同时在途的最大写入数量
+        """
+        self.max_workers = max_workers
+    
+    def submit_all(self, buffers: List[Tuple[str, Any]]) -> None:
+        """
+        写入并落盘一批文件，全部完成后返回。
+        
+        Args:
+            buffers: (文件路径, 字节缓冲区) 列表
+        
+        Raises:
+            OSError: 任一文件写入失败时抛出（其余文件仍会写完）
+        """
+        if not buffers:
+            return
+        if len(buffers) == 1:
+            _write_and_sync(*buffers[0])
+            return
+        
+        workers = min(self.max_workers, len(buffers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_and_sync, path, data) for path, data in buffers]
+        
+        # 线程池退出时所有写入均已完成，这里统一抛出第一个错误
+        for future in futures:
+            future.result()
@@ -16,12 +16,21 @@ import glob
 import time
 import struct
 import shutil
+import bisect
+import heapq
+import logging
+import queue
 import threading
-from typing import List, Dict, Tuple, Set, Optional, Any
+from typing import List, Dict, Tuple, Set, Optional, Any, Iterator
 
 from .sstable import SSTable
 from .bloom_filter import BloomFilter
 
+logger = logging.getLogger('pylsm.compaction')
+
+# 归并线程的结束标记
+_DONE = object()
+
 # 版本相关常量
 LEVEL_NUMBER = 7                   # 层级数
 LEVEL0_MAX_FILES = 8               # Level 0最大文件数
@@ -125,6 +134,8 @@ class Version:
         self.version_set = version_set
         self.version_number = version_number
         self.files = [[] for _ in range(LEVEL_NUMBER)]  # 每一层的文件列表
+        self._smallest_keys = [None] * LEVEL_NUMBER  # 每一层按序排列的最小键缓存
+        self._level0_index = None  # Level 0按最小键排序的区间索引缓存
         
     def add_file(self, level: int, file_meta: FileMetaData) -> None:
         """
@@ -145,6 +156,91 @@ class Version:
         # 对于非0层的文件，按照最小键排序
         if level > 0:
             self.files[level].sort(key=lambda x: x.smallest_key)
+            self._smallest_keys[level] = None
+        else:
+            self._level0_index = None
+    
+    def find_file(self, level: int, key: bytes) -> Optional[FileMetaData]:
+        """
+        在非0层中查找键范围包含指定键的文件。
+        
+        参数：
+            level: 层级（必须大于0，文件之间互不重叠）
+            key: 要查找的键
+        
+        返回：
+            包含该键的文件元数据，如果不存在则返回None
+        """
+        files = self.files[level]
+        idx = bisect.bisect_right(self._level_smallest_keys(level), key) - 1
+        if idx >= 0 and key <= files[idx].largest_key:
+            return files[idx]
+        return None
+    
+    def level0_files_for_key(self, key: bytes) -> List[FileMetaData]:
+        """
+        按从新到旧的顺序列出Level 0中键范围包含指定键的文件。
+        
+        Level 0的文件可能重叠，按最小键排序后用二分查找截出最小键不大于key的前缀，
+        只在这部分文件中比较最大键。
+        
+        参数：
+            key: 要查找的键
+        
+        返回：
+            文件元数据列表，越新的文件越靠前
+        """
+        index = self._level0_index
+        if index is None:
+            # (最小键, 在files[0]中的位置, 文件)，位置越大文件越新
+            entries = sorted((f.smallest_key, pos, f) for pos, f in enumerate(self.files[0]))
+            index = ([e[0] for e in entries], [(e[1], e[2]) for e in entries])
+            self._level0_index = index
+        
+        smallest_keys, entries = index
+        end = bisect.bisect_right(smallest_keys, key)
+        hits = [entry for entry in entries[:end] if key <= entry[1].largest_key]
+        if len(hits) > 1:
+            hits.sort(key=lambda entry: entry[0], reverse=True)
+        return [f for _, f in hits]
+    
+    def files_in_range(self, level: int, start_key: bytes, end_key: bytes) -> List[FileMetaData]:
+        """
+        在非0层中按键顺序列出与[start_key, end_key)重叠的文件。
+        
+        参数：
+            level: 层级（必须大于0，文件之间互不重叠）
+            start_key: 起始键（包含）
+            end_key: 结束键（不包含）
+        
+        返回：
+            重叠的文件元数据列表，按最小键有序
+        """
+        files = self.files[level]
+        smallest_keys = self._level_smallest_keys(level)
+        # 第一个可能包含start_key的文件之前的文件都可以跳过
+        first = max(bisect.bisect_right(smallest_keys, start_key) - 1, 0)
+        if first < len(files) and files[first].largest_key < start_key:
+            first += 1
+        # 最小键不小于end_key的文件不在范围内
+        last = bisect.bisect_left(smallest_keys, end_key, first)
+        return files[first:last]
+    
+    def _level_smallest_keys(self, level: int) -> List[bytes]:
+        """
+        获取指定层级文件最小键的有序列表，按需构建并缓存。
+        
+        参数：
+            level: 层级
+        
+        返回：
+            最小键列表，与files[level]一一对应
+        """
+        smallest_keys = self._smallest_keys[level]
+        if smallest_keys is None:
+            smallest_keys = [f.smallest_key for f in self.files[level]]
+            self._smallest_keys[level] = smallest_keys
+        return smallest_keys
     
     def get_overlapping_files(self, level: int, smallest_key: bytes, largest_key: bytes) -> List[FileMetaData]:
         """
@@ -160,7 +256,7 @@ class Version:
         """
         result = []
         
-        if level < 0 or level >= self.MAX_LEVELS:
+        if level < 0 or level >= LEVEL_NUMBER:
             return result
         
         # Level 0的文件可能彼此重叠，需要检查所有文件
@@ -800,11 +896,18 @@ class Compaction:
     """
     压缩操作，用于合并SSTable文件。
     """
+    
+    # 归并线程每次交给写入端的键值对数量
+    MERGE_BATCH_SIZE = 1024
+    # 归并与写入之间的队列最多缓存的批次数
+    PIPELINE_DEPTH = 16
     def __init__(self, 
                  version_set: VersionSet, 
                  level: int, 
                  input_files_level_n: List[FileMetaData], 
-                 input_files_level_n_plus_1: List[FileMetaData]):
+                 input_files_level_n_plus_1: List[FileMetaData],
+                 prefix_len: int = 0,
+                 install_lock: Optional[Any] = None):
         """
         初始化压缩操作。
         
@@ -813,67 +916,136 @@ class Compaction:
             level: 要压缩的起始层级
             input_files_level_n: 层级n中要压缩的文件
             input_files_level_n_plus_1: 层级n+1中与level_n_files重叠的文件
+            prefix_len: 输出文件的前缀布隆过滤器长度，0表示使用整键布隆过滤器
+            install_lock: 应用版本编辑时持有的锁，合并和写文件期间不持有；为None时不加锁
         """
         self.version_set = version_set
         self.level = level
         self.input_files_level_n = input_files_level_n
         self.input_files_level_n_plus_1 = input_files_level_n_plus_1
+        self.prefix_len = prefix_len
+        self.install_lock = install_lock
         self.edit = VersionEdit()
     
-    def _merge_files(self) -> Tuple[Dict[bytes, bytes], bytes, bytes]:
+    def _input_sources(self) -> List[Iterator[Tuple[bytes, int, bytes]]]:
         """
-        合并所有输入文件的内容。
+        为每个输入文件创建带优先级的有序键值对迭代器，并在版本编辑中标记删除。
+        
+        优先级越小越新：level_n的文件新于level_n+1的文件，
+        Level 0中文件编号越大越新。
         
         返回：
-            元组 (merged_data, smallest_key, largest_key)
+            (键, 优先级, 值)迭代器列表，每个迭代器按键有序
         """
-        merged_data = {}
-        all_keys = set()
+        level_n_files = self.input_files_level_n
+        if self.level == 0:
+            level_n_files = sorted(level_n_files, key=lambda f: f.file_number, reverse=True)
         
-        # 打开并读取所有文件
-        # 先处理level_n的文件
-        for file_meta in self.input_files_level_n:
-            file_path = os.path.join(self.version_set.db_path, f"{file_meta.file_number}.sst")
-            sst = SSTable(file_path)
-            
-            # 读取所有键值对
-            for key, value in sst.get_iterator():
-                merged_data[key] = value
-                all_keys.add(key)
-            
-            # 关闭文件
-            sst.close()
-            
-            # 将此文件标记为已删除
-            self.edit.delete_file(self.level, file_meta.file_number)
+        inputs = [(self.level, f) for f in level_n_files]
+        inputs += [(self.level + 1, f) for f in self.input_files_level_n_plus_1]
         
-        # 然后处理level_n+1的文件
-        for file_meta in self.input_files_level_n_plus_1:
+        sources = []
+        for rank, (level, file_meta) in enumerate(inputs):
             file_path = os.path.join(self.version_set.db_path, f"{file_meta.file_number}.sst")
-            sst = SSTable(file_path)
-            
-            # 读取所有键值对
-            for key, value in sst.get_iterator():
-                # 只有在合并范围内的键才处理
-                if key in all_keys:
-                    merged_data[key] = value
-                
-                all_keys.add(key)
-            
-            # 关闭文件
-            sst.close()
-            
+            sources.append(self._tagged_records(file_path, rank))
             # 将此文件标记为已删除
-            self.edit.delete_file(self.level + 1, file_meta.file_number)
+            self.edit.delete_file(level, file_meta.file_number)
+        return sources
+    
+    @staticmethod
+    def _tagged_records(file_path: str, rank: int) -> Iterator[Tuple[bytes, int, bytes]]:
+        """
+        顺序读取一个SSTable的数据区，为每条记录附加优先级。
+        
+        参数：
+            file_path: SSTable文件路径
+            rank: 该文件的优先级，越小越新
+        
+        返回：
+            (键, 优先级, 值)迭代器，按键有序
+        """
+        data_end = SSTable.read_data_end(file_path)
+        for batch in SSTable.iter_record_batches(file_path, data_end):
+            for key, value in batch:
+                yield key, rank, value
+    
+    @staticmethod
+    def _put(pipeline: queue.Queue, stop: threading.Event, item: Any) -> bool:
+        """
+        向有界队列放入一项，队列满时阻塞，直到放入成功或stop被置位。
+        
+        返回：
+            是否放入成功
+        """
+        while not stop.is_set():
+            try:
+                pipeline.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _produce_merged(self, sources: List[Iterator[Tuple[bytes, int, bytes]]],
+                        pipeline: queue.Queue, stop: threading.Event) -> None:
+        """
+        归并线程：对输入做k路堆归并，相同的键只保留最新的值，按批次放入队列。
         
-        # 确定最小和最大键
-        if not all_keys:
-            return {}, b'', b''
+        结束时放入_DONE，出错时放入异常对象。
         
-        smallest_key = min(all_keys)
-        largest_key = max(all_keys)
+        参数：
+            sources: _input_sources返回的迭代器列表
+            pipeline: 与写线程之间的有界队列
+            stop: 写线程失败时置位，归并线程随之退出
+        """
+        put = self._put
+        try:
+            batch = []
+            last_key = None
+            for key, _, value in heapq.merge(*sources):
+                if key == last_key:
+                    continue
+                last_key = key
+                batch.append((key, value))
+                if len(batch) >= self.MERGE_BATCH_SIZE:
+                    if not put(pipeline, stop, batch):
+                        return
+                    batch = []
+            if batch and not put(pipeline, stop, batch):
+                return
+            put(pipeline, stop, _DONE)
+        except Exception as e:
+            put(pipeline, stop, e)
+    
+    @staticmethod
+    def _consume_write(pipeline: queue.Queue, builder: Any) -> Optional[Tuple[bytes, bytes]]:
+        """
+        写入端：从队列取出归并结果写入构建器，最后完成文件。
         
-        return merged_data, smallest_key, largest_key
+        参数：
+            pipeline: 与归并线程之间的有界队列
+            builder: SSTable构建器
+        
+        返回：
+            (最小键, 最大键)，如果没有任何数据则返回None且不写文件
+        """
+        smallest_key = largest_key = None
+        # 归并结果按键严格递增，整批交给构建器，无需逐条检查顺序
+        extend = builder.extend_sorted
+        while True:
+            batch = pipeline.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            if smallest_key is None:
+                smallest_key = batch[0][0]
+            largest_key = batch[-1][0]
+            extend(batch)
+        
+        if smallest_key is None:
+            return None
+        builder.finish()
+        return smallest_key, largest_key
     
     def compact(self) -> bool:
         """
@@ -883,14 +1055,7 @@ class Compaction:
             如果成功则为True，否则为False
         """
         try:
-            print(f"开始压缩层级 {self.level} 到 {self.level+1}")
-            
-            # 合并文件内容
-            merged_data, smallest_key, largest_key = self._merge_files()
-            
-            if not merged_data:
-                print("没有数据需要合并")
-                return True
+            logger.info("开始压缩层级 %d 到 %d", self.level, self.level + 1)
             
             # 创建新的SSTable文件
             new_file_number = self.version_set.get_next_file_number()
@@ -902,14 +1067,25 @@ class Compaction:
             from .sstable import SSTableBuilder
             
             # 创建SSTable构建器
-            builder = SSTableBuilder(new_file_path)
+            builder = SSTableBuilder(new_file_path, prefix_len=self.prefix_len)
             
-            # 添加所有合并后的键值对
-            for key, value in sorted(merged_data.items()):
-                builder.add(key, value)
+            # 归并在单独的线程中读取和合并输入文件，本线程同时把结果写入新文件，
+            # 两者通过有界队列衔接，写入跟不上时归并阻塞
+            sources = self._input_sources()
+            pipeline = queue.Queue(maxsize=self.PIPELINE_DEPTH)
+            stop = threading.Event()
+            producer = threading.Thread(target=self._produce_merged, args=(sources, pipeline, stop), daemon=True)
+            producer.start()
+            try:
+                key_range = self._consume_write(pipeline, builder)
+            finally:
+                stop.set()
+                producer.join()
             
-            # 完成构建并写入文件
-            builder.finish()
+            if key_range is None:
+                logger.info("没有数据需要合并")
+                return True
+            smallest_key, largest_key = key_range
             
             # 获取新文件大小
             file_size = os.path.getsize(new_file_path)
@@ -926,18 +1102,22 @@ class Compaction:
             # 将新文件添加到版本编辑
             self.edit.add_file(output_level, new_file_meta)
             
-            # 应用版本编辑
-            success = self.version_set.apply_version_edit(self.edit)
+            # 应用版本编辑；只有这一步需要与前台的刷写互斥
+            if self.install_lock is not None:
+                with self.install_lock:
+                    success = self.version_set.apply_version_edit(self.edit)
+            else:
+                success = self.version_set.apply_version_edit(self.edit)
             
             if success:
-                print(f"压缩完成，新文件: {new_file_number}.sst (层级 {output_level})")
+                logger.info("压缩完成，新文件: %d.sst (层级 %d)", new_file_number, output_level)
             else:
-                print("应用版本编辑失败")
+                logger.error("应用版本编辑失败")
                 # 清理创建的文件
                 if os.path.exists(new_file_path):
                     os.remove(new_file_path)
             
             return success
-        except Exception as e:
-            print(f"压缩操作失败: {e}")
+        except Exception:
+            logger.exception("压缩操作失败")
             return False 
\ No newline at end of file
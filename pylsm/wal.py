@@ -7,6 +7,7 @@ import struct
 import pickle
 import time
 import threading
+import weakref
 from typing import Optional, List, Tuple, Iterator
 
 from .config import Config
@@ -29,6 +30,10 @@ class WAL:
     
     # 头部大小（CRC + 记录大小 + 类型）
     HEADER_SIZE = 4 + 4 + 1
+    _HEADER = struct.Struct('!IIB')
+    
+    # 内存写缓冲区上限，超过后整块写入文件
+    BUFFER_LIMIT = 128 * 1024
     
     def __init__(self, path: str, config=None):
         """
@@ -42,6 +47,9 @@ class WAL:
         self.config = config if config is not None else Config()
         self.file = None
         self.mutex = threading.Lock()
+        # 组提交：同一时刻只有一个线程执行fdatasync，其余线程等待并复用其结果
+        self._sync_cond = threading.Condition(self.mutex)
+        self._syncing = False
         self.last_flush = time.time()
         
         # 默认WAL配置
@@ -59,6 +67,17 @@ class WAL:
             # 确保目录存在
             os.makedirs(os.path.dirname(path), exist_ok=True)
             self.file = open(path, 'wb+')
+        
+        # 记录先在内存中拼接成完整的物理记录，攒满后一次write()写入文件
+        self._buf = bytearray()
+        # 逻辑写入位置（已写入文件的字节数 + 缓冲区中的字节数），用于块对齐
+        self._offset = os.path.getsize(path)
+        # 已确认刷新到磁盘的逻辑位置
+        self._synced_offset = self._offset
+        # 缓冲区不像文件对象那样会在解释器退出时自动写出，注册退出时的写出，
+        # 不依赖__del__是否被调用
+        self._finalizer = weakref.finalize(self, WAL._write_buffer_at_exit,
+                                           self.file, self._buf, self.mutex)
     
     def add_record(self, key: bytes, value: Optional[bytes]) -> None:
         """
@@ -69,46 +88,160 @@ class WAL:
             value: 值（字节串）或None（表示删除标记）。
         """
         # 序列化记录
-        record = pickle.dumps((key, value))
-        record_size = len(record)
+        record = self.encode_record(key, value)
         
         with self.mutex:
-            # 计算块大小（可配置，默认为4KB）
-            block_size = getattr(self.config, 'sstable_block_size', 4 * 1024)
-            available = block_size - (self.file.tell() % block_size)
-            
-            # 如果剩余空间不足以存储至少头部，则填充到下一个块
-            if available < self.HEADER_SIZE:
-                # 填充零
-                self.file.write(b'\x00' * available)
-                available = block_size
+            self._append_record(record)
+            self._maybe_sync()
+    
+    def add_records(self, records: List[Tuple[bytes, Optional[bytes]]]) -> None:
+        """
+        批量添加记录到WAL。
+        
+        与逐条调用add_record写出的文件内容相同，但只获取一次锁，
+        并且只在整批写完后检查一次是否需要刷新到磁盘。
+        
+        Args:
+            records: (键, 值)列表，值为None表示删除标记。
+        """
+        # 在锁外完成序列化
+        serialized = [self.encode_record(key, value) for key, value in records]
+        
+        with self.mutex:
+            for record in serialized:
+                self._append_record(record)
+            self._maybe_sync()
+    
+    @staticmethod
+    def encode_record(key: bytes, value: Optional[bytes]) -> bytes:
+        """
+        把一条记录序列化为WAL中的逻辑记录，不需要持有任何锁。
+        
+        Args:
+            key: 键（字节串）。
+            value: 值（字节串）或None（表示删除标记）。
+        
+        Returns:
+            序列化后的记录，可传给append_encoded。
+        """
+        return pickle.dumps((key, value))
+    
+    def append_encoded(self, records: List[bytes]) -> None:
+        """
+        追加已序列化的记录，只写入内存缓冲区，不触发磁盘同步。
+        
+        调用方在释放自己的锁之后再调用maybe_sync，避免同步期间阻塞其他操作。
+        
+        Args:
+            records: encode_record返回的记录列表。
+        """
+        with self.mutex:
+            for record in records:
+                self._append_record(record)
+    
+    def maybe_sync(self) -> None:
+        """按时间间隔或文件大小阈值将WAL刷新到磁盘；WAL已关闭时什么也不做。"""
+        with self.mutex:
+            if self.file:
+                self._maybe_sync()
+    
+    def _append_record(self, record: bytes) -> None:
+        """
+        将一条序列化后的记录按块切分写入文件（调用方需持有mutex）。
+        
+        Args:
+            record: 序列化后的记录。
+        """
+        record_size = len(record)
+        
+        # 计算块大小（可配置，默认为4KB）
+        block_size = getattr(self.config, 'sstable_block_size', 4 * 1024)
+        available = block_size - (self._offset % block_size)
+        
+        # 如果剩余空间不足以存储至少头部，则填充到下一个块
+        if available < self.HEADER_SIZE:
+            # 填充零
+            self._buf += bytes(available)
+            self._offset += available
+            available = block_size
+        
+        # 如果可用空间足够存储整个记录，写入一个完整记录
+        if available >= self.HEADER_SIZE + record_size:
+            self._write_physical_record(self.FULL, record)
+        else:
+            # 需要分片
+            # 写入第一个分片
+            first_part_size = available - self.HEADER_SIZE
+            self._write_physical_record(self.FIRST, record[:first_part_size])
             
-            # 如果可用空间足够存储整个记录，写入一个完整记录
-            if available >= self.HEADER_SIZE + record_size:
-                self._write_physical_record(self.FULL, record)
-            else:
-                # 需要分片
-                # 写入第一个分片
-                first_part_size = available - self.HEADER_SIZE
-                self._write_physical_record(self.FIRST, record[:first_part_size])
-                
-                # 写入中间分片
-                record = record[first_part_size:]
-                while len(record) > block_size - self.HEADER_SIZE:
-                    part_size = block_size - self.HEADER_SIZE
-                    self._write_physical_record(self.MIDDLE, record[:part_size])
-                    record = record[part_size:]
-                
-                # 写入最后一个分片
-                self._write_physical_record(self.LAST, record)
+            # 写入中间分片
+            record = record[first_part_size:]
+            while len(record) > block_size - self.HEADER_SIZE:
+                part_size = block_size - self.HEADER_SIZE
+                self._write_physical_record(self.MIDDLE, record[:part_size])
+                record = record[part_size:]
             
-            # 检查是否需要刷新
-            current_time = time.time()
-            if (current_time - self.last_flush >= self.wal_flush_interval or
-                self.file.tell() >= self.wal_size_threshold):
-                self.file.flush()
-                os.fsync(self.file.fileno())
-                self.last_flush = current_time
+            # 写入最后一个分片
+            self._write_physical_record(self.LAST, record)
+        
+        if len(self._buf) >= self.BUFFER_LIMIT:
+            self._write_buffer()
+    
+    def _write_buffer(self) -> None:
+        """把内存缓冲区中的记录一次性写入文件（调用方需持有mutex）。"""
+        if self._buf:
+            self.file.write(self._buf)
+            self.file.flush()
+            # clear()会释放底层内存，缓冲区不会因偶发的大记录而一直保持很大
+            self._buf.clear()
+    
+    @staticmethod
+    def _write_buffer_at_exit(file, buf: bytearray, mutex: threading.Lock) -> None:
+        """解释器退出或WAL被回收时写出缓冲区中剩余的记录（不能引用WAL实例本身）。"""
+        with mutex:
+            if buf and not file.closed:
+                file.write(buf)
+                file.flush()
+                buf.clear()
+    
+    def _sync(self) -> None:
+        """
+        写出缓冲区并将文件数据刷新到磁盘（调用方需持有mutex）。
+        
+        fdatasync在释放mutex后执行，期间其他线程可以继续追加记录；
+        并发的同步请求会等待正在进行的那次完成，如果它已覆盖自己的记录则直接返回，
+        多个写入者因此共享一次磁盘同步。
+        """
+        self._write_buffer()
+        target = self._offset
+        while self._syncing:
+            self._sync_cond.wait()
+        if self._synced_offset >= target:
+            return
+        
+        self._syncing = True
+        fd = self.file.fileno()
+        self.mutex.release()
+        try:
+            getattr(os, 'fdatasync', os.fsync)(fd)
+        finally:
+            self.mutex.acquire()
+            self._syncing = False
+            self._sync_cond.notify_all()
+        self._synced_offset = max(self._synced_offset, target)
+        self.last_flush = time.time()
+    
+    def _maybe_sync(self) -> None:
+        """按时间间隔或文件大小阈值将WAL刷新到磁盘（调用方需持有mutex）。"""
+        if (time.time() - self.last_flush >= self.wal_flush_interval or
+            self._offset >= self.wal_size_threshold):
+            self._sync()
+    
+    def flush(self) -> None:
+        """立即写出缓冲的记录并刷新到磁盘。"""
+        with self.mutex:
+            if self.file:
+                self._sync()
     
     # 添加别名，与DB类保持兼容
     def append(self, key: bytes, value: Optional[bytes]) -> None:
@@ -132,11 +265,10 @@ class WAL:
         # 计算CRC
         crc = self._calculate_crc(data)
         
-        # 写入头部
-        self.file.write(struct.pack('!IIB', crc, len(data), record_type))
-        
-        # 写入数据
-        self.file.write(data)
+        # 头部和数据追加到缓冲区
+        self._buf += self._HEADER.pack(crc, len(data), record_type)
+        self._buf += data
+        self._offset += self.HEADER_SIZE + len(data)
     
     def _calculate_crc(self, data: bytes) -> int:
         """
@@ -162,6 +294,9 @@ class WAL:
             键值对迭代器。
         """
         with self.mutex:
+            # 缓冲区中的记录先写入文件才能被读到
+            self._write_buffer()
+            
             # 保存当前位置
             current_pos = self.file.tell()
             
@@ -222,13 +357,78 @@ class WAL:
                 # 恢复文件位置
                 self.file.seek(current_pos)
     
+    def read_all_bulk(self) -> Iterator[Tuple[bytes, Optional[bytes]]]:
+        """
+        一次性读入整个WAL并在内存中解析所有记录。
+        
+        结果与read_all相同，但只读一次文件，直接在memoryview上按偏移解析头部和数据，
+        校验和用内置sum计算；同时按写入时的规则跳过块尾的填充。
+        
+        Returns:
+            键值对迭代器。
+        """
+        with self.mutex:
+            # 缓冲区中的记录先写入文件才能被读到
+            self._write_buffer()
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        
+        view = memoryview(data)
+        block_size = getattr(self.config, 'sstable_block_size', 4 * 1024)
+        header_size = self.HEADER_SIZE
+        unpack_header = self._HEADER.unpack_from
+        end = len(view)
+        pos = 0
+        fragments = []
+        
+        try:
+            while pos < end:
+                # 块尾剩余空间放不下头部时，写入端填充了零，直接跳到下一个块
+                available = block_size - pos % block_size
+                if available < header_size:
+                    pos += available
+                    continue
+                if pos + header_size > end:
+                    break
+                
+                crc, length, record_type = unpack_header(view, pos)
+                pos += header_size
+                if pos + length > end:
+                    # 文件不完整
+                    break
+                record = view[pos:pos + length]
+                pos += length
+                
+                # 验证CRC，不匹配则跳过这条记录
+                if (sum(record) & 0xFFFFFFFF) != crc:
+                    continue
+                
+                if record_type == self.FULL:
+                    yield pickle.loads(record)
+                elif record_type == self.FIRST:
+                    fragments = [record]
+                elif record_type == self.MIDDLE:
+                    fragments.append(record)
+                elif record_type == self.LAST:
+                    fragments.append(record)
+                    yield pickle.loads(b''.join(fragments))
+                    fragments = []
+        except Exception as e:
+            # 发生异常，记录可能已损坏
+            print(f"Error reading WAL: {e}")
+    
     def close(self) -> None:
         """关闭WAL文件。"""
         if hasattr(self, 'file') and self.file:
             try:
-                self.file.flush()
-                self.file.close()
-                self.file = None
+                with self.mutex:
+                    # 等待进行中的同步结束后再关闭文件描述符
+                    while self._syncing:
+                        self._sync_cond.wait()
+                    self._write_buffer()
+                    self.file.close()
+                    self.file = None
+                    self._finalizer.detach()
             except Exception as e:
                 print(f"关闭WAL文件时出错: {e}")
     
@@ -0,0 +1,288 @@
+"""
+测试块格式的SSTable实现（pylsm/sstable/目录下的block.py和sstable.py）。
+
+pylsm/sstable.py与该目录同名，import pylsm.sstable得到的是前者，
+因此这里按文件路径加载这两个模块。
+"""
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+_SSTABLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pylsm", "sstable")
+
+
+def _load_modules():
+    """
+    按文件路径加载block.py和sstable.py。
+    
+    两个模块以各自的完整名称登记在sys.modules中：sstable.py通过
+    from pylsm.sstable.block import ...引用block模块，numba的编译缓存也按模块名重新加载。
+    pylsm.sstable本身仍然是pylsm/sstable.py。
+    """
+    modules = []
+    for name in ("pylsm.sstable.block", "pylsm.sstable.sstable"):
+        module = sys.modules.get(name)
+        if module is None:
+            path = os.path.join(_SSTABLE_DIR, name.rsplit(".", 1)[1] + ".py")
+            spec = importlib.util.spec_from_file_location(name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            spec.loader.exec_module(module)
+        modules.append(module)
+    return modules
+
+
+block, block_sstable = _load_modules()
+CompressionType = block.CompressionType
+
+# 有numba时两种条目解析路径都要覆盖
+_DECODE_PATHS = [False, True] if block._HAS_NUMBA else [False]
+
+
+class TestBlockCompression(unittest.TestCase):
+    """测试数据块的各种压缩方式都能原样读回。"""
+    
+    def setUp(self):
+        """测试前设置。"""
+        self.test_dir = tempfile.mkdtemp()
+        self.items = [(f"key{i:05d}".encode(), f"value{i:05d}".encode() * 3) for i in range(2000)]
+    
+    def tearDown(self):
+        """测试后清理。"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def _compression_types(self):
+        """返回当前环境可用的压缩类型。"""
+        types = [CompressionType.NONE, CompressionType.ZLIB]
+        if block.zstandard is not None:
+            types.append(CompressionType.ZSTD)
+        return types
+    
+    def test_default_compression(self):
+        """测试默认压缩类型不依赖可选依赖是否安装。"""
+        self.assertEqual(block.DEFAULT_COMPRESSION, CompressionType.NONE)
+    
+    def test_block_round_trip(self):
+        """测试单个数据块压缩后能读回全部条目。"""
+        items = self.items[:100]
+        for compression_type in self._compression_types():
+            with self.subTest(compression_type=compression_type):
+                data = block.build_data_block(items, block_size=1 << 20, compression_type=compression_type)
+                self.assertEqual(data[-1], compression_type.value)
+                
+                iterator = block.BlockIterator(data)
+                result = []
+                while iterator.valid():
+                    result.append((iterator.key(), iterator.value()))
+                    iterator.next()
+                self.assertEqual(result, items)
+    
+    def test_sstable_round_trip(self):
+        """测试整个SSTable压缩后能按键读回。"""
+        for compression_type in self._compression_types():
+            with self.subTest(compression_type=compression_type):
+                path = os.path.join(self.test_dir, f"{compression_type.name}.sst")
+                builder = block_sstable.SSTableBuilder(path, compression_type=compression_type)
+                for key, value in self.items:
+                    builder.add(key, value)
+                builder.finish()
+                
+                table = block_sstable.SSTable(path)
+                try:
+                    for key, value in self.items[::37]:
+                        self.assertEqual(table.get(key), value)
+                    self.assertIsNone(table.get(b"key99999"))
+                finally:
+                    table.close()
+    
+    @unittest.skipIf(block.zstandard is not None, "已安装zstandard")
+    def test_zstd_requires_zstandard(self):
+        """测试未安装zstandard时显式请求zstd会报错。"""
+        with self.assertRaises(ValueError):
+            block.BlockBuilder(compression_type=CompressionType.ZSTD)
+
+
+def _collect_forward(iterator):
+    """从当前位置向后收集全部(键, 值)。"""
+    result = []
+    while iterator.valid():
+        result.append((iterator.key(), iterator.value()))
+        iterator.next()
+    return result
+
+
+def _collect_backward(iterator):
+    """从当前位置向前收集全部(键, 值)。"""
+    result = []
+    while iterator.valid():
+        result.append((iterator.key(), iterator.value()))
+        iterator.prev()
+    return result
+
+
+class TestBlockIterator(unittest.TestCase):
+    """测试数据块迭代器的顺序遍历、反向遍历和定位。"""
+    
+    def setUp(self):
+        """测试前设置。"""
+        # 键有较长的公共前缀，条目数不是重启间隔的整数倍
+        self.items = [(f"user:{i * 2:04d}".encode(), f"v{i}".encode() * (i % 5)) for i in range(101)]
+        self.data = block.build_data_block(self.items, block_size=1 << 20, restart_interval=4)
+    
+    def test_forward_and_reverse(self):
+        """测试正向和反向遍历得到全部条目。"""
+        for use_numba in _DECODE_PATHS:
+            with self.subTest(use_numba=use_numba), mock.patch.object(block, "_HAS_NUMBA", use_numba):
+                iterator = block.BlockIterator(self.data)
+                self.assertEqual(_collect_forward(iterator), self.items)
+                
+                iterator.seek_to_last()
+                self.assertEqual(_collect_backward(iterator), self.items[::-1])
+    
+    def test_seek(self):
+        """测试定位到存在的键、两个键之间、第一个键之前和最后一个键之后。"""
+        for use_numba in _DECODE_PATHS:
+            with self.subTest(use_numba=use_numba), mock.patch.object(block, "_HAS_NUMBA", use_numba):
+                iterator = block.BlockIterator(self.data)
+                
+                iterator.seek(b"user:0050")
+                self.assertEqual(iterator.key(), b"user:0050")
+                iterator.seek(b"user:0051")
+                self.assertEqual(iterator.key(), b"user:0052")
+                iterator.prev()
+                self.assertEqual(iterator.key(), b"user:0050")
+                
+                iterator.seek(b"a")
+                self.assertEqual(iterator.key(), self.items[0][0])
+                iterator.seek(b"user:9999")
+                self.assertFalse(iterator.valid())
+    
+    def test_clone(self):
+        """测试克隆共享解码结果，但位置互不影响。"""
+        iterator = block.BlockIterator(self.data)
+        iterator.seek(b"user:0100")
+        other = iterator.clone()
+        
+        self.assertIs(other.data, iterator.data)
+        self.assertEqual(other.key(), self.items[0][0])
+        other.seek_to_last()
+        self.assertEqual(iterator.key(), b"user:0100")
+        self.assertEqual(_collect_forward(iterator), self.items[50:])
+
+
+class TestBlockSSTable(unittest.TestCase):
+    """测试块格式SSTable的点查、遍历、定位和块缓存。"""
+    
+    def setUp(self):
+        """测试前设置。"""
+        self.test_dir = tempfile.mkdtemp()
+        # 约一百个数据块；块尾的条目数按单字节解析，索引块的条目数需少于128
+        self.items = [(f"key{i * 3:06d}".encode(), f"value{i}".encode() * (1 + i % 7)) for i in range(1200)]
+    
+    def tearDown(self):
+        """测试后清理。"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def _build(self, name="test.sst"):
+        """用较小的数据块写出测试数据并打开，返回SSTable。"""
+        path = os.path.join(self.test_dir, name)
+        builder = block_sstable.SSTableBuilder(path, block_size=512)
+        for key, value in self.items:
+            builder.add(key, value)
+        builder.finish()
+        table = block_sstable.SSTable(path)
+        self.addCleanup(table.close)
+        self.assertGreater(len(table.index_keys), 10)
+        return table
+    
+    def test_get(self):
+        """测试点查存在和不存在的键。"""
+        for use_numba in _DECODE_PATHS:
+            with self.subTest(use_numba=use_numba), mock.patch.object(block, "_HAS_NUMBA", use_numba):
+                table = self._build(f"get-{use_numba}.sst")
+                for key, value in self.items[::11]:
+                    self.assertEqual(table.get(key), value)
+                self.assertIsNone(table.get(b"key000001"))
+                self.assertIsNone(table.get(b"a"))
+                self.assertIsNone(table.get(b"zzz"))
+    
+    def test_iterate(self):
+        """测试跨数据块的正向和反向遍历。"""
+        for use_numba in _DECODE_PATHS:
+            with self.subTest(use_numba=use_numba), mock.patch.object(block, "_HAS_NUMBA", use_numba):
+                table = self._build(f"iterate-{use_numba}.sst")
+                iterator = table.iterator()
+                iterator.seek_to_first()
+                self.assertEqual(_collect_forward(iterator), self.items)
+                
+                iterator.seek_to_last()
+                self.assertEqual(_collect_backward(iterator), self.items[::-1])
+    
+    def test_seek(self):
+        """测试定位到每个数据块的边界附近，并从定位处继续遍历。"""
+        table = self._build()
+        keys = [key for key, _ in self.items]
+        iterator = table.iterator()
+        for block_max in table.index_keys[:-1]:
+            position = keys.index(block_max)
+            # 块内最大键本身，以及它与下一个键之间的键（落在下一个块）
+            for target, expected in ((block_max, position), (block_max + b"\x00", position + 1)):
+                iterator.seek(target)
+                self.assertEqual(iterator.key(), keys[expected])
+                iterator.prev()
+                if expected > 0:
+                    self.assertEqual(iterator.key(), keys[expected - 1])
+        
+        iterator.seek(b"key000004")
+        self.assertEqual(_collect_forward(iterator), self.items[2:])
+        iterator.seek(b"zzz")
+        self.assertFalse(iterator.valid())
+    
+    def test_block_cache_eviction(self):
+        """测试块缓存不超过字节预算，淘汰后重新读取的块内容不变。"""
+        table = self._build()
+        table.BLOCK_CACHE_BYTES = 2048
+        
+        # 第一次遍历解码全部数据块，缓存只保留预算内最近使用的块
+        iterator = table.iterator()
+        iterator.seek_to_first()
+        self.assertEqual(_collect_forward(iterator), self.items)
+        self.assertLessEqual(table._block_cache_bytes, table.BLOCK_CACHE_BYTES)
+        self.assertLess(len(table._block_cache), len(table.index_keys))
+        self.assertEqual(table._block_cache_bytes, sum(len(b.data) for b in table._block_cache.values()))
+        self.assertNotIn(table.index_offsets[0], table._block_cache)
+        
+        # 命中时返回共享解码结果的克隆
+        last_offset = table.index_offsets[-1]
+        self.assertIn(last_offset, table._block_cache)
+        cached = table.block_iterator(last_offset, table.index_sizes[-1])
+        self.assertIs(cached.data, table._block_cache[last_offset].data)
+        
+        # 被淘汰的块重新解码后结果不变，再次遍历（包括反向）仍然完整
+        for key, value in self.items[::13]:
+            self.assertEqual(table.get(key), value)
+        iterator.seek_to_last()
+        self.assertEqual(_collect_backward(iterator), self.items[::-1])
+        self.assertLessEqual(table._block_cache_bytes, table.BLOCK_CACHE_BYTES)
+    
+    def test_independent_iterators(self):
+        """测试同一SSTable上的多个迭代器共享缓存的块，但位置互不影响。"""
+        table = self._build()
+        first = table.iterator()
+        second = table.iterator()
+        first.seek_to_first()
+        second.seek_to_first()
+        second.next()
+        
+        self.assertEqual(first.key(), self.items[0][0])
+        self.assertEqual(second.key(), self.items[1][0])
+        self.assertEqual(_collect_forward(first), self.items)
+        self.assertEqual(second.key(), self.items[1][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,9 +4,10 @@
 
 import pytest
 import os
+import struct
 import random
 import string
-from pylsm.bloom_filter import BloomFilter, create_optimal_bloom_filter
+from pylsm.bloom_filter import BloomFilter, create_optimal_bloom_filter, BLOCK_BITS
 
 
 def random_key(length=10):
@@ -32,6 +33,22 @@ class TestBloomFilter:
         assert bf2.expected_elements == 100
         assert bf2.false_positive_rate == 0.01
     
+    def test_explicit_constructors(self):
+        """测试显式的两种构造方法及其参数校验。"""
+        bf = BloomFilter.from_bits_per_key(10, 7, expected_keys=100)
+        assert bf.num_hashes == 7
+        assert bf.num_bits >= 100 * 10
+        
+        bf2 = BloomFilter.from_capacity(100, 0.01)
+        assert bf2.expected_elements == 100
+        assert bf2.false_positive_rate == 0.01
+        
+        # 不再有"小于1的数视为假阳性率"的歧义
+        with pytest.raises(ValueError):
+            BloomFilter.from_bits_per_key(10, 0.5)
+        with pytest.raises(ValueError):
+            BloomFilter.from_capacity(100, 7)
+    
     def test_create_for_capacity(self):
         """测试为指定容量创建布隆过滤器。"""
         capacity = 1000
@@ -75,6 +92,23 @@ class TestBloomFilter:
         # 假阳性率不应太高，但也无法保证精确的值
         assert false_positive_rate < 0.05
     
+    def test_may_contain_batch(self):
+        """测试批量探测与逐个探测的结果一致。"""
+        bf = BloomFilter.create_for_capacity(100, 0.01)
+        keys = [random_key() for _ in range(50)]
+        for key in keys:
+            bf.add(key)
+        
+        probe_keys = keys + [random_key() for _ in range(200)]
+        batch_result = bf.may_contain_batch(probe_keys)
+        
+        assert len(batch_result) == len(probe_keys)
+        for key, hit in zip(probe_keys, batch_result):
+            assert bool(hit) == bf.may_contain(key)
+        
+        # 空输入返回空结果
+        assert len(bf.may_contain_batch([])) == 0
+    
     def test_serialization(self):
         """测试布隆过滤器的序列化和反序列化。"""
         # 创建和填充布隆过滤器
@@ -86,6 +120,9 @@ class TestBloomFilter:
         # 序列化
         serialized = original.to_bytes()
         
+        # 序列化结果只包含28字节头部和位数组，不附带键
+        assert len(serialized) == 28 + len(original.bit_array)
+        
         # 反序列化
         deserialized = BloomFilter.from_bytes(serialized)
         
@@ -94,11 +131,78 @@ class TestBloomFilter:
         assert deserialized.num_hashes == original.num_hashes
         assert deserialized.num_bits == original.num_bits
         assert deserialized.num_keys == original.num_keys
+        assert deserialized.hash_type == original.hash_type
         
         # 检查所有键都可以被检测到
         for key in keys:
             assert deserialized.may_contain(key) == True
     
+    def test_from_mmap(self):
+        """测试从内存映射缓冲区零拷贝构造只读布隆过滤器。"""
+        original = BloomFilter.create_for_capacity(100, 0.01)
+        keys = [random_key() for _ in range(50)]
+        for key in keys:
+            original.add(key)
+        
+        # 在序列化数据前加入前缀，验证偏移量的处理
+        buffer = bytearray(b"prefix" + original.to_bytes())
+        bf = BloomFilter.from_mmap(memoryview(buffer), 6)
+        
+        assert bf.read_only
+        assert bf.num_bits == original.num_bits
+        for key in keys:
+            assert bf.may_contain(key) == True
+        
+        # 位数组与缓冲区共享内存
+        assert isinstance(bf.bit_array, memoryview)
+        assert bf.bit_array.obj is buffer
+        
+        # 只读过滤器不能添加键
+        with pytest.raises(ValueError):
+            bf.add(b"new_key")
+        
+        bf.release()
+    
+    def test_release_reuses_buffer(self):
+        """测试释放的位数组会被同样大小的新过滤器复用，且复用时已清零。"""
+        bf = BloomFilter(10, 7.0, expected_keys=100)
+        for i in range(100):
+            bf.add(f"key_{i}".encode('utf-8'))
+        buffer = bf.bit_array
+        bf.release()
+        
+        reused = BloomFilter(10, 7.0, expected_keys=100)
+        assert reused.bit_array is buffer
+        assert not any(reused.bit_array)
+        assert reused.may_contain(b"key_0") == False
+    
+    def test_legacy_format(self):
+        """测试读取附带键列表的版本1格式时根据键重建过滤器。"""
+        keys = [f"key_{i}".encode('utf-8') for i in range(20)]
+        
+        # 版本1: 头部"<IIII" + 位数组 + 键数量 + [键长度 + 键]
+        data = struct.pack("<IIII", 10, 7, 256, len(keys)) + bytes(32)
+        data += struct.pack("<I", len(keys))
+        for key in keys:
+            data += struct.pack("<I", len(key)) + key
+        
+        bf = BloomFilter.from_bytes(data)
+        for key in keys:
+            assert bf.may_contain(key) == True
+        
+        # 重新序列化得到当前版本格式
+        assert BloomFilter.from_bytes(bf.to_bytes()).num_bits == bf.num_bits
+    
+    def test_unknown_hash_type(self):
+        """测试反序列化使用未知哈希算法的布隆过滤器时报错。"""
+        bf = BloomFilter.create_for_capacity(10, 0.01)
+        bf.add(b"key")
+        data = bytearray(bf.to_bytes())
+        data[24] = 0xFF  # 哈希算法标识字节
+        
+        with pytest.raises(ValueError):
+            BloomFilter.from_bytes(bytes(data))
+    
     def test_create_optimal_helper(self):
         """测试创建最优布隆过滤器的辅助函数。"""
         bf = create_optimal_bloom_filter(1000, 0.001)
@@ -110,20 +214,68 @@ class TestBloomFilter:
         bf_low_fpr = create_optimal_bloom_filter(1000, 0.001)
         assert bf_low_fpr.bits_per_key > bf_high_fpr.bits_per_key
     
-    def test_resize(self):
-        """测试位数组的动态调整大小。"""
-        # 使用直接参数方式初始化
-        bf = BloomFilter(10, 7.0)  # 使用较小的初始容量触发重新调整大小
-        # 添加足够多的键触发扩展
-        initial_size = 0
-        for i in range(100):
-            key = f"key_{i}".encode('utf-8')
-            if i == 10:  # 记录添加一些键后的大小
-                initial_size = bf.num_bits
+    def test_presized_bits_per_key(self):
+        """测试按预期键数量预分配的位数组在添加键时不再变化。"""
+        bf = BloomFilter(10, 7.0, expected_keys=100)
+        assert bf.num_bits >= 100 * 10
+        assert len(bf.bit_array) == bf.num_bits // 8
+        
+        initial_size = bf.num_bits
+        keys = [f"key_{i}".encode('utf-8') for i in range(100)]
+        for key in keys:
             bf.add(key)
         
-        # 验证位数组确实扩大了
-        assert bf.num_bits > initial_size
+        # 位数组大小不变，且没有假阴性
+        assert bf.num_bits == initial_size
+        for key in keys:
+            assert bf.may_contain(key) == True
+    
+    def test_blocked_layout(self):
+        """测试一个键的所有位都落在同一个512位块内。"""
+        bf = BloomFilter(10, 7.0, expected_keys=1000)
+        assert bf.num_bits % BLOCK_BITS == 0
+        
+        for i in range(100):
+            positions = bf._get_hash_positions(f"key_{i}".encode('utf-8'))
+            assert len(positions) == bf.num_hashes
+            assert len({pos // BLOCK_BITS for pos in positions}) == 1
+    
+    def test_add_does_not_scan_bit_array(self, monkeypatch):
+        """测试添加键不会触发O(m)的填充率扫描。"""
+        bf = BloomFilter(10, 7.0, expected_keys=100)
+        
+        def fail(self):
+            raise AssertionError("add()不应计算填充率")
+        monkeypatch.setattr(BloomFilter, "_get_fill_ratio", fail)
+        
+        for i in range(100):
+            bf.add(f"key_{i}".encode('utf-8'))
+        assert bf.num_keys == 100
+    
+    def test_prefix_filter(self):
+        """测试前缀布隆过滤器的添加、检查和序列化。"""
+        bf = BloomFilter.create_for_capacity(10, 0.01)
+        bf.add_prefix(b"user:0001:name", 5)
+        
+        # 相同前缀的任意键都可能存在
+        assert bf.may_contain(b"user:9999:email") == True
+        assert bf.may_contain_prefix(b"user:") == True
+        
+        # 前缀长度必须一致
+        with pytest.raises(ValueError):
+            bf.add_prefix(b"user:0002", 4)
+        
+        # 序列化后保留前缀长度
+        restored = BloomFilter.from_bytes(bf.to_bytes())
+        assert restored.prefix_len == 5
+        assert restored.may_contain(b"user:1234") == True
+    
+    def test_slots(self):
+        """测试布隆过滤器使用__slots__，没有实例字典。"""
+        bf = BloomFilter.create_for_capacity(10, 0.01)
+        assert not hasattr(bf, '__dict__')
+        with pytest.raises(AttributeError):
+            bf.unknown_attribute = 1
     
     def test_fill_ratio(self):
         """测试填充率计算。"""
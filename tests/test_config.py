@@ -122,6 +122,15 @@ class TestConfig(unittest.TestCase):
         
         # 测试Level 2的最大大小 (Level 1的10倍)
         self.assertEqual(config.get_level_max_size(2), 400 * 1024 * 1024)
+        
+        # 修改相关字段后缓存的层级大小应重新计算
+        config.compaction_level_size_multiplier = 2
+        self.assertEqual(config.get_level_max_size(2), 16 * 1024 * 1024)
+        self.assertEqual(config.get_level_target_file_size(3), 4 * 1024 * 1024)
+        
+        # 超出最大层级时仍按公式计算
+        level = config.compaction_max_level + 1
+        self.assertEqual(config.get_level_max_size(level), 4 * 1024 * 1024 * 2 ** level)
 
 
 if __name__ == '__main__':
@@ -3,14 +3,19 @@
 """
 import unittest
 import os
+import gc
+import sys
+import subprocess
 import tempfile
 import shutil
 import random
 import string
 import time
+import weakref
 
 from pylsm.db import DB
 from pylsm.config import Config
+from pylsm.version_set import Version, FileMetaData
 
 
 def random_string(length=10):
@@ -94,6 +99,185 @@ class TestDB(unittest.TestCase):
         self.assertIsNone(self.db.get(key1), "已删除的键应返回None")
         self.assertEqual(self.db.get(key2), value2, "未删除的键应该仍然存在")
     
+    def test_multi_get(self):
+        """测试批量读取操作。"""
+        # 一部分数据刷写到磁盘，一部分保留在内存表中
+        for i in range(10):
+            self.db.put(f"key{i:03d}".encode(), f"value{i:03d}".encode())
+        self.db.flush()
+        for i in range(10, 20):
+            self.db.put(f"key{i:03d}".encode(), f"value{i:03d}".encode())
+        self.db.delete(b"key015")
+        
+        keys = [f"key{i:03d}".encode() for i in range(20)] + [b"non_existent_key"]
+        values = self.db.multi_get(keys)
+        
+        # 批量读取的结果应与逐个读取一致
+        self.assertEqual(values, [self.db.get(key) for key in keys])
+        self.assertEqual(values[3], b"value003")
+        self.assertEqual(values[12], b"value012")
+        self.assertIsNone(values[15], "已删除的键应返回None")
+        self.assertIsNone(values[-1], "不存在的键应返回None")
+    
+    def test_table_cache(self):
+        """测试SSTable句柄在多次读取间复用，并在关闭时释放。"""
+        for i in range(10):
+            self.db.put(f"key{i:03d}".encode(), f"value{i:03d}".encode())
+        self.db.flush()
+        
+        self.assertEqual(self.db.get(b"key001"), b"value001")
+        self.assertEqual(len(self.db._table_cache), 1)
+        sstable = next(iter(self.db._table_cache.values()))
+        
+        # 再次读取应复用同一个已打开的SSTable
+        self.assertEqual(self.db.multi_get([b"key002", b"key003"]), [b"value002", b"value003"])
+        self.assertIs(next(iter(self.db._table_cache.values())), sstable)
+        
+        # 范围查询同样经由缓存获取SSTable，结束后不关闭它
+        self.assertEqual(len(list(self.db.range())), 10)
+        self.assertIs(next(iter(self.db._table_cache.values())), sstable)
+        self.assertEqual(sstable.get(b"key004"), b"value004")
+        
+        self.db.close()
+        self.assertEqual(len(self.db._table_cache), 0)
+    
+    def test_version_find_file(self):
+        """测试非0层按最小键二分定位文件和范围，并在添加文件后刷新缓存。"""
+        version = Version(self.db.version_set, 1)
+        version.add_file(1, FileMetaData(2, 100, b"key100", b"key199", 1))
+        version.add_file(1, FileMetaData(1, 100, b"key000", b"key099", 1))
+        
+        self.assertEqual(version.find_file(1, b"key050").file_number, 1)
+        self.assertEqual(version.find_file(1, b"key150").file_number, 2)
+        self.assertIsNone(version.find_file(1, b"aaa"))
+        self.assertIsNone(version.find_file(1, b"key200"))
+        
+        version.add_file(1, FileMetaData(3, 100, b"key300", b"key399", 1))
+        self.assertEqual(version.find_file(1, b"key350").file_number, 3)
+        self.assertIsNone(version.find_file(1, b"key250"))
+        
+        # 范围查询只返回与[start, end)重叠的文件
+        def in_range(start, end):
+            return [f.file_number for f in version.files_in_range(1, start, end)]
+        self.assertEqual(in_range(b"key150", b"key350"), [2, 3])
+        self.assertEqual(in_range(b"key200", b"key300"), [])
+        self.assertEqual(in_range(b"a", b"key100"), [1])
+        self.assertEqual(in_range(b"key399", b"z"), [3])
+        
+        # Level 0的文件可能重叠，包含键的文件按从新到旧返回
+        version.add_file(0, FileMetaData(4, 100, b"key000", b"key500", 0))
+        version.add_file(0, FileMetaData(5, 100, b"key200", b"key300", 0))
+        version.add_file(0, FileMetaData(6, 100, b"key100", b"key150", 0))
+        self.assertEqual([f.file_number for f in version.level0_files_for_key(b"key250")], [5, 4])
+        self.assertEqual([f.file_number for f in version.level0_files_for_key(b"key120")], [6, 4])
+        self.assertEqual(version.level0_files_for_key(b"key600"), [])
+    
+    def test_background_compaction(self):
+        """测试写入只向后台线程投递压缩信号，关闭时后台线程退出。"""
+        self.db.config.compaction_check_interval = 10
+        for i in range(100):
+            self.db.put(f"key{i:03d}".encode(), f"value{i:03d}".encode())
+        
+        # 信号队列容量为1，多次请求被合并
+        self.assertLessEqual(self.db._compaction_q.qsize(), 1)
+        self.assertTrue(self.db._compaction_thread.is_alive())
+        
+        self.db.close()
+        self.assertFalse(self.db._compaction_thread.is_alive())
+    
+    def test_unclosed_db_collected(self):
+        """测试后台压缩线程不会让未关闭的DB一直存活，DB被回收时线程退出。"""
+        db_dir = os.path.join(self.test_dir, "unclosed")
+        db = DB(db_dir)
+        db.put(b"key", b"value")
+        thread = db._compaction_thread
+        ref = weakref.ref(db)
+        del db
+        gc.collect()
+        
+        self.assertIsNone(ref())
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+    
+    def test_recovery_without_close(self):
+        """测试进程未调用close就退出时，重新打开后能从WAL恢复全部写入。"""
+        db_dir = os.path.join(self.test_dir, "no_close")
+        script = (
+            "import sys\n"
+            "from pylsm.db import DB\n"
+            "db = DB(sys.argv[1])\n"
+            "for i in range(100):\n"
+            "    db.put(b'key%03d' % i, b'value%03d' % i)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", script, db_dir], cwd=root, check=True,
+                       stdout=subprocess.DEVNULL)
+        
+        db = DB(db_dir)
+        try:
+            for i in range(100):
+                self.assertEqual(db.get(b"key%03d" % i), b"value%03d" % i)
+        finally:
+            db.close()
+    
+    def test_compaction_pipeline(self):
+        """测试压缩把Level 0文件归并到Level 1，相同的键保留最新的值。"""
+        self.db.config.enable_automatic_compaction = False
+        for r in range(10):
+            for i in range(50):
+                self.db.put(f"key{i:03d}".encode(), f"value{r}-{i:03d}".encode())
+            self.db.flush()
+        
+        self.db.config.enable_automatic_compaction = True
+        self.db.compact()
+        
+        files = self.db.version_set.get_current().files
+        self.assertEqual(len(files[1]), 1)
+        self.assertEqual(len(files[0]), 6)
+        for i in range(50):
+            self.assertEqual(self.db.get(f"key{i:03d}".encode()), f"value9-{i:03d}".encode())
+        
+        # Level 1中只剩下被压缩文件里最新的值
+        sstable = self.db._open_table(files[1][0].file_number)
+        self.assertEqual(sstable.get(b"key007"), b"value3-007")
+    
+    def test_put_batch(self):
+        """测试批量写入操作及其WAL恢复。"""
+        pairs = [(f"key{i:03d}".encode(), f"value{i:03d}".encode()) for i in range(20)]
+        self.db.put_batch(pairs)
+        
+        for key, value in pairs:
+            self.assertEqual(self.db.get(key), value)
+        
+        # 重新打开数据库，批量写入的记录应能从WAL恢复
+        config = self.db.config
+        self.db.close()
+        self.db = DB(self.test_dir, config=config)
+        for key, value in pairs:
+            self.assertEqual(self.db.get(key), value, f"恢复后键{key}的值不正确")
+    
+    def test_wal_rotation(self):
+        """测试刷写后切换到新序号的WAL，旧WAL被删除，只回放最新的WAL。"""
+        first_wal = self.db.wal.path
+        self.db.put(b"flushed", b"v1")
+        self.db.flush()
+        self.assertNotEqual(self.db.wal.path, first_wal)
+        
+        self.db.put(b"pending", b"v2")
+        self.db.flush_wal()
+        self.db._delete_obsolete_wals()
+        self.assertFalse(os.path.exists(first_wal))
+        
+        # 模拟崩溃：不关闭数据库，直接从磁盘上的文件恢复
+        recovered = DB(self.test_dir, config=self.db.config)
+        try:
+            self.assertEqual(recovered.wal.path, self.db.wal.path)
+            self.assertEqual(recovered.memtable.get(b"pending"), b"v2")
+            self.assertIsNone(recovered.memtable.get(b"flushed"))
+            self.assertEqual(recovered.get(b"flushed"), b"v1")
+        finally:
+            recovered.close()
+    
     def test_memtable_flush(self):
         """测试内存表刷新到磁盘的功能。"""
         # 添加数据，但不超过默认阈值
@@ -169,12 +353,27 @@ class TestDB(unittest.TestCase):
         # 使用数据库迭代器
         db_data = {}
         for key, value in self.db.range():
-            db_data[key] = value
+            db_data[key.decode('utf-8')] = value
 
         # 验证迭代器返回的数据是否完整和正确
         self.assertEqual(len(db_data), len(test_data), "迭代器返回的键值对数量应该匹配")
         for key, expected_value in test_data.items():
             self.assertEqual(db_data.get(key), expected_value, f"键 {key} 的值应该匹配")
+    
+    def test_range_newest_wins(self):
+        """测试范围查询跨多个SSTable时返回最新的值，并且结束键不包含在内。"""
+        for key in (b"a", b"b", b"c"):
+            self.db.put(key, b"old")
+        self.db.flush()
+        self.db.put(b"a", b"new")
+        self.db.delete(b"b")
+        self.db.flush()
+        self.db.put(b"c", b"newest")
+        self.db.put(b"d", b"mem")
+        
+        self.assertEqual(list(self.db.range()),
+                         [(b"a", b"new"), (b"c", b"newest"), (b"d", b"mem")])
+        self.assertEqual(list(self.db.range("a", "c")), [(b"a", b"new")])
 
 
 if __name__ == '__main__':
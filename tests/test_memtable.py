@@ -6,8 +6,11 @@ import os
 import tempfile
 import random
 import string
+import subprocess
+import sys
+import threading
 
-from pylsm.memtable import MemTable
+from pylsm.memtable import MemTable, MemTableEntry, EntryType
 from pylsm.wal import WAL
 
 
@@ -156,6 +159,99 @@ class TestMemTable(unittest.TestCase):
         
         # 清理
         new_wal.close()
+    
+    def test_entry_serialization(self):
+        """测试条目序列化与反序列化往返一致，包括删除标记和超过复用缓冲区的大值。"""
+        entries = [
+            MemTableEntry(b"key", b"value", EntryType.PUT, 1),
+            MemTableEntry(b"gone", None, EntryType.DELETE, 2),
+            MemTableEntry(b"big", b"x" * 10000, EntryType.PUT, 3),
+            MemTableEntry(b"small", b"v", EntryType.PUT, 4),
+        ]
+        data = [entry.to_bytes() for entry in entries]
+        
+        for entry, raw in zip(entries, data):
+            parsed = MemTableEntry.from_bytes(raw)
+            self.assertEqual((parsed.key, parsed.value, parsed.entry_type, parsed.timestamp),
+                             (entry.key, entry.value, entry.entry_type, entry.timestamp))
+        self.assertEqual(len(MemTableEntry.from_buffer(b"".join(data))), len(entries))
+    
+    def test_wal_buffered_writes(self):
+        """测试WAL记录在内存中缓冲，flush后完整写入文件。"""
+        records = [(f"key{i:03d}".encode(), f"value{i:03d}".encode()) for i in range(20)]
+        # 一条超过块大小的记录，会被切分为多个分片
+        records.append((b"big", b"x" * 10000))
+        self.wal.wal_flush_interval = 60  # 避免测试期间触发按时间刷新
+        self.wal.add_records(records)
+        
+        # 记录尚在缓冲区中，未写入文件
+        self.assertEqual(os.path.getsize(self.wal_path), 0)
+        
+        self.wal.flush()
+        self.assertEqual(os.path.getsize(self.wal_path), self.wal._offset)
+        self.assertEqual(list(self.wal.read_all()), records)
+    
+    def test_wal_buffer_written_at_exit(self):
+        """测试进程退出前未调用close时，缓冲区中的记录仍会写入文件。"""
+        path = os.path.join(self.temp_dir, "exit.wal")
+        # 后台线程持有WAL，退出时WAL不会被回收，__del__不会执行
+        script = (
+            "import sys, threading\n"
+            "from pylsm.wal import WAL\n"
+            "wal = WAL(sys.argv[1])\n"
+            "wal.wal_flush_interval = 60\n"
+            "for i in range(100):\n"
+            "    wal.add_record(b'key%03d' % i, b'value')\n"
+            "threading.Thread(target=lambda w=wal: threading.Event().wait(), daemon=True).start()\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", script, path], cwd=root, check=True)
+        
+        wal = WAL(path)
+        try:
+            self.assertEqual(len(list(wal.read_all_bulk())), 100)
+        finally:
+            wal.close()
+            os.remove(path)
+    
+    def test_wal_group_commit(self):
+        """测试多个线程并发写入并同步WAL，记录完整且同步位置覆盖全部写入。"""
+        def writer(t):
+            for i in range(50):
+                self.wal.add_record(f"t{t}-{i:03d}".encode(), b"v")
+                self.wal.flush()
+        
+        threads = [threading.Thread(target=writer, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertFalse(self.wal._syncing)
+        self.assertEqual(self.wal._synced_offset, self.wal._offset)
+        self.assertEqual(len(list(self.wal.read_all_bulk())), 200)
+    
+    def test_wal_read_all_bulk(self):
+        """测试批量解析WAL，包括跨块分片和块尾填充。"""
+        random.seed(7)
+        records = []
+        for i in range(500):
+            value = None if i % 10 == 0 else random_string(random.randint(0, 3000))
+            records.append((f"key{i:04d}".encode(), value))
+        self.wal.add_records(records)
+        
+        self.assertEqual(list(self.wal.read_all_bulk()), records)
+        
+        # 批量加载与逐条应用的结果一致
+        memtable = MemTable()
+        for key, value in records:
+            if value is None:
+                memtable.delete(key)
+            else:
+                memtable.put(key, value)
+        recovered = MemTable(self.wal)
+        self.assertEqual(list(recovered.items()), list(memtable.items()))
+        self.assertEqual(recovered.size(), memtable.size())
 
 
 if __name__ == '__main__':
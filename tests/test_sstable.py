@@ -7,9 +7,11 @@ import tempfile
 import shutil
 import random
 import string
+import struct
 
-from pylsm.sstable import SSTable
+from pylsm.sstable import SSTable, SSTableBuilder
 from pylsm.bloom_filter import BloomFilter
+from pylsm.utils import BatchedWriter
 
 
 def random_string(length=10):
@@ -157,6 +159,11 @@ class TestSSTable(unittest.TestCase):
         self.assertEqual(len(range_data), len(expected_data), "范围查询结果数量应该匹配")
         for key, expected_value in expected_data.items():
             self.assertEqual(range_data.get(key), expected_value, f"范围查询中键 {key} 的值应该匹配")
+        
+        # get_range的结束键是包含的
+        inclusive = sstable.get_range(start_key, end_key)
+        self.assertEqual([key for key, _ in inclusive], expected_keys + [end_key])
+        self.assertEqual(inclusive[-1][1], data[end_key])
     
     def test_bloom_filter_efficiency(self):
         """测试布隆过滤器的有效性。"""
@@ -197,6 +204,154 @@ class TestSSTable(unittest.TestCase):
         false_positive_rate = false_positives / test_count
         self.assertLessEqual(false_positive_rate, 0.1, f"布隆过滤器的假阳性率应不超过10%，实际为{false_positive_rate:.2%}")
 
+    
+    def test_prefix_bloom_filter(self):
+        """测试前缀布隆过滤器对点查询和同前缀范围查询的过滤。"""
+        # 准备测试数据：两个4字节前缀
+        data = {}
+        for prefix in (b"usr1", b"usr2"):
+            for i in range(50):
+                data[prefix + f":{i:03d}".encode()] = f"value{i:03d}".encode()
+        
+        # 使用构建器写入前缀布隆过滤器
+        sstable_path = os.path.join(self.test_dir, "test.sst")
+        builder = SSTableBuilder(sstable_path, prefix_len=4)
+        for key, value in data.items():
+            builder.add(key, value)
+        builder.finish()
+        
+        # 读取SSTable
+        sstable = SSTable(sstable_path)
+        self.sstable_instances.append(sstable)  # 跟踪实例
+        self.assertEqual(sstable.bloom_filter.prefix_len, 4)
+        self.assertEqual(sstable.bloom_filter.num_keys, 2, "前缀应去重后再加入过滤器")
+        
+        # 点查询按前缀检查，不应有假阴性
+        for key, value in data.items():
+            self.assertEqual(sstable.get(key), value)
+        
+        # 同前缀的范围查询：存在的前缀必须返回True，不存在的前缀（绝大多数情况下）被排除
+        self.assertTrue(sstable.range_may_match(b"usr1:", b"usr1:\xff"))
+        misses = sum(not sstable.range_may_match(f"zz{i:02d}".encode(), f"zz{i:02d}\xff".encode())
+                     for i in range(100))
+        self.assertGreater(misses, 90)
+        
+        # 前缀不同的范围无法判断，保守返回True
+        self.assertTrue(sstable.range_may_match(b"aaaa", b"zzzz"))
+    
+    def test_batched_write(self):
+        """测试序列化后批量写入多个SSTable文件。"""
+        buffers = []
+        expected = {}
+        for n in range(4):
+            data = {f"f{n}:{i:03d}".encode(): random_string(20).encode() for i in range(100)}
+            path = os.path.join(self.test_dir, f"batch_{n}.sst")
+            bloom_filter = BloomFilter.from_capacity(len(data), 0.01)
+            for key in data:
+                bloom_filter.add(key)
+            buffers.append((path, SSTable.serialize(data, bloom_filter)))
+            expected[path] = data
+        
+        BatchedWriter(max_workers=2).submit_all(buffers)
+        
+        # 每个文件都应能被正常读取，内容与直接写入一致
+        for path, data in expected.items():
+            sstable = SSTable(path)
+            self.sstable_instances.append(sstable)  # 跟踪实例
+            self.assertEqual(list(sstable.items()), sorted(data.items()))
+            self.assertTrue(all(sstable.may_contain(key) for key in data))
+
+    
+    def test_builder_sort_tracking(self):
+        """测试构建器只在键乱序添加时才排序。"""
+        sorted_path = os.path.join(self.test_dir, "sorted.sst")
+        builder = SSTableBuilder(sorted_path)
+        builder.add(b"a", b"1")
+        builder.extend_sorted([(b"b", b"2"), (b"c", b"3")])
+        self.assertTrue(builder._is_sorted)
+        builder.finish()
+        
+        unsorted_path = os.path.join(self.test_dir, "unsorted.sst")
+        builder = SSTableBuilder(unsorted_path)
+        for key in (b"b", b"c", b"a"):
+            builder.add(key, key.upper())
+        self.assertFalse(builder._is_sorted)
+        builder.finish()
+        
+        for path, expected in ((sorted_path, [(b"a", b"1"), (b"b", b"2"), (b"c", b"3")]),
+                               (unsorted_path, [(b"a", b"A"), (b"b", b"B"), (b"c", b"C")])):
+            sstable = SSTable(path)
+            self.sstable_instances.append(sstable)  # 跟踪实例
+            self.assertEqual(list(sstable.items()), expected)
+    
+    def test_builder_expected_count(self):
+        """测试给出预计键数量时布隆过滤器在添加键时构建。"""
+        sstable_path = os.path.join(self.test_dir, "test.sst")
+        builder = SSTableBuilder(sstable_path, expected_count=100)
+        keys = [f"key{i:03d}".encode() for i in range(100)]
+        for key in keys:
+            builder.add_sorted(key, key)
+        self.assertEqual(builder.bloom_filter.num_keys, 100)
+        builder.finish()
+        
+        sstable = SSTable(sstable_path)
+        self.sstable_instances.append(sstable)  # 跟踪实例
+        self.assertEqual(sstable.bloom_filter.num_keys, 100)
+        self.assertTrue(all(sstable.bloom_filter.may_contain(key) for key in keys))
+    
+    def test_read_v1_index(self):
+        """测试仍能读取版本1（键与偏移量交错）索引区的文件。"""
+        items = [(b"a", b"1"), (b"bb", b"22"), (b"ccc", b"")]
+        
+        # 按版本1格式手工拼出文件：数据区 + 交错索引区 + 页脚
+        data_region = b""
+        offsets = []
+        for key, value in items:
+            offsets.append(len(data_region))
+            data_region += struct.pack("!II", len(key), len(value)) + key + value
+        index_region = struct.pack("!I", len(items))
+        for (key, _), offset in zip(items, offsets):
+            index_region += struct.pack("!I", len(key)) + key + struct.pack("!Q", offset)
+        footer = struct.pack("!QQ", len(data_region), 0) + SSTable.MAGIC_NUMBER_V1
+        
+        sstable_path = os.path.join(self.test_dir, "v1.sst")
+        with open(sstable_path, "wb") as f:
+            f.write(data_region + index_region + footer)
+        
+        sstable = SSTable(sstable_path)
+        self.sstable_instances.append(sstable)  # 跟踪实例
+        self.assertEqual(list(sstable.items()), items)
+        self.assertEqual(sstable.get(b"bb"), b"22")
+        self.assertEqual(SSTable.read_data_end(sstable_path), len(data_region))
+    
+    def test_read_v2_index(self):
+        """测试仍能读取版本2（只记录记录偏移量）索引区的文件。"""
+        items = [(b"a", b"1"), (b"bb", b"22"), (b"ccc", b"")]
+        
+        # 按版本2格式手工拼出文件：数据区 + 键长度、键、记录偏移量分别连续存放的索引区 + 页脚
+        data_region = b""
+        offsets = []
+        for key, value in items:
+            offsets.append(len(data_region))
+            data_region += struct.pack("!II", len(key), len(value)) + key + value
+        index_region = struct.pack("!I", len(items))
+        index_region += struct.pack(f"!{len(items)}I", *[len(key) for key, _ in items])
+        index_region += b"".join(key for key, _ in items)
+        index_region += struct.pack(f"!{len(items)}Q", *offsets)
+        footer = struct.pack("!QQ", len(data_region), 0) + SSTable.MAGIC_NUMBER_V2
+        
+        sstable_path = os.path.join(self.test_dir, "v2.sst")
+        with open(sstable_path, "wb") as f:
+            f.write(data_region + index_region + footer)
+        
+        sstable = SSTable(sstable_path)
+        self.sstable_instances.append(sstable)  # 跟踪实例
+        self.assertEqual(list(sstable.items()), items)
+        self.assertEqual(list(sstable.range(b"bb")), items[1:])
+        self.assertEqual(sstable.get(b"bb"), b"22")
+        self.assertEqual(sstable.get(b"ccc"), b"")
+        self.assertEqual(SSTable.read_data_end(sstable_path), len(data_region))
+
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file